@@ -0,0 +1,114 @@
+"""
+admission.py
+
+Admission control for the heavy endpoints (/sync/*, /attachments/upload).
+
+When a whole shift reconnects at once, letting every request through just
+piles them onto SQLite until they all time out together. Instead:
+
+  ConcurrencyLimiter  at most `max_active` requests run at once; up to
+                      `max_queue` more wait (for at most `queue_timeout_s`),
+                      anything beyond that is turned away with 503.
+  RateLimiter         token bucket per API key; an empty bucket means 429.
+
+Both rejections carry a Retry-After hint: for 503 it is derived from the
+current queue depth and the recent average request time, for 429 it is
+the time until the bucket has a token again.
+
+Limits are per process; under prefork_server.py each worker has its own.
+"""
+
+import math
+import threading
+import time
+from typing import Dict, Tuple
+
+
+class AdmissionRejected(Exception):
+    """Request turned away; answer with `status` and a Retry-After header."""
+
+    def __init__(self, message: str, status: int, retry_after: int):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    def __init__(self, max_active: int, max_queue: int, queue_timeout_s: float):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self.active = 0
+        self.queued = 0
+        self.rejected = 0
+        # exponentially weighted average request time, for Retry-After
+        self.avg_service_s = 1.0
+        self._cond = threading.Condition()
+
+    def retry_after(self) -> int:
+        """Seconds until the backlog ahead of a new request should have drained."""
+        backlog = self.active + self.queued + 1
+        return max(1, math.ceil(backlog * self.avg_service_s / max(self.max_active, 1)))
+
+    def acquire(self) -> float:
+        """Wait for a slot. Returns the start time to pass to release()."""
+        with self._cond:
+            if self.active >= self.max_active:
+                if self.queued >= self.max_queue:
+                    self.rejected += 1
+                    raise AdmissionRejected("server busy, retry later", 503, self.retry_after())
+                self.queued += 1
+                deadline = time.monotonic() + self.queue_timeout_s
+                try:
+                    while self.active >= self.max_active:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.rejected += 1
+                            raise AdmissionRejected(
+                                "server busy, retry later", 503, self.retry_after()
+                            )
+                        self._cond.wait(remaining)
+                finally:
+                    self.queued -= 1
+            self.active += 1
+        return time.monotonic()
+
+    def release(self, started: float) -> None:
+        elapsed = time.monotonic() - started
+        with self._cond:
+            self.active -= 1
+            self.avg_service_s = 0.8 * self.avg_service_s + 0.2 * elapsed
+            self._cond.notify()
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            return {
+                "active": self.active,
+                "queued": self.queued,
+                "max_active": self.max_active,
+                "max_queue": self.max_queue,
+                "rejected": self.rejected,
+                "avg_service_s": round(self.avg_service_s, 3),
+            }
+
+
+class RateLimiter:
+    """Token bucket per key: `rate_per_s` sustained, bursts up to `burst`."""
+
+    def __init__(self, rate_per_s: float, burst: int):
+        self.rate_per_s = rate_per_s
+        self.burst = burst
+        # key -> (tokens, last refill time)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (float(self.burst), now))
+            tokens = min(float(self.burst), tokens + (now - last) * self.rate_per_s)
+            if tokens < 1.0:
+                self._buckets[key] = (tokens, now)
+                retry_after = max(1, math.ceil((1.0 - tokens) / self.rate_per_s))
+                raise AdmissionRejected("rate limit exceeded", 429, retry_after)
+            self._buckets[key] = (tokens - 1.0, now)
@@ -0,0 +1,254 @@
+"""
+archive.py
+
+Hot/cold archiving of completed inspections.
+
+Inspections completed more than N days ago are moved, with their tasks
+and attachment metadata, out of warehouse.db into a separate archive
+database (warehouse_archive.db next to it by default). The sync tables and
+their indexes then only hold the working set; /archive/* in sync_app.py
+serves the archived rows read-only.
+
+  python archive.py run --older-than-days 365   # move everything eligible
+  python archive.py stats                       # row counts on both sides
+
+Rows move in batches of `batch_size` inspections. Each batch holds the
+write lock on warehouse.db while it is copied, so nothing can change
+underneath it: the copy is committed to the archive first and only then
+deleted from warehouse.db. A crash in between leaves the batch in both
+files, and the next run simply copies it again (INSERT OR REPLACE).
+
+Deleting from warehouse.db goes through the normal triggers, so devices
+are sent tombstones for archived rows and drop them as well. Keys are
+copied as stored, so the archive uses the same key layout as the hot
+database. Attachment files stay in the upload directory.
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+BASE_DIR = Path(__file__).resolve().parent
+DB_PATH = Path(os.environ.get("WAREHOUSE_DB_PATH") or BASE_DIR / "warehouse.db")
+
+ARCHIVE_AFTER_DAYS = 365
+BATCH_SIZE = 100
+BATCH_PAUSE_S = 0.05   # lets waiting writers in between batches
+
+# Columns copied per table, in FK order
+ARCHIVE_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "inspections": (
+        "id", "aircraft_id", "status", "opened_at", "completed_at", "technician_id",
+        "created_at", "updated_at", "sync_status", "completed_at_ms",
+    ),
+    "tasks": (
+        "id", "inspection_id", "title", "description", "is_complete", "result", "notes",
+        "completed_at", "created_at", "updated_at", "sync_status",
+    ),
+    "attachments": (
+        "id", "task_id", "file_name", "mime_type", "size_bytes", "sha256", "remote_key",
+        "created_at", "updated_at", "sync_status",
+    ),
+}
+
+# No foreign keys: rows only ever arrive here together with their parent
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS inspections (
+    id PRIMARY KEY,
+    aircraft_id TEXT NOT NULL,
+    status TEXT,
+    opened_at TEXT,
+    completed_at TEXT,
+    technician_id,
+    created_at TEXT,
+    updated_at TEXT,
+    sync_status TEXT,
+    completed_at_ms INTEGER,
+    archived_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%SZ', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS tasks (
+    id PRIMARY KEY,
+    inspection_id NOT NULL,
+    title TEXT,
+    description TEXT,
+    is_complete INTEGER,
+    result TEXT,
+    notes TEXT,
+    completed_at TEXT,
+    created_at TEXT,
+    updated_at TEXT,
+    sync_status TEXT
+);
+
+CREATE TABLE IF NOT EXISTS attachments (
+    id PRIMARY KEY,
+    task_id NOT NULL,
+    file_name TEXT,
+    mime_type TEXT,
+    size_bytes INTEGER,
+    sha256 TEXT,
+    remote_key TEXT,
+    created_at TEXT,
+    updated_at TEXT,
+    sync_status TEXT
+);
+
+-- /archive/inspections: newest first, optionally per aircraft/technician
+CREATE INDEX IF NOT EXISTS idx_inspections_completed_at_ms ON inspections(completed_at_ms, id);
+CREATE INDEX IF NOT EXISTS idx_inspections_aircraft_id ON inspections(aircraft_id, completed_at_ms, id);
+CREATE INDEX IF NOT EXISTS idx_inspections_technician_id ON inspections(technician_id, completed_at_ms, id);
+CREATE INDEX IF NOT EXISTS idx_tasks_inspection_id ON tasks(inspection_id);
+CREATE INDEX IF NOT EXISTS idx_attachments_task_id ON attachments(task_id);
+CREATE INDEX IF NOT EXISTS idx_attachments_remote_key ON attachments(remote_key);
+"""
+
+
+def default_archive_path(db_path) -> Path:
+    db_path = Path(db_path)
+    return db_path.with_name(f"{db_path.stem}_archive{db_path.suffix or '.db'}")
+
+
+def open_archive(archive_path) -> sqlite3.Connection:
+    """Writable connection to the archive database, created on first use."""
+    connection = sqlite3.connect(archive_path, isolation_level=None)
+    connection.executescript(ARCHIVE_SCHEMA)
+    return connection
+
+
+def _select_batch(
+    hot: sqlite3.Connection, table: str, key: str, ids: Sequence
+) -> List[tuple]:
+    columns = ", ".join(ARCHIVE_COLUMNS[table])
+    placeholders = ",".join("?" for _ in ids)
+    return hot.execute(
+        f"SELECT {columns} FROM {table} WHERE {key} IN ({placeholders})", tuple(ids)
+    ).fetchall()
+
+
+def _archive_batch(hot: sqlite3.Connection, cold: sqlite3.Connection, cutoff_ms: int, batch_size: int) -> Dict[str, int]:
+    """Move one batch. Returns rows moved per table (all 0 when nothing is left)."""
+    moved = {table: 0 for table in ARCHIVE_COLUMNS}
+    hot.execute("BEGIN IMMEDIATE")
+    try:
+        inspection_ids = [
+            r[0]
+            for r in hot.execute(
+                """
+                SELECT id FROM inspections
+                WHERE status = 'completed' AND completed_at_ms < ?
+                LIMIT ?
+                """,
+                (cutoff_ms, batch_size),
+            )
+        ]
+        if not inspection_ids:
+            hot.execute("COMMIT")
+            return moved
+
+        rows = {"inspections": _select_batch(hot, "inspections", "id", inspection_ids)}
+        rows["tasks"] = _select_batch(hot, "tasks", "inspection_id", inspection_ids)
+        task_ids = [r[0] for r in rows["tasks"]]
+        rows["attachments"] = _select_batch(hot, "attachments", "task_id", task_ids) if task_ids else []
+
+        cold.execute("BEGIN")
+        try:
+            for table, table_rows in rows.items():
+                columns = ARCHIVE_COLUMNS[table]
+                cold.executemany(
+                    f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) "
+                    f"VALUES ({', '.join('?' for _ in columns)})",
+                    table_rows,
+                )
+                moved[table] = len(table_rows)
+            cold.execute("COMMIT")
+        except BaseException:
+            cold.execute("ROLLBACK")
+            raise
+
+        # tasks and attachments go with ON DELETE CASCADE
+        hot.execute(
+            f"DELETE FROM inspections WHERE id IN ({','.join('?' for _ in inspection_ids)})",
+            inspection_ids,
+        )
+        hot.execute("COMMIT")
+    except BaseException:
+        if hot.in_transaction:
+            hot.execute("ROLLBACK")
+        raise
+    return moved
+
+
+def archive_completed(
+    db_path,
+    archive_path=None,
+    older_than_days: float = ARCHIVE_AFTER_DAYS,
+    batch_size: int = BATCH_SIZE,
+    max_batches: int = 0,
+    pause_s: float = BATCH_PAUSE_S,
+) -> Dict[str, int]:
+    """
+    Move inspections completed more than `older_than_days` ago (and their
+    tasks/attachments) to the archive. `max_batches` > 0 stops early, for
+    callers that spread the work out. Returns rows moved per table.
+    """
+    archive_path = archive_path or default_archive_path(db_path)
+    cutoff_ms = int((time.time() - older_than_days * 86400) * 1000)
+    totals = {table: 0 for table in ARCHIVE_COLUMNS}
+
+    hot = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+    hot.execute("PRAGMA foreign_keys = ON")
+    cold = open_archive(archive_path)
+    try:
+        batches = 0
+        while not max_batches or batches < max_batches:
+            moved = _archive_batch(hot, cold, cutoff_ms, batch_size)
+            if not moved["inspections"]:
+                break
+            for table, count in moved.items():
+                totals[table] += count
+            batches += 1
+            time.sleep(pause_s)
+    finally:
+        hot.close()
+        cold.close()
+    return totals
+
+
+def stats(db_path, archive_path=None) -> Dict[str, Dict[str, int]]:
+    archive_path = archive_path or default_archive_path(db_path)
+    result: Dict[str, Dict[str, int]] = {}
+    for side, path in (("hot", db_path), ("archive", archive_path)):
+        if not Path(path).exists():
+            result[side] = {table: 0 for table in ARCHIVE_COLUMNS}
+            continue
+        with sqlite3.connect(path) as conn:
+            result[side] = {
+                table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ARCHIVE_COLUMNS
+            }
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive old completed inspections")
+    parser.add_argument("command", choices=("run", "stats"))
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    parser.add_argument("--archive-db", type=Path, default=None)
+    parser.add_argument("--older-than-days", type=float, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    archive_db = args.archive_db or default_archive_path(args.db)
+    if args.command == "run":
+        moved = archive_completed(args.db, archive_db, args.older_than_days, args.batch_size)
+        print(
+            f"Archived {moved['inspections']} inspections, {moved['tasks']} tasks, "
+            f"{moved['attachments']} attachments to {archive_db}"
+        )
+    else:
+        for side, counts in stats(args.db, archive_db).items():
+            print(side, " ".join(f"{table}={count}" for table, count in counts.items()))
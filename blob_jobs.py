@@ -0,0 +1,314 @@
+"""
+blob_jobs.py
+
+Post-upload processing of attachment blobs, off the request path.
+
+/attachments/upload stores the bytes, queues a job in the blob_jobs table
+(schema.sql) and returns. A small pool of worker threads in each process
+then claims jobs and, for each blob:
+
+  - computes its sha256 (attachments.content_sha256; sha256_verified says
+    whether it matches the sha256 the client declared)
+  - reads the image dimensions of PNG, JPEG and GIF files
+  - writes a PNG preview (at most PREVIEW_MAX_SIDE px) for PNGs, stored as
+    blob_store.preview_key(remote_key)
+
+Results are kept on the job row and copied onto every attachments row with
+that remote_key. Rows whose metadata is pushed later are filled in by a
+trigger when they are inserted. The attachments row's updated_at is bumped,
+so devices pull the new processing_status:
+
+  pending     queued or being processed
+  processed   done
+  failed      gave up after MAX_ATTEMPTS (blob_jobs.last_error says why)
+
+Claims are atomic (BEGIN IMMEDIATE), so any number of processes can run a
+pool. A job whose worker died is claimed again once its lease expires.
+Failed attempts are retried with exponential backoff.
+"""
+
+import hashlib
+import io
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import blob_store
+import image_preview
+
+PREVIEW_MAX_SIDE = 256
+MAX_ATTEMPTS = 5
+RETRY_BASE_S = 10          # 10s, 20s, 40s, ...
+LEASE_S = 5 * 60           # a claimed job is taken back after this long
+POLL_INTERVAL_S = 2.0
+BUSY_TIMEOUT_S = 5.0
+
+# Same columns the schema.sql triggers copy onto attachments
+RESULT_COLUMNS = ("processing_status", "content_sha256", "image_width", "image_height", "preview_key")
+
+
+def _log(message: str) -> None:
+    print(f"[blob_jobs {os.getpid()}] {message}", file=sys.stderr, flush=True)
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(db_path, isolation_level=None, timeout=BUSY_TIMEOUT_S)
+    connection.execute("PRAGMA foreign_keys = ON")
+    return connection
+
+
+def enqueue(connection: sqlite3.Connection, remote_key: str) -> None:
+    """Queue (or re-queue, after a re-upload) processing of `remote_key`."""
+    connection.execute(
+        """
+        INSERT INTO blob_jobs (remote_key) VALUES (?)
+        ON CONFLICT (remote_key) DO UPDATE SET
+            state = 'queued',
+            attempts = 0,
+            run_after_ms = 0,
+            locked_by = NULL,
+            locked_until_ms = NULL,
+            last_error = NULL,
+            processing_status = 'pending',
+            content_sha256 = NULL,
+            image_width = NULL,
+            image_height = NULL,
+            preview_key = NULL,
+            updated_at = strftime('%Y-%m-%dT%H:%M:%SZ', 'now')
+        """,
+        (remote_key,),
+    )
+
+
+def claim(connection: sqlite3.Connection, worker_id: str, limit: int = 1) -> List[Dict[str, Any]]:
+    """
+    Take up to `limit` runnable jobs (queued and due, or with an expired
+    lease). A job whose lease expired on its last attempt (its worker kept
+    dying on it) is failed instead of being claimed again.
+    """
+    now = _now_ms()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        expired = [
+            r[0] for r in connection.execute(
+                """
+                UPDATE blob_jobs
+                SET state = 'failed', processing_status = 'failed', locked_by = NULL, locked_until_ms = NULL,
+                    last_error = IFNULL(last_error, 'lease expired on every attempt'),
+                    updated_at = strftime('%Y-%m-%dT%H:%M:%SZ', 'now')
+                WHERE state = 'running' AND locked_until_ms < ? AND attempts >= ?
+                RETURNING remote_key
+                """,
+                (now, MAX_ATTEMPTS),
+            ).fetchall()
+        ]
+        for remote_key in expired:
+            _apply_to_attachments(connection, remote_key)
+        rows = connection.execute(
+            """
+            SELECT id, remote_key, attempts FROM blob_jobs
+            WHERE (state = 'queued' AND run_after_ms <= ?)
+               OR (state = 'running' AND locked_until_ms < ?)
+            ORDER BY id
+            LIMIT ?
+            """,
+            (now, now, limit),
+        ).fetchall()
+        for job_id, _, _ in rows:
+            connection.execute(
+                """
+                UPDATE blob_jobs
+                SET state = 'running', attempts = attempts + 1, locked_by = ?, locked_until_ms = ?
+                WHERE id = ?
+                """,
+                (worker_id, now + LEASE_S * 1000, job_id),
+            )
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    return [{"id": r[0], "remote_key": r[1], "attempts": r[2] + 1} for r in rows]
+
+
+def process(upload_dir: str, remote_key: str) -> Dict[str, Any]:
+    """Do the work for one blob. Raises OSError / ImageError on failure."""
+    path = blob_store.blob_path(upload_dir, remote_key)
+    sha256 = hashlib.sha256()
+    head = b""
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(chunk)
+            if len(head) < image_preview.PROBE_BYTES:
+                head += chunk[:image_preview.PROBE_BYTES - len(head)]
+
+    result: Dict[str, Any] = {"content_sha256": sha256.hexdigest()}
+    image = image_preview.probe(head)
+    if image:
+        kind, result["image_width"], result["image_height"] = image
+        if kind == "png" and result["image_width"] * result["image_height"] <= image_preview.MAX_SOURCE_PIXELS:
+            with open(path, "rb") as f:
+                preview = image_preview.png_thumbnail(f.read(), PREVIEW_MAX_SIDE)
+            key = blob_store.preview_key(remote_key)
+            blob_store.save(upload_dir, key, io.BytesIO(preview))
+            result["preview_key"] = key
+    return result
+
+
+def _apply_to_attachments(connection: sqlite3.Connection, remote_key: str) -> None:
+    # same "never sorts before the current version" rule as sync_app._next_updated_at
+    connection.execute(
+        f"""
+        UPDATE attachments
+        SET ({', '.join(RESULT_COLUMNS)}) =
+                (SELECT {', '.join(RESULT_COLUMNS)} FROM blob_jobs WHERE remote_key = ?),
+            updated_at = CASE
+                WHEN updated_at_ms > CAST(strftime('%s', 'now') AS INTEGER) * 1000 THEN updated_at
+                ELSE strftime('%Y-%m-%dT%H:%M:%SZ', 'now')
+            END
+        WHERE remote_key = ?
+        """,
+        (remote_key, remote_key),
+    )
+
+
+def complete(connection: sqlite3.Connection, job: Dict[str, Any], result: Dict[str, Any]) -> None:
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        connection.execute(
+            """
+            UPDATE blob_jobs
+            SET state = 'done', processing_status = 'processed', locked_by = NULL, locked_until_ms = NULL,
+                last_error = NULL, content_sha256 = ?, image_width = ?, image_height = ?, preview_key = ?,
+                updated_at = strftime('%Y-%m-%dT%H:%M:%SZ', 'now')
+            WHERE id = ? AND state = 'running'
+            """,
+            (
+                result.get("content_sha256"),
+                result.get("image_width"),
+                result.get("image_height"),
+                result.get("preview_key"),
+                job["id"],
+            ),
+        )
+        _apply_to_attachments(connection, job["remote_key"])
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+
+
+def fail(connection: sqlite3.Connection, job: Dict[str, Any], error: str) -> None:
+    """Schedule a retry, or give up after MAX_ATTEMPTS."""
+    if job["attempts"] < MAX_ATTEMPTS:
+        delay_ms = RETRY_BASE_S * 1000 * 2 ** (job["attempts"] - 1)
+        connection.execute(
+            """
+            UPDATE blob_jobs
+            SET state = 'queued', run_after_ms = ?, locked_by = NULL, locked_until_ms = NULL, last_error = ?
+            WHERE id = ? AND state = 'running'
+            """,
+            (_now_ms() + delay_ms, error, job["id"]),
+        )
+        return
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        connection.execute(
+            """
+            UPDATE blob_jobs
+            SET state = 'failed', processing_status = 'failed', locked_by = NULL, locked_until_ms = NULL,
+                last_error = ?, updated_at = strftime('%Y-%m-%dT%H:%M:%SZ', 'now')
+            WHERE id = ? AND state = 'running'
+            """,
+            (error, job["id"]),
+        )
+        _apply_to_attachments(connection, job["remote_key"])
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+
+
+def run_one(connection: sqlite3.Connection, upload_dir: str, worker_id: str) -> bool:
+    """Claim and process one job. Returns False when nothing was runnable."""
+    jobs = claim(connection, worker_id)
+    if not jobs:
+        return False
+    job = jobs[0]
+    try:
+        result = process(upload_dir, job["remote_key"])
+    except Exception as e:  # a bad blob must not keep its job running forever
+        _log(f"{job['remote_key']} attempt {job['attempts']} failed: {e!r}")
+        fail(connection, job, str(e) or repr(e))
+    else:
+        complete(connection, job, result)
+    return True
+
+
+def queue_stats(connection: sqlite3.Connection) -> Dict[str, int]:
+    return dict(connection.execute("SELECT state, COUNT(*) FROM blob_jobs GROUP BY state").fetchall())
+
+
+class BlobWorkerPool:
+    """
+    `workers` threads per process running jobs. They don't claim new work
+    while `busy()` says the process is under load, and wake up early when
+    notify() is called after an enqueue.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        upload_dir: str,
+        workers: int = 2,
+        busy: Callable[[], bool] = lambda: False,
+    ):
+        self.db_path = db_path
+        self.upload_dir = upload_dir
+        self.workers = workers
+        self.busy = busy
+        self.processed = 0
+        self._wake = threading.Event()
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self) -> None:
+        """Start the threads in this process (again after a fork)."""
+        if self.workers <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._wake = threading.Event()
+            for n in range(self.workers):
+                threading.Thread(target=self._run, args=(n,), name=f"blob-worker-{n}", daemon=True).start()
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    def _run(self, n: int) -> None:
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:{n}"
+        connection = _connect(self.db_path)
+        while True:
+            try:
+                if not self.busy() and run_one(connection, self.upload_dir, worker_id):
+                    with self._lock:
+                        self.processed += 1
+                    continue
+            except Exception as e:
+                _log(f"worker {worker_id} error: {e!r}")
+            self._wake.wait(POLL_INTERVAL_S)
+            self._wake.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with _connect(self.db_path) as connection:
+            queue = queue_stats(connection)
+        return {"workers": self.workers, "processed": self.processed, "queue": queue}
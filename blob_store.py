@@ -0,0 +1,318 @@
+"""
+blob_store.py
+
+On-disk layout of uploaded attachment blobs, and garbage collection of
+blobs no attachment row points to.
+
+Blobs are stored under two levels of fan-out directories taken from a
+hash of their remote_key:
+
+  uploads/<h[0:2]>/<h[2:4]>/<remote_key>      h = sha1(remote_key).hexdigest()
+
+so no directory grows past a few hundred entries even with millions of
+files. remote_key itself (what clients store and send back through
+/sync/jobs) is unchanged, so no database rows need rewriting. Files from
+the old flat layout (uploads/<remote_key>) are moved with
+
+  python blob_store.py migrate
+
+Blobs are uploaded before their metadata row arrives through /sync/jobs.
+A blob whose row never arrives (the client crashed, or the row was skipped
+for a missing remote_key) or whose row was deleted later stays on disk.
+Such files are removed by
+
+  python blob_store.py gc [--grace-hours 48] [--max-files 5000] [--dry-run]
+
+Each run scans at most `max_files` files. It resumes where the previous
+run stopped, using a cursor kept in uploads/.gc_cursor.json, and wraps
+around at the end. Remote keys are looked up in batches against
+attachments.remote_key, in both warehouse.db and the archive database.
+Files younger than the grace period are never removed, because their
+metadata may still be on its way. Previews live as long as their source
+blob does.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import archive
+
+BASE_DIR = Path(__file__).resolve().parent
+DB_PATH = Path(os.environ.get("WAREHOUSE_DB_PATH") or BASE_DIR / "warehouse.db")
+UPLOAD_DIR = BASE_DIR / "uploads"
+
+GC_GRACE_S = 48 * 60 * 60
+GC_MAX_FILES = 5000        # files looked at per gc run
+GC_BATCH_SIZE = 500        # remote_keys per lookup query
+MIGRATE_BATCH_SIZE = 1000
+MIGRATE_PAUSE_S = 0.01     # between migrate batches, to keep disk I/O bounded
+
+CURSOR_NAME = ".gc_cursor.json"
+TMP_PREFIX = ".upload-"
+
+# Derived blobs (blob_jobs.py) are stored as <remote_key><suffix> and live
+# as long as the blob they were made from
+PREVIEW_SUFFIX = ".preview.png"
+
+
+def _shard_dirs(remote_key: str) -> Tuple[str, str]:
+    digest = hashlib.sha1(remote_key.encode("utf-8")).hexdigest()
+    return digest[0:2], digest[2:4]
+
+
+def is_valid_key(remote_key: str) -> bool:
+    return bool(remote_key) and remote_key == os.path.basename(remote_key) and not remote_key.startswith(".")
+
+
+def preview_key(remote_key: str) -> str:
+    return f"{remote_key}{PREVIEW_SUFFIX}"
+
+
+def source_key(key: str) -> str:
+    """The uploaded blob `key` was derived from (`key` itself for uploads)."""
+    return key[:-len(PREVIEW_SUFFIX)] if key.endswith(PREVIEW_SUFFIX) else key
+
+
+def blob_path(upload_dir, remote_key: str) -> str:
+    """Where the blob for `remote_key` lives."""
+    if not is_valid_key(remote_key):
+        raise ValueError(f"invalid remote_key: {remote_key!r}")
+    return os.path.join(upload_dir, *_shard_dirs(remote_key), remote_key)
+
+
+def save(upload_dir, remote_key: str, stream: BinaryIO) -> int:
+    """
+    Write `stream` as the blob for `remote_key` and return its size. The
+    file is written next to its final path and renamed into place, so a
+    reader (or the gc) never sees half a file.
+    """
+    path = blob_path(upload_dir, remote_key)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=TMP_PREFIX, dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = stream.read(1024 * 1024)
+                if not chunk:
+                    break
+                out.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return os.path.getsize(path)
+
+
+# ----------------------------
+# Migration from the flat layout
+# ----------------------------
+
+def migrate_flat(upload_dir, batch_size: int = MIGRATE_BATCH_SIZE, pause_s: float = MIGRATE_PAUSE_S) -> Dict[str, int]:
+    """Move uploads/<remote_key> files into their fan-out directories."""
+    moved = 0
+    moved_bytes = 0
+    while True:
+        batch: List[os.DirEntry] = []
+        with os.scandir(upload_dir) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False) and is_valid_key(entry.name):
+                    batch.append(entry)
+                    if len(batch) >= batch_size:
+                        break
+        if not batch:
+            break
+        for entry in batch:
+            target = blob_path(upload_dir, entry.name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            size = entry.stat(follow_symlinks=False).st_size
+            # same file system: a rename, no data is copied
+            os.replace(entry.path, target)
+            moved += 1
+            moved_bytes += size
+        time.sleep(pause_s)
+    return {"moved": moved, "moved_bytes": moved_bytes}
+
+
+# ----------------------------
+# Orphan collection
+# ----------------------------
+
+def _leaf_dirs(upload_dir, after: str) -> Iterator[str]:
+    """Fan-out leaf directories ("ab/cd") in order, starting after `after`."""
+    def subdirs(path: str) -> List[str]:
+        try:
+            with os.scandir(path) as entries:
+                return sorted(
+                    e.name for e in entries
+                    if e.is_dir(follow_symlinks=False) and len(e.name) == 2 and not e.name.startswith(".")
+                )
+        except OSError:
+            return []
+
+    for first in subdirs(str(upload_dir)):
+        if after and first < after[:2]:
+            continue
+        for second in subdirs(os.path.join(upload_dir, first)):
+            leaf = f"{first}/{second}"
+            if leaf > after:
+                yield leaf
+
+
+def _read_cursor(upload_dir) -> str:
+    try:
+        with open(os.path.join(upload_dir, CURSOR_NAME), encoding="utf-8") as f:
+            return json.load(f).get("after", "")
+    except (OSError, ValueError):
+        return ""
+
+
+def _write_cursor(upload_dir, after: str) -> None:
+    path = os.path.join(upload_dir, CURSOR_NAME)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump({"after": after}, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def _referenced(connections: Sequence[sqlite3.Connection], keys: Sequence[str]) -> set:
+    found: set = set()
+    for start in range(0, len(keys), GC_BATCH_SIZE):
+        chunk = keys[start:start + GC_BATCH_SIZE]
+        placeholders = ",".join("?" for _ in chunk)
+        for connection in connections:
+            found.update(
+                r[0]
+                for r in connection.execute(
+                    f"SELECT remote_key FROM attachments WHERE remote_key IN ({placeholders})", tuple(chunk)
+                )
+            )
+    return found
+
+
+def _drop_jobs(connection: sqlite3.Connection, keys: Sequence[str]) -> None:
+    try:
+        connection.execute(
+            f"DELETE FROM blob_jobs WHERE remote_key IN ({','.join('?' for _ in keys)})", tuple(keys)
+        )
+    except sqlite3.OperationalError:
+        pass  # database older than blob_jobs
+
+
+def collect_orphans(
+    db_path,
+    upload_dir,
+    archive_path=None,
+    grace_s: float = GC_GRACE_S,
+    max_files: int = GC_MAX_FILES,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    """
+    Remove blobs that no attachment row (hot or archived) refers to and that
+    are older than `grace_s`, looking at up to `max_files` files from where
+    the last run stopped. Returns counts and reclaimed bytes.
+    """
+    archive_path = archive_path or archive.default_archive_path(db_path)
+    # writable only to drop the processing jobs of removed blobs
+    mode = "ro" if dry_run else "rw"
+    connections = [sqlite3.connect(f"file:{db_path}?mode={mode}", uri=True, isolation_level=None, timeout=30)]
+    if Path(archive_path).exists():
+        connections.append(sqlite3.connect(f"file:{archive_path}?mode=ro", uri=True))
+
+    report = {"scanned": 0, "removed": 0, "reclaimed_bytes": 0, "kept_young": 0, "wrapped": False}
+    cutoff = time.time() - grace_s
+    after = _read_cursor(upload_dir)
+    last_leaf: Optional[str] = None
+    try:
+        for leaf in _leaf_dirs(upload_dir, after):
+            directory = os.path.join(upload_dir, leaf)
+            candidates: List[Tuple[str, os.stat_result]] = []
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    report["scanned"] += 1
+                    st = entry.stat(follow_symlinks=False)
+                    if st.st_mtime > cutoff:
+                        report["kept_young"] += 1
+                    else:
+                        candidates.append((entry.name, st))
+
+            # leftover temp files from interrupted uploads are orphans too
+            keys = sorted({source_key(name) for name, _ in candidates if not name.startswith(TMP_PREFIX)})
+            referenced = _referenced(connections, keys)
+            removed_keys = []
+            for name, st in candidates:
+                if source_key(name) in referenced:
+                    continue
+                if not dry_run:
+                    try:
+                        os.remove(os.path.join(directory, name))
+                    except FileNotFoundError:
+                        continue
+                    removed_keys.append(name)
+                report["removed"] += 1
+                report["reclaimed_bytes"] += st.st_size
+            if removed_keys:
+                _drop_jobs(connections[0], removed_keys)
+
+            last_leaf = leaf
+            if report["scanned"] >= max_files:
+                break
+        else:
+            report["wrapped"] = True
+    finally:
+        for connection in connections:
+            connection.close()
+
+    if not dry_run:
+        _write_cursor(upload_dir, "" if report["wrapped"] else (last_leaf or ""))
+    return report
+
+
+def stats(upload_dir) -> Dict[str, int]:
+    files = 0
+    total_bytes = 0
+    flat = 0
+    for root, dirs, names in os.walk(upload_dir):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in names:
+            if name.startswith("."):
+                continue
+            files += 1
+            total_bytes += os.path.getsize(os.path.join(root, name))
+            if root == str(upload_dir):
+                flat += 1
+    return {"files": files, "bytes": total_bytes, "flat_files": flat}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Attachment blob storage")
+    parser.add_argument("command", choices=("migrate", "gc", "stats"))
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    parser.add_argument("--archive-db", type=Path, default=None)
+    parser.add_argument("--upload-dir", type=Path, default=UPLOAD_DIR)
+    parser.add_argument("--grace-hours", type=float, default=GC_GRACE_S / 3600)
+    parser.add_argument("--max-files", type=int, default=GC_MAX_FILES)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        result = migrate_flat(args.upload_dir)
+        print(f"Moved {result['moved']} files ({result['moved_bytes']} bytes) into fan-out directories")
+    elif args.command == "gc":
+        result = collect_orphans(
+            args.db, args.upload_dir, args.archive_db, args.grace_hours * 3600, args.max_files, args.dry_run
+        )
+        print(json.dumps(result))
+    else:
+        print(json.dumps(stats(args.upload_dir)))
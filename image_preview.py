@@ -0,0 +1,192 @@
+"""
+image_preview.py
+
+Standard-library image probing and PNG thumbnails for uploaded blobs.
+
+  probe(head)                -> ("png" | "jpeg" | "gif", width, height) or None
+  png_thumbnail(data, 256)   -> PNG bytes no larger than 256px on either side
+
+probe() only needs the first few KB of a PNG or GIF. For JPEG it needs the
+bytes up to the frame header, which usually comes after the EXIF block, so
+callers pass up to PROBE_BYTES.
+
+png_thumbnail() decodes non-interlaced 8-bit PNGs (grey, grey+alpha, RGB,
+RGBA, palette) in pure Python and samples them down (nearest neighbour) to
+RGB or RGBA. Decoding touches every byte in Python, so it refuses images
+over MAX_SOURCE_PIXELS. JPEG thumbnails would need a real decoder, so JPEGs
+only get their dimensions.
+"""
+
+import struct
+import zlib
+from typing import List, Optional, Tuple
+
+PROBE_BYTES = 256 * 1024
+MAX_SOURCE_PIXELS = 4_000_000
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# JPEG start-of-frame markers (baseline, progressive, lossless, ...)
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# PNG colour type -> channels
+_PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+
+class ImageError(ValueError):
+    """The image cannot be decoded (unsupported variant or corrupt)."""
+
+
+def probe(head: bytes) -> Optional[Tuple[str, int, int]]:
+    if head.startswith(PNG_SIGNATURE) and head[12:16] == b"IHDR" and len(head) >= 24:
+        width, height = struct.unpack(">II", head[16:24])
+        return "png", width, height
+    if head[:6] in (b"GIF87a", b"GIF89a") and len(head) >= 10:
+        width, height = struct.unpack("<HH", head[6:10])
+        return "gif", width, height
+    if head[:2] == b"\xff\xd8":
+        return _probe_jpeg(head)
+    return None
+
+
+def _probe_jpeg(data: bytes) -> Optional[Tuple[str, int, int]]:
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:  # no length field
+            pos += 2
+            continue
+        (length,) = struct.unpack(">H", data[pos + 2:pos + 4])
+        if marker in _JPEG_SOF:
+            if pos + 9 > len(data):
+                return None
+            height, width = struct.unpack(">HH", data[pos + 5:pos + 9])
+            return "jpeg", width, height
+        pos += 2 + length
+    return None
+
+
+# ----------------------------
+# PNG decode / encode
+# ----------------------------
+
+def _chunks(data: bytes):
+    pos = len(PNG_SIGNATURE)
+    while pos + 8 <= len(data):
+        length, kind = struct.unpack(">I4s", data[pos:pos + 8])
+        yield kind, data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+
+
+def _paeth(a: int, b: int, c: int) -> int:
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    return b if pb <= pc else c
+
+
+def _unfilter(raw: bytes, width: int, height: int, bpp: int) -> List[bytearray]:
+    stride = width * bpp
+    if len(raw) < height * (stride + 1):
+        raise ImageError("truncated image data")
+    rows: List[bytearray] = []
+    prev = bytearray(stride)
+    pos = 0
+    for _ in range(height):
+        kind = raw[pos]
+        line = bytearray(raw[pos + 1:pos + 1 + stride])
+        pos += 1 + stride
+        if kind == 1:
+            for i in range(bpp, stride):
+                line[i] = (line[i] + line[i - bpp]) & 0xFF
+        elif kind == 2:
+            line = bytearray((x + p) & 0xFF for x, p in zip(line, prev))
+        elif kind == 3:
+            for i in range(stride):
+                left = line[i - bpp] if i >= bpp else 0
+                line[i] = (line[i] + ((left + prev[i]) >> 1)) & 0xFF
+        elif kind == 4:
+            for i in range(stride):
+                left = line[i - bpp] if i >= bpp else 0
+                up_left = prev[i - bpp] if i >= bpp else 0
+                line[i] = (line[i] + _paeth(left, prev[i], up_left)) & 0xFF
+        elif kind != 0:
+            raise ImageError(f"bad filter type {kind}")
+        rows.append(line)
+        prev = line
+    return rows
+
+
+def _encode_png(width: int, height: int, channels: int, rows: List[bytes]) -> bytes:
+    def chunk(kind: bytes, body: bytes) -> bytes:
+        return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+
+    color_type = 6 if channels == 4 else 2
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)
+    raw = b"".join(b"\x00" + bytes(row) for row in rows)
+    return PNG_SIGNATURE + chunk(b"IHDR", ihdr) + chunk(b"IDAT", zlib.compress(raw, 6)) + chunk(b"IEND", b"")
+
+
+def png_thumbnail(data: bytes, max_side: int) -> bytes:
+    """PNG `data` scaled to fit `max_side` (never enlarged). Raises ImageError."""
+    header = palette = None
+    idat = []
+    for kind, body in _chunks(data):
+        if kind == b"IHDR":
+            if len(body) < 13:
+                raise ImageError("truncated IHDR")
+            header = struct.unpack(">IIBBBBB", body[:13])
+        elif kind == b"PLTE":
+            palette = body
+        elif kind == b"IDAT":
+            idat.append(body)
+        elif kind == b"IEND":
+            break
+    if header is None:
+        raise ImageError("not a PNG")
+    width, height, depth, color_type, _, _, interlace = header
+    if depth != 8 or interlace or color_type not in _PNG_CHANNELS:
+        raise ImageError(f"unsupported PNG (bit depth {depth}, colour type {color_type}, interlace {interlace})")
+    if color_type == 3 and not palette:
+        raise ImageError("palette PNG without PLTE")
+    if palette:
+        palette = palette.ljust(256 * 3, b"\x00")  # out-of-range indexes read black
+    if width * height > MAX_SOURCE_PIXELS:
+        raise ImageError(f"image too large for a preview ({width}x{height})")
+
+    try:
+        raw = zlib.decompress(b"".join(idat))
+    except zlib.error as e:
+        raise ImageError(f"corrupt image data: {e}") from None
+    bpp = _PNG_CHANNELS[color_type]
+    rows = _unfilter(raw, width, height, bpp)
+
+    scale = max(width, height) / max_side if max(width, height) > max_side else 1.0
+    out_w = max(1, round(width / scale))
+    out_h = max(1, round(height / scale))
+    out_channels = 4 if color_type in (4, 6) else 3
+    xs = [min(width - 1, int(x * scale)) for x in range(out_w)]
+
+    out_rows = []
+    for y in range(out_h):
+        src = rows[min(height - 1, int(y * scale))]
+        out = bytearray()
+        for x in xs:
+            if color_type == 2 or color_type == 6:
+                out += src[x * bpp:x * bpp + bpp]
+            elif color_type == 3:
+                index = src[x] * 3
+                out += palette[index:index + 3]
+            else:  # grey, grey + alpha
+                grey = src[x * bpp]
+                out += bytes((grey, grey, grey))
+                if color_type == 4:
+                    out.append(src[x * bpp + 1])
+        out_rows.append(out)
+    return _encode_png(out_w, out_h, out_channels, out_rows)
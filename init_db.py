@@ -1,21 +1,47 @@
+import argparse
+import os
 from pathlib import Path
 import sqlite3
 
-from seed_central_db import seed  
+from migrate_db import migrate
+from seed_central_db import seed
 
 BASE_DIR = Path(__file__).resolve().parent
 DB_PATH = BASE_DIR / "warehouse.db"
 SCHEMA_PATH = BASE_DIR / "schema.sql"
+COMPACT_SCHEMA_PATH = BASE_DIR / "schema_compact.sql"
 
+# "text"    -> UUID keys as TEXT (default, what legacy/crud_app.py expects)
+# "compact" -> UUID keys as 16-byte BLOBs (schema_compact.sql)
+KEY_LAYOUTS = ("text", "compact")
+DEFAULT_KEY_LAYOUT = os.environ.get("WAREHOUSE_KEY_LAYOUT", "text")
+
+
+def init_db(db_path: Path = DB_PATH, key_layout: str = DEFAULT_KEY_LAYOUT) -> None:
+    if key_layout not in KEY_LAYOUTS:
+        raise ValueError(f"key_layout must be one of {KEY_LAYOUTS}")
 
-def init_db() -> None:
     schema_sql = SCHEMA_PATH.read_text(encoding="utf-8")
-    with sqlite3.connect(DB_PATH) as conn:
+    with sqlite3.connect(db_path) as conn:
+        # only takes effect on a new, empty file; lets maintenance.py return
+        # free pages to the OS with incremental_vacuum
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL;")
+        # persistent; readers (snapshot builds, pulls) then don't block writers
+        conn.execute("PRAGMA journal_mode = WAL;")
         conn.execute("PRAGMA foreign_keys = ON;")
+        if key_layout == "compact":
+            # creates the four sync tables first; schema.sql then skips them
+            conn.executescript(COMPACT_SCHEMA_PATH.read_text(encoding="utf-8"))
+        # upgrade older files before schema.sql indexes the new columns
+        migrate(conn)
         conn.executescript(schema_sql)
 
 
 if __name__ == "__main__":
-    init_db()
+    parser = argparse.ArgumentParser(description="Create the central database schema")
+    parser.add_argument("--key-layout", choices=KEY_LAYOUTS, default=DEFAULT_KEY_LAYOUT)
+    args = parser.parse_args()
+
+    init_db(DB_PATH, args.key_layout)
     # seed(DB_PATH)  # always seed the SAME db file
     print(f"Initialized + seeded database at {DB_PATH}")
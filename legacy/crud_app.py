@@ -1,22 +1,53 @@
+import base64
 from functools import wraps
+import json
+import os
 import sqlite3
-from typing import Any, Dict, Optional
+import sys
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from flask import Flask, jsonify, request
 from werkzeug.security import check_password_hash, generate_password_hash
 
+# row_cache.py and replicas.py live in the repo root, next to sync_app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import replicas  # noqa: E402
+import row_cache  # noqa: E402
+
 API_KEY = "api_warehouse_student_key_1234567890abcdef"
 DB_PATH = "warehouse.db"
 
 app = Flask(__name__)
 
+# fetch_*_by_id results, kept current by the writes below and PRAGMA data_version
+lookup_cache = row_cache.RowCache(DB_PATH)
+
+# List endpoints read the replica sync_app.py (or `python replicas.py
+# refresh --every 30`) keeps of DB_PATH, with WAREHOUSE_READ_REPLICA=1
+read_replica = replicas.ReadReplica(DB_PATH, enabled=os.environ.get("WAREHOUSE_READ_REPLICA") == "1")
+
 
 def get_connection() -> sqlite3.Connection:
     connection = sqlite3.connect(DB_PATH)
+    # needed for ON DELETE CASCADE (and so cascaded deletes are tombstoned)
+    connection.execute("PRAGMA foreign_keys = ON")
     connection.row_factory = sqlite3.Row
     return connection
 
 
+def get_read_connection() -> sqlite3.Connection:
+    """
+    For list reads: the read replica while it is fresh, unless the request
+    sends X-Read-Consistency: primary (e.g. right after its own write).
+    """
+    view = read_replica.current()
+    if view is None or request.headers.get("X-Read-Consistency", "").lower() == "primary":
+        read_replica.count_read("primary")
+        return get_connection()
+    read_replica.count_read("replica")
+    return view.pool.acquire()
+
+
 def row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
     return dict(row)
 
@@ -36,6 +67,118 @@ def require_api_key(func):
     return wrapper
 
 
+# ----------------------------
+# List paging / projection
+# ----------------------------
+
+LIST_DEFAULT_LIMIT = 100
+LIST_MAX_LIMIT = 1000
+
+TECHNICIAN_COLUMNS = ("id", "username", "display_name", "role", "created_at", "updated_at", "sync_status")
+INSPECTION_COLUMNS = (
+    "id", "aircraft_id", "status", "opened_at", "completed_at",
+    "technician_id", "created_at", "updated_at", "sync_status",
+)
+TASK_COLUMNS = (
+    "id", "inspection_id", "title", "description", "is_complete",
+    "result", "notes", "completed_at", "created_at", "updated_at", "sync_status",
+)
+
+
+def _encode_cursor(values: List[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> List[Any]:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except ValueError:
+        values = None
+    if not isinstance(values, list):
+        raise ValueError("invalid cursor")
+    return values
+
+
+def _list_limit(default: int = LIST_DEFAULT_LIMIT, maximum: int = LIST_MAX_LIMIT) -> int:
+    try:
+        limit = int(request.args.get("limit", default))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    return max(1, min(limit, maximum))
+
+
+def _projection(allowed: Sequence[str]) -> List[str]:
+    """?fields=id,title,... (default: all of `allowed`)."""
+    fields = request.args.get("fields")
+    if not fields:
+        return list(allowed)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(unknown)}")
+    return requested
+
+
+def _keyset_page(
+    connection: sqlite3.Connection,
+    table: str,
+    columns: Sequence[str],
+    where: List[str],
+    values: List[Any],
+    order_keys: Sequence[str],
+    descending: bool,
+    limit: int,
+    cursor: Optional[str],
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    One page of `table`, ordered by `order_keys` (which must end in a
+    unique column). `cursor` is the next_cursor of the previous page.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    where = list(where)
+    values = list(values)
+    if cursor:
+        key_values = _decode_cursor(cursor)
+        if len(key_values) != len(order_keys):
+            raise ValueError("invalid cursor")
+        op = "<" if descending else ">"
+        where.append(f"({', '.join(order_keys)}) {op} ({', '.join('?' for _ in order_keys)})")
+        values.extend(key_values)
+
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+    direction = "DESC" if descending else "ASC"
+    select = list(columns) + [f"{key} AS _key_{i}" for i, key in enumerate(order_keys)]
+
+    rows = connection.execute(
+        f"""
+        SELECT {', '.join(select)}
+        FROM {table}
+        {where_sql}
+        ORDER BY {', '.join(f'{key} {direction}' for key in order_keys)}
+        LIMIT ?
+        """,
+        (*values, limit),
+    ).fetchall()
+
+    items = []
+    last_key: List[Any] = []
+    for row in rows:
+        item = row_to_dict(row)
+        last_key = [item.pop(f"_key_{i}") for i in range(len(order_keys))]
+        items.append(item)
+    next_cursor = _encode_cursor(last_key) if len(rows) == limit else None
+    return items, next_cursor
+
+
+def _page_response(items: List[Dict[str, Any]], next_cursor: Optional[str]):
+    """List body stays a plain array; the next page's cursor goes in X-Next-Cursor."""
+    response = jsonify(items)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response, 200
+
+
 # ============================================================
 # NEW: CRUD for technicians_cache, inspections, tasks (UUID TEXT)
 # ============================================================
@@ -45,6 +188,10 @@ def require_api_key(func):
 # ----------------------------
 
 def fetch_technician_by_id(tech_id: str) -> Optional[Dict[str, Any]]:
+    return lookup_cache.get("technicians_cache", tech_id, lambda: _load_technician(tech_id))
+
+
+def _load_technician(tech_id: str) -> Optional[Dict[str, Any]]:
     with get_connection() as connection:
         row = connection.execute(
             """
@@ -60,15 +207,18 @@ def fetch_technician_by_id(tech_id: str) -> Optional[Dict[str, Any]]:
 @app.route("/api/v1/techniciansCache", methods=["GET"])
 @require_api_key
 def list_technicians_cache():
-    with get_connection() as connection:
-        rows = connection.execute(
-            """
-            SELECT id, username, display_name, role, created_at, updated_at, sync_status
-            FROM technicians_cache
-            ORDER BY username
-            """
-        ).fetchall()
-    return jsonify([row_to_dict(row) for row in rows]), 200
+    # Paging: ?limit=100 (max 1000) ?cursor=<X-Next-Cursor>  Projection: ?fields=id,username,...
+    try:
+        limit = _list_limit()
+        columns = _projection(TECHNICIAN_COLUMNS)
+        with get_read_connection() as connection:
+            items, next_cursor = _keyset_page(
+                connection, "technicians_cache", columns, [], [],
+                ("username", "id"), False, limit, request.args.get("cursor"),
+            )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return _page_response(items, next_cursor)
 
 
 @app.route("/api/v1/techniciansCache", methods=["POST"])
@@ -151,6 +301,7 @@ def update_technicians_cache(tech_id: str):
     except sqlite3.IntegrityError:
         return jsonify({"error": "username already exists"}), 409
 
+    lookup_cache.invalidate("technicians_cache", tech_id)
     return jsonify(fetch_technician_by_id(tech_id)), 200
 
 
@@ -164,6 +315,8 @@ def delete_technicians_cache(tech_id: str):
         )
         if cursor.rowcount == 0:
             return jsonify({"error": "technician not found"}), 404
+    lookup_cache.invalidate("technicians_cache", tech_id)
+    lookup_cache.invalidate("inspections")  # technician_id SET NULL
     return "", 204
 
 
@@ -172,6 +325,10 @@ def delete_technicians_cache(tech_id: str):
 # ----------------------------
 
 def fetch_inspection_by_id(inspection_id: str) -> Optional[Dict[str, Any]]:
+    return lookup_cache.get("inspections", inspection_id, lambda: _load_inspection(inspection_id))
+
+
+def _load_inspection(inspection_id: str) -> Optional[Dict[str, Any]]:
     with get_connection() as connection:
         row = connection.execute(
             """
@@ -189,6 +346,7 @@ def fetch_inspection_by_id(inspection_id: str) -> Optional[Dict[str, Any]]:
 @require_api_key
 def list_inspections():
     # Optional filters: ?status=outstanding|in_progress|completed  and/or ?technician_id=<uuid>
+    # Paging: ?limit=100 (max 1000) ?cursor=<X-Next-Cursor>  Projection: ?fields=id,status,...
     status = request.args.get("status")
     technician_id = request.args.get("technician_id")
 
@@ -202,21 +360,17 @@ def list_inspections():
         where.append("technician_id = ?")
         values.append(technician_id)
 
-    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
-
-    with get_connection() as connection:
-        rows = connection.execute(
-            f"""
-            SELECT id, aircraft_id, status, opened_at, completed_at,
-                   technician_id, created_at, updated_at, sync_status
-            FROM inspections
-            {where_sql}
-            ORDER BY updated_at DESC
-            """,
-            tuple(values),
-        ).fetchall()
-
-    return jsonify([row_to_dict(row) for row in rows]), 200
+    try:
+        limit = _list_limit()
+        columns = _projection(INSPECTION_COLUMNS)
+        with get_read_connection() as connection:
+            items, next_cursor = _keyset_page(
+                connection, "inspections", columns, where, values,
+                ("updated_at_ms", "id"), True, limit, request.args.get("cursor"),
+            )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return _page_response(items, next_cursor)
 
 
 @app.route("/api/v1/inspections", methods=["POST"])
@@ -225,28 +379,28 @@ def create_inspection():
     payload = request.get_json(silent=True) or {}
     inspection_id = payload.get("id")  # UUID TEXT (client-generated)
     aircraft_id = payload.get("aircraft_id")
-    status = payload.get("status")
+    # status is derived from opened_at/completed_at (generated column); ignored here
     opened_at = payload.get("opened_at")
     completed_at = payload.get("completed_at")
     technician_id = payload.get("technician_id")
     sync_status = payload.get("sync_status", "synced")
 
-    if not inspection_id or not aircraft_id or not status:
-        return jsonify({"error": "id, aircraft_id, and status are required"}), 400
+    if not inspection_id or not aircraft_id:
+        return jsonify({"error": "id and aircraft_id are required"}), 400
 
     try:
         with get_connection() as connection:
             connection.execute(
                 """
                 INSERT INTO inspections
-                    (id, aircraft_id, status, opened_at, completed_at, technician_id,
+                    (id, aircraft_id, opened_at, completed_at, technician_id,
                      created_at, updated_at, sync_status)
-                VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, ?)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, ?)
                 """,
-                (inspection_id, aircraft_id, status, opened_at, completed_at, technician_id, sync_status),
+                (inspection_id, aircraft_id, opened_at, completed_at, technician_id, sync_status),
             )
     except sqlite3.IntegrityError as e:
-        # Could be id conflict, status check fail, or technician FK fail
+        # Could be id conflict, sync_status check fail, or technician FK fail
         return jsonify({"error": "invalid data or inspection already exists"}), 409
 
     return jsonify(fetch_inspection_by_id(inspection_id)), 201
@@ -266,7 +420,6 @@ def get_inspection(inspection_id: str):
 def update_inspection(inspection_id: str):
     payload = request.get_json(silent=True) or {}
     aircraft_id = payload.get("aircraft_id")
-    status = payload.get("status")
     opened_at = payload.get("opened_at")
     completed_at = payload.get("completed_at")
     technician_id = payload.get("technician_id")
@@ -274,13 +427,13 @@ def update_inspection(inspection_id: str):
 
     if not any([
         aircraft_id,
-        status,
         opened_at is not None,
         completed_at is not None,
         technician_id is not None,
         sync_status,
     ]):
-        return jsonify({"error": "no fields to update"}), 400
+        # status alone can't be set: it follows opened_at/completed_at
+        return jsonify({"error": "no fields to update (status is derived from opened_at/completed_at)"}), 400
 
     updates = []
     values = []
@@ -288,9 +441,6 @@ def update_inspection(inspection_id: str):
     if aircraft_id:
         updates.append("aircraft_id = ?")
         values.append(aircraft_id)
-    if status:
-        updates.append("status = ?")
-        values.append(status)
     if opened_at is not None:
         updates.append("opened_at = ?")
         values.append(opened_at)
@@ -315,9 +465,10 @@ def update_inspection(inspection_id: str):
             if cursor.rowcount == 0:
                 return jsonify({"error": "inspection not found"}), 404
     except sqlite3.IntegrityError:
-        # status check / FK technician check
+        # sync_status check / FK technician check
         return jsonify({"error": "invalid data"}), 400
 
+    lookup_cache.invalidate("inspections", inspection_id)
     return jsonify(fetch_inspection_by_id(inspection_id)), 200
 
 
@@ -331,6 +482,8 @@ def delete_inspection(inspection_id: str):
         )
         if cursor.rowcount == 0:
             return jsonify({"error": "inspection not found"}), 404
+    lookup_cache.invalidate("inspections", inspection_id)
+    lookup_cache.invalidate("tasks")  # ON DELETE CASCADE
     return "", 204
 
 
@@ -339,6 +492,10 @@ def delete_inspection(inspection_id: str):
 # ----------------------------
 
 def fetch_task_by_id(task_id: str) -> Optional[Dict[str, Any]]:
+    return lookup_cache.get("tasks", task_id, lambda: _load_task(task_id))
+
+
+def _load_task(task_id: str) -> Optional[Dict[str, Any]]:
     with get_connection() as connection:
         row = connection.execute(
             """
@@ -356,6 +513,7 @@ def fetch_task_by_id(task_id: str) -> Optional[Dict[str, Any]]:
 @require_api_key
 def list_tasks():
     # Optional filters: ?inspection_id=<uuid> and/or ?is_complete=0|1
+    # Paging: ?limit=100 (max 1000) ?cursor=<X-Next-Cursor>  Projection: ?fields=id,title,...
     inspection_id = request.args.get("inspection_id")
     is_complete = request.args.get("is_complete")
 
@@ -369,21 +527,17 @@ def list_tasks():
         where.append("is_complete = ?")
         values.append(is_complete)
 
-    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
-
-    with get_connection() as connection:
-        rows = connection.execute(
-            f"""
-            SELECT id, inspection_id, title, description, is_complete,
-                   result, notes, completed_at, created_at, updated_at, sync_status
-            FROM tasks
-            {where_sql}
-            ORDER BY updated_at DESC
-            """,
-            tuple(values),
-        ).fetchall()
-
-    return jsonify([row_to_dict(row) for row in rows]), 200
+    try:
+        limit = _list_limit()
+        columns = _projection(TASK_COLUMNS)
+        with get_read_connection() as connection:
+            items, next_cursor = _keyset_page(
+                connection, "tasks", columns, where, values,
+                ("updated_at_ms", "id"), True, limit, request.args.get("cursor"),
+            )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return _page_response(items, next_cursor)
 
 
 @app.route("/api/v1/tasks", methods=["POST"])
@@ -496,6 +650,7 @@ def update_task(task_id: str):
     except sqlite3.IntegrityError:
         return jsonify({"error": "invalid data"}), 400
 
+    lookup_cache.invalidate("tasks", task_id)
     return jsonify(fetch_task_by_id(task_id)), 200
 
 
@@ -509,8 +664,294 @@ def delete_task(task_id: str):
         )
         if cursor.rowcount == 0:
             return jsonify({"error": "task not found"}), 404
+    lookup_cache.invalidate("tasks", task_id)
     return "", 204
 
 
+@app.route("/api/v1/cacheStats", methods=["GET"])
+@require_api_key
+def cache_stats():
+    return jsonify(lookup_cache.stats()), 200
+
+
+# ----------------------------
+# Batch create / update
+# ----------------------------
+
+BATCH_MAX_ITEMS = 10000
+
+# resource -> (table, fields required on create, writable fields, columns returned)
+BATCH_RESOURCES = {
+    "techniciansCache": (
+        "technicians_cache",
+        ("id", "username"),
+        ("username", "display_name", "role", "sync_status"),
+        "id, username, display_name, role, created_at, updated_at, sync_status",
+    ),
+    "inspections": (
+        "inspections",
+        ("id", "aircraft_id"),
+        ("aircraft_id", "opened_at", "completed_at", "technician_id", "sync_status"),
+        "id, aircraft_id, status, opened_at, completed_at, technician_id, "
+        "created_at, updated_at, sync_status",
+    ),
+    "tasks": (
+        "tasks",
+        ("id", "inspection_id", "title"),
+        ("inspection_id", "title", "description", "is_complete", "result", "notes",
+         "completed_at", "sync_status"),
+        "id, inspection_id, title, description, is_complete, result, notes, completed_at, "
+        "created_at, updated_at, sync_status",
+    ),
+}
+
+
+def _batch_items(payload: Any):
+    items = payload.get("items") if isinstance(payload, dict) else payload
+    if not isinstance(items, list):
+        return None
+    return items
+
+
+def _batch_fields(item: Dict[str, Any], writable) -> Dict[str, Any]:
+    """The writable fields of `item`; raises ValueError for a value that can't be stored."""
+    fields = {k: item[k] for k in writable if k in item}
+    for k, value in fields.items():
+        if isinstance(value, (dict, list)):
+            raise ValueError(f"{k} must be a string or number")
+    if fields.get("is_complete") is not None:
+        try:
+            fields["is_complete"] = int(fields["is_complete"])
+        except ValueError:
+            raise ValueError("is_complete must be 0 or 1")
+    return fields
+
+
+def _run_batch(items: list, write_item) -> Dict[str, Any]:
+    """
+    Apply every item in one transaction. Each item runs in its own
+    SAVEPOINT, so a bad item is rolled back alone and reported in its
+    result while the others are still committed.
+    """
+    results = []
+    connection = get_connection()
+    connection.isolation_level = None  # explicit BEGIN/SAVEPOINT below
+    try:
+        connection.execute("BEGIN IMMEDIATE")
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                results.append({"index": index, "status": 400, "error": "item must be an object"})
+                continue
+            connection.execute("SAVEPOINT batch_item")
+            try:
+                status, body = write_item(connection, item)
+            except sqlite3.IntegrityError:
+                status, body = 409, {"error": "invalid data or constraint violation"}
+            except (ValueError, TypeError, sqlite3.ProgrammingError) as e:
+                status, body = 400, {"error": str(e) or "invalid data"}
+            if status >= 400:
+                connection.execute("ROLLBACK TO batch_item")
+            connection.execute("RELEASE batch_item")
+            result = {"index": index, "id": item.get("id"), "status": status}
+            result.update(body if status >= 400 else {"row": body})
+            results.append(result)
+        connection.execute("COMMIT")
+    except Exception:
+        if connection.in_transaction:
+            connection.execute("ROLLBACK")
+        raise
+    finally:
+        connection.close()
+
+    failed = sum(1 for r in results if r["status"] >= 400)
+    return {"results": results, "ok": len(results) - failed, "failed": failed}
+
+
+@require_api_key
+def batch_create(resource: str):
+    """
+    Create many rows: {"items": [{...}, ...]} (or a bare array), fields as
+    for the single-row POST. One transaction, one result per item:
+    {"index", "id", "status": 201 | 400 | 409, "row" | "error"}.
+    """
+    table, required, writable, columns = BATCH_RESOURCES[resource]
+    items = _batch_items(request.get_json(silent=True))
+    if items is None:
+        return jsonify({"error": "expected an array of items"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"at most {BATCH_MAX_ITEMS} items per batch"}), 413
+
+    def create(connection: sqlite3.Connection, item: Dict[str, Any]):
+        missing = [k for k in required if not item.get(k)]
+        if missing:
+            return 400, {"error": f"{', '.join(missing)} required"}
+        fields = {"id": item["id"], **_batch_fields(item, writable)}
+        rows = connection.execute(
+            f"""
+            INSERT INTO {table} ({', '.join(fields)})
+            VALUES ({', '.join('?' for _ in fields)})
+            RETURNING {columns}
+            """,
+            tuple(fields.values()),
+        ).fetchall()  # fetch everything so the statement is done before RELEASE
+        return 201, row_to_dict(rows[0])
+
+    return jsonify(_run_batch(items, create)), 200
+
+
+@require_api_key
+def batch_update(resource: str):
+    """
+    Update many rows: {"items": [{"id": ..., <fields to change>}, ...]}.
+    Only the fields present in an item are written. One transaction, one
+    result per item: {"index", "id", "status": 200 | 400 | 404 | 409, "row" | "error"}.
+    """
+    table, _, writable, columns = BATCH_RESOURCES[resource]
+    items = _batch_items(request.get_json(silent=True))
+    if items is None:
+        return jsonify({"error": "expected an array of items"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"at most {BATCH_MAX_ITEMS} items per batch"}), 413
+
+    def update(connection: sqlite3.Connection, item: Dict[str, Any]):
+        if not item.get("id"):
+            return 400, {"error": "id required"}
+        fields = _batch_fields(item, writable)
+        if not fields:
+            return 400, {"error": "no fields to update"}
+        updates = [f"{k} = ?" for k in fields] + ["updated_at = CURRENT_TIMESTAMP"]
+        rows = connection.execute(
+            f"UPDATE {table} SET {', '.join(updates)} WHERE id = ? RETURNING {columns}",
+            (*fields.values(), item["id"]),
+        ).fetchall()
+        if not rows:
+            return 404, {"error": "not found"}
+        return 200, row_to_dict(rows[0])
+
+    result = _run_batch(items, update)
+    lookup_cache.invalidate(table)
+    return jsonify(result), 200
+
+
+# Static rules, so they win over /api/v1/<resource>/<id>
+for _resource in BATCH_RESOURCES:
+    app.add_url_rule(
+        f"/api/v1/{_resource}/batch", view_func=batch_create, methods=["POST"],
+        defaults={"resource": _resource},
+    )
+    app.add_url_rule(
+        f"/api/v1/{_resource}/batch", view_func=batch_update, methods=["PUT"],
+        defaults={"resource": _resource},
+    )
+
+
+# ----------------------------
+# Inspection bundle (inspections + tasks + attachments)
+# ----------------------------
+
+BUNDLE_DEFAULT_LIMIT = 50
+BUNDLE_MAX_LIMIT = 200
+
+# Same expression as the *_ms generated columns in schema.sql
+EPOCH_MS_SQL = "CAST(ROUND((julianday({}) - 2440587.5) * 86400000) AS INTEGER)"
+
+
+@app.route("/api/v1/inspections/bundle", methods=["GET"])
+@require_api_key
+def inspections_bundle():
+    """
+    Inspections with their tasks (and each task's attachment metadata)
+    embedded, newest first, in three queries whatever the page size.
+
+    Filters: ?status=outstanding|in_progress|completed  ?technician_id=  ?aircraft_id=
+             ?updated_since=<ISO>  ?updated_until=<ISO>
+    Paging:  ?limit=50 (max 200)  ?cursor=<next_cursor from the previous page>
+    """
+    status = request.args.get("status")
+    technician_id = request.args.get("technician_id")
+    aircraft_id = request.args.get("aircraft_id")
+    updated_since = request.args.get("updated_since")
+    updated_until = request.args.get("updated_until")
+
+    try:
+        limit = _list_limit(BUNDLE_DEFAULT_LIMIT, BUNDLE_MAX_LIMIT)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    where = []
+    values = []
+
+    if status:
+        where.append("status = ?")
+        values.append(status)
+    if technician_id:
+        where.append("technician_id = ?")
+        values.append(technician_id)
+    if aircraft_id:
+        where.append("aircraft_id = ?")
+        values.append(aircraft_id)
+    if updated_since:
+        where.append(f"updated_at_ms >= {EPOCH_MS_SQL.format('?')}")
+        values.append(updated_since)
+    if updated_until:
+        where.append(f"updated_at_ms <= {EPOCH_MS_SQL.format('?')}")
+        values.append(updated_until)
+
+    with get_read_connection() as connection:
+        for value in (updated_since, updated_until):
+            if value and connection.execute("SELECT julianday(?)", (value,)).fetchone()[0] is None:
+                return jsonify({"error": f"invalid timestamp: {value}"}), 400
+
+        try:
+            inspections, next_cursor = _keyset_page(
+                connection,
+                "inspections",
+                ("id", "aircraft_id", "status", "opened_at", "completed_at",
+                 "technician_id", "created_at", "updated_at", "sync_status"),
+                where, values, ("updated_at_ms", "id"), True, limit, request.args.get("cursor"),
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # The page's ids go in as one JSON array, so the child queries are
+        # set-based no matter how many inspections the page holds
+        ids_json = json.dumps([inspection["id"] for inspection in inspections])
+
+        task_rows = connection.execute(
+            """
+            SELECT id, inspection_id, title, description, is_complete,
+                   result, notes, completed_at, created_at, updated_at, sync_status
+            FROM tasks
+            WHERE inspection_id IN (SELECT value FROM json_each(?))
+            ORDER BY inspection_id, created_at_ms, id
+            """,
+            (ids_json,),
+        ).fetchall()
+
+        attachment_rows = connection.execute(
+            """
+            SELECT a.id, a.task_id, a.file_name, a.mime_type, a.size_bytes,
+                   a.sha256, a.remote_key, a.created_at, a.updated_at, a.sync_status
+            FROM attachments a
+            JOIN tasks t ON t.id = a.task_id
+            WHERE t.inspection_id IN (SELECT value FROM json_each(?))
+            """,
+            (ids_json,),
+        ).fetchall()
+
+    attachments_by_task = {row["task_id"]: row_to_dict(row) for row in attachment_rows}
+
+    tasks_by_inspection: Dict[str, list] = {}
+    for row in task_rows:
+        task = row_to_dict(row)
+        task["attachment"] = attachments_by_task.get(task["id"])
+        tasks_by_inspection.setdefault(task["inspection_id"], []).append(task)
+
+    for inspection in inspections:
+        inspection["tasks"] = tasks_by_inspection.get(inspection["id"], [])
+
+    return jsonify({"inspections": inspections, "next_cursor": next_cursor}), 200
+
+
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=5050)
@@ -0,0 +1,287 @@
+"""
+maintenance.py
+
+Background database maintenance for long-running deployments.
+
+  checkpoint    WAL over WAL_PASSIVE_BYTES: PASSIVE checkpoint; over
+                WAL_TRUNCATE_BYTES: TRUNCATE, which also shrinks the -wal
+                file back to zero (needs a moment with no readers)
+  optimize      PRAGMA optimize (ANALYZE where the planner would benefit),
+                with a bounded analysis_limit so it stays cheap
+  vacuum        PRAGMA incremental_vacuum with a page budget, once the
+                freelist is big enough (databases created by init_db.py use
+                auto_vacuum=INCREMENTAL; older ones need the one-off
+                `python maintenance.py enable-incremental-vacuum`)
+  quick_check   PRAGMA quick_check
+
+Every process may run a MaintenanceScheduler. A lock file next to the
+database makes sure only one of them does the work at a time. A task that
+comes due while `busy()` says the process is under load is put off, but
+for at most MAX_DEFER_S. Each run's duration and effect (WAL/file size
+before and after, pages freed, ...) is logged to stderr and written to
+<db>.maintenance.json, so every worker can report it.
+
+  python maintenance.py run [checkpoint|optimize|vacuum|quick_check ...]
+  python maintenance.py enable-incremental-vacuum   # offline: full VACUUM + tasks_fts rebuild
+  python maintenance.py status
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+import search_index
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: runs are not coordinated across processes
+    fcntl = None
+
+BASE_DIR = Path(__file__).resolve().parent
+DB_PATH = Path(os.environ.get("WAREHOUSE_DB_PATH") or BASE_DIR / "warehouse.db")
+
+WAL_PASSIVE_BYTES = 4 * 1024 * 1024
+WAL_TRUNCATE_BYTES = 64 * 1024 * 1024
+OPTIMIZE_ANALYSIS_LIMIT = 400
+VACUUM_PAGE_BUDGET = 2000          # pages freed per run
+VACUUM_MIN_FREE_PAGES = 256        # don't bother below this
+
+# task -> seconds between runs
+INTERVALS_S = {
+    "checkpoint": 30,
+    "optimize": 60 * 60,
+    "vacuum": 10 * 60,
+    "quick_check": 24 * 60 * 60,
+}
+TICK_S = 5.0
+MAX_DEFER_S = 10 * 60
+BUSY_TIMEOUT_MS = 5000
+
+
+def _log(message: str) -> None:
+    print(f"[maintenance {os.getpid()}] {message}", file=sys.stderr, flush=True)
+
+
+def _size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+# ----------------------------
+# Tasks: each returns a dict describing what it did
+# ----------------------------
+
+def checkpoint(connection: sqlite3.Connection, db_path) -> Dict[str, Any]:
+    if connection.execute("PRAGMA journal_mode").fetchone()[0].lower() != "wal":
+        return {"skipped": "not in WAL mode"}
+    wal_path = f"{db_path}-wal"
+    before = _size(wal_path)
+    if before < WAL_PASSIVE_BYTES:
+        return {"skipped": "WAL is small", "wal_bytes": before}
+    mode = "TRUNCATE" if before >= WAL_TRUNCATE_BYTES else "PASSIVE"
+    busy, log_frames, checkpointed = connection.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+    return {
+        "mode": mode,
+        "busy": bool(busy),
+        "log_frames": log_frames,
+        "checkpointed_frames": checkpointed,
+        "wal_bytes_before": before,
+        "wal_bytes_after": _size(wal_path),
+    }
+
+
+def optimize(connection: sqlite3.Connection, db_path) -> Dict[str, Any]:
+    connection.execute(f"PRAGMA analysis_limit = {OPTIMIZE_ANALYSIS_LIMIT}")
+    connection.execute("PRAGMA optimize")
+    return {"analysis_limit": OPTIMIZE_ANALYSIS_LIMIT}
+
+
+def vacuum(connection: sqlite3.Connection, db_path) -> Dict[str, Any]:
+    auto_vacuum = connection.execute("PRAGMA auto_vacuum").fetchone()[0]
+    free_before = connection.execute("PRAGMA freelist_count").fetchone()[0]
+    if auto_vacuum != 2:
+        return {"skipped": "auto_vacuum is not INCREMENTAL", "free_pages": free_before}
+    if free_before < VACUUM_MIN_FREE_PAGES:
+        return {"skipped": "few free pages", "free_pages": free_before}
+    size_before = _size(str(db_path))
+    # executescript steps the pragma to completion; execute() frees one page
+    connection.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGE_BUDGET});")
+    free_after = connection.execute("PRAGMA freelist_count").fetchone()[0]
+    return {
+        "pages_freed": free_before - free_after,
+        "free_pages_left": free_after,
+        "file_bytes_before": size_before,
+        "file_bytes_after": _size(str(db_path)),
+    }
+
+
+def quick_check(connection: sqlite3.Connection, db_path) -> Dict[str, Any]:
+    problems = [r[0] for r in connection.execute("PRAGMA quick_check(20)").fetchall()]
+    ok = problems == ["ok"]
+    if not ok:
+        _log(f"quick_check found problems: {problems}")
+    return {"ok": ok, "problems": [] if ok else problems}
+
+
+TASKS: Dict[str, Callable[[sqlite3.Connection, Any], Dict[str, Any]]] = {
+    "checkpoint": checkpoint,
+    "optimize": optimize,
+    "vacuum": vacuum,
+    "quick_check": quick_check,
+}
+
+
+def run_task(db_path, name: str) -> Dict[str, Any]:
+    """Run one task and return its report (never raises)."""
+    started = time.monotonic()
+    report: Dict[str, Any] = {
+        "task": name,
+        "started_at": datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z"),
+        "started_ts": time.time(),
+    }
+    connection = sqlite3.connect(db_path, isolation_level=None, timeout=BUSY_TIMEOUT_MS / 1000)
+    try:
+        report["result"] = TASKS[name](connection, db_path)
+    except sqlite3.Error as e:
+        report["error"] = str(e)
+    finally:
+        connection.close()
+    report["duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+    return report
+
+
+def status_path(db_path) -> str:
+    return f"{db_path}.maintenance.json"
+
+
+def read_status(db_path) -> Dict[str, Any]:
+    """Last report per task, as written by whichever process ran it."""
+    try:
+        with open(status_path(db_path), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_status(db_path, reports: Dict[str, Any]) -> None:
+    tmp = f"{status_path(db_path)}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(reports, f)
+    os.replace(tmp, status_path(db_path))
+
+
+class MaintenanceScheduler:
+    """Background thread running TASKS on INTERVALS_S, deferring while `busy()`."""
+
+    def __init__(self, db_path, busy: Callable[[], bool] = lambda: False, enabled: bool = True):
+        self.db_path = str(db_path)
+        self.busy = busy
+        self.enabled = enabled
+        self.deferred = 0
+        self._due: Dict[str, float] = {}
+        self._deferred_since: Dict[str, float] = {}
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self) -> None:
+        """Start the thread in this process (again after a fork)."""
+        if not self.enabled or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            now = time.monotonic()
+            # spread the first runs out a little instead of all at startup
+            self._due = {name: now + min(interval, 60) for name, interval in INTERVALS_S.items()}
+            self._deferred_since = {}
+            threading.Thread(target=self._run, name="db-maintenance", daemon=True).start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(TICK_S)
+            try:
+                self.tick()
+            except Exception as e:
+                _log(f"maintenance tick failed: {e!r}")
+
+    def tick(self) -> None:
+        now = time.monotonic()
+        due = [name for name, at in self._due.items() if at <= now]
+        if not due:
+            return
+
+        if self.busy():
+            ready = []
+            for name in due:
+                since = self._deferred_since.setdefault(name, now)
+                if now - since >= MAX_DEFER_S:
+                    ready.append(name)
+            if not ready:
+                self.deferred += 1
+                return
+            due = ready
+
+        with open(f"{self.db_path}.maintenance.lock", "w") as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return  # another process is running maintenance; retry next tick
+            status = read_status(self.db_path)
+            for name in due:
+                # the intervals are shared: skip what another process ran recently
+                last_run = status.get(name, {}).get("started_ts", 0)
+                remaining = last_run + INTERVALS_S[name] - time.time()
+                if remaining > 0:
+                    self._due[name] = time.monotonic() + remaining
+                    self._deferred_since.pop(name, None)
+                    continue
+                report = run_task(self.db_path, name)
+                self._due[name] = time.monotonic() + INTERVALS_S[name]
+                self._deferred_since.pop(name, None)
+                status[name] = report
+                if "skipped" not in report.get("result", {}):
+                    _log(f"{name}: {report}")
+            _write_status(self.db_path, status)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"deferred_ticks": self.deferred, "last_runs": read_status(self.db_path)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Database maintenance")
+    parser.add_argument("command", choices=("run", "enable-incremental-vacuum", "status"))
+    parser.add_argument("tasks", nargs="*", help=f"for run: any of {', '.join(TASKS)} (default all)")
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    args = parser.parse_args()
+    unknown = [t for t in args.tasks if t not in TASKS]
+    if unknown:
+        parser.error(f"unknown task(s): {', '.join(unknown)}")
+
+    if args.command == "run":
+        reports = read_status(args.db)
+        for name in args.tasks or list(TASKS):
+            reports[name] = run_task(args.db, name)
+            print(json.dumps(reports[name]))
+        _write_status(args.db, reports)
+    elif args.command == "enable-incremental-vacuum":
+        # auto_vacuum can only change on an empty database or through a full
+        # VACUUM, which rewrites the file: stop the server first
+        with sqlite3.connect(args.db, isolation_level=None) as conn:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            # VACUUM may renumber tasks rowids, which tasks_fts is keyed on
+            search_index.rebuild(conn)
+            print(f"auto_vacuum = {conn.execute('PRAGMA auto_vacuum').fetchone()[0]} in {args.db}")
+    else:
+        print(json.dumps(read_status(args.db), indent=2))
@@ -0,0 +1,198 @@
+"""
+migrate_db.py
+
+Brings an existing central database up to date with schema.sql.
+
+Fresh databases get everything from schema.sql / schema_compact.sql; these
+steps only add what older files are missing, so every step is a no-op on a
+current schema. Progress is recorded in PRAGMA user_version.
+
+init_db.init_db() runs this before schema.sql, so indexes in schema.sql can
+refer to columns that a migration adds. To upgrade an existing database,
+just run `python init_db.py` again.
+"""
+
+import sqlite3
+from typing import Callable, List, Tuple
+
+
+# Same expression as the *_ms generated columns in schema.sql
+EPOCH_MS_SQL = "CAST(ROUND((julianday({column}) - 2440587.5) * 86400000) AS INTEGER)"
+
+# Same expression as inspections.status in schema.sql
+INSPECTION_STATUS_SQL = (
+    "CASE WHEN completed_at IS NOT NULL THEN 'completed' "
+    "WHEN opened_at IS NOT NULL THEN 'in_progress' ELSE 'outstanding' END"
+)
+
+# Same expression as attachments.sha256_verified in schema.sql
+SHA256_VERIFIED_SQL = (
+    "CASE WHEN sha256 IS NULL OR content_sha256 IS NULL THEN NULL "
+    "ELSE lower(sha256) = content_sha256 END"
+)
+
+
+def _table_exists(conn: sqlite3.Connection, table: str) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (table,),
+    ).fetchone()
+    return row is not None
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    # table_xinfo also lists generated columns
+    return [r[1] for r in conn.execute(f"PRAGMA table_xinfo({table})").fetchall()]
+
+
+# ----------------------------
+# Steps
+# ----------------------------
+
+def _add_epoch_ms_columns(conn: sqlite3.Connection) -> None:
+    """
+    *_ms shadows of the ISO timestamp columns.
+
+    ALTER TABLE cannot add STORED generated columns, so older databases get
+    VIRTUAL ones: values are computed on read (and kept in the indexes that
+    schema.sql creates), which also means no explicit backfill is needed.
+    """
+    shadows = {
+        "technicians_cache": ("created_at", "updated_at"),
+        "inspections": ("created_at", "updated_at", "completed_at"),
+        "tasks": ("created_at", "updated_at", "completed_at"),
+        "attachments": ("created_at", "updated_at"),
+    }
+    for table, columns in shadows.items():
+        if not _table_exists(conn, table):
+            continue
+        existing = _columns(conn, table)
+        for column in columns:
+            if f"{column}_ms" in existing:
+                continue
+            expr = EPOCH_MS_SQL.format(column=column)
+            conn.execute(
+                f"ALTER TABLE {table} ADD COLUMN {column}_ms INTEGER "
+                f"GENERATED ALWAYS AS ({expr}) VIRTUAL"
+            )
+
+
+def _add_inspection_status(conn: sqlite3.Connection) -> None:
+    """inspections.status, VIRTUAL here for the same reason as the *_ms columns."""
+    if not _table_exists(conn, "inspections") or "status" in _columns(conn, "inspections"):
+        return
+    conn.execute(
+        "ALTER TABLE inspections ADD COLUMN status TEXT "
+        f"GENERATED ALWAYS AS ({INSPECTION_STATUS_SQL}) VIRTUAL"
+    )
+
+
+def _backfill_inspection_progress(conn: sqlite3.Connection) -> None:
+    """
+    Fill inspection_progress from the existing rows. The table is created
+    here as well because this runs before schema.sql (which adds the
+    triggers that keep it current from then on).
+    """
+    if not all(_table_exists(conn, t) for t in ("inspections", "tasks", "attachments")):
+        return
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS inspection_progress (
+            inspection_id NOT NULL PRIMARY KEY,
+            total_tasks INTEGER NOT NULL DEFAULT 0,
+            completed_tasks INTEGER NOT NULL DEFAULT 0,
+            attachments INTEGER NOT NULL DEFAULT 0,
+            last_activity_ms INTEGER
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO inspection_progress
+            (inspection_id, total_tasks, completed_tasks, attachments, last_activity_ms)
+        SELECT i.id,
+               IFNULL(t.total, 0),
+               IFNULL(t.done, 0),
+               IFNULL(a.n, 0),
+               NULLIF(MAX(IFNULL(t.last_ms, 0), IFNULL(a.last_ms, 0)), 0)
+        FROM inspections i
+        LEFT JOIN (
+            SELECT inspection_id, COUNT(*) AS total, SUM(is_complete) AS done,
+                   MAX(updated_at_ms) AS last_ms
+            FROM tasks
+            GROUP BY inspection_id
+        ) t ON t.inspection_id = i.id
+        LEFT JOIN (
+            SELECT t.inspection_id, COUNT(*) AS n, MAX(a.updated_at_ms) AS last_ms
+            FROM attachments a
+            JOIN tasks t ON t.id = a.task_id
+            GROUP BY t.inspection_id
+        ) a ON a.inspection_id = i.id
+        """
+    )
+
+
+def _build_tasks_fts(conn: sqlite3.Connection) -> None:
+    """
+    Create and fill the tasks_fts search index for existing tasks (created
+    here because this runs before schema.sql, which adds its triggers).
+    """
+    if not _table_exists(conn, "tasks"):
+        return
+    conn.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+            title, description, notes, result,
+            content = 'tasks', content_rowid = 'rowid',
+            tokenize = 'porter unicode61'
+        )
+        """
+    )
+    conn.execute("INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')")
+
+
+def _add_attachment_processing_columns(conn: sqlite3.Connection) -> None:
+    """
+    Result columns for post-upload processing (blob_jobs.py). Existing rows
+    keep processing_status NULL: their blobs were never queued.
+    """
+    if not _table_exists(conn, "attachments"):
+        return
+    existing = _columns(conn, "attachments")
+    for column, decl in (
+        ("processing_status", "TEXT"),
+        ("content_sha256", "TEXT"),
+        ("sha256_verified", f"INTEGER GENERATED ALWAYS AS ({SHA256_VERIFIED_SQL}) VIRTUAL"),
+        ("image_width", "INTEGER"),
+        ("image_height", "INTEGER"),
+        ("preview_key", "TEXT"),
+    ):
+        if column not in existing:
+            conn.execute(f"ALTER TABLE attachments ADD COLUMN {column} {decl}")
+
+
+# (user_version after the step, description, step)
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "epoch-ms timestamp shadow columns", _add_epoch_ms_columns),
+    (2, "derived inspections.status column", _add_inspection_status),
+    (3, "inspection progress counters", _backfill_inspection_progress),
+    (4, "task full-text search index", _build_tasks_fts),
+    (5, "attachment processing columns", _add_attachment_processing_columns),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate(conn: sqlite3.Connection) -> List[str]:
+    """Apply pending steps in order. Returns the descriptions of applied steps."""
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    applied = []
+    for version, description, step in MIGRATIONS:
+        if version <= current:
+            continue
+        step(conn)
+        conn.execute(f"PRAGMA user_version = {version}")
+        conn.commit()
+        applied.append(description)
+    return applied
+
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+prefork_server.py
+
+Production launcher for the central sync API (sync_app.py).
+
+A master process binds the listening socket once and pre-forks a fixed
+number of single-threaded worker processes that all accept() on it
+(or, with --reuse-port, each worker binds its own SO_REUSEPORT socket and
+the kernel spreads connections between them).
+
+  - workers are recycled after --max-requests requests
+  - SIGHUP   -> graceful restart (new workers first, then old ones drain)
+  - SIGTERM / SIGINT -> graceful shutdown
+  - each worker sends a heartbeat to the master; workers that stop
+    heartbeating are killed and replaced
+  - the master writes per-worker health to --status-file (JSON)
+
+Usage:
+  python prefork_server.py --workers 4 --port 5050
+"""
+
+import argparse
+import json
+import os
+import select
+import signal
+import socket
+import sqlite3
+import sys
+import time
+from typing import Any, Dict, Optional
+
+from werkzeug.serving import BaseWSGIServer
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Same resolution as sync_app.DB_PATH; not imported from there so the master
+# never loads app code (workers import it fresh on every graceful restart).
+DB_PATH = os.environ.get("WAREHOUSE_DB_PATH") or os.path.join(BASE_DIR, "warehouse.db")
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+DEFAULT_MAX_REQUESTS = 5000
+DEFAULT_STATUS_FILE = os.path.join(BASE_DIR, "workers.json")
+
+HEARTBEAT_INTERVAL = 5.0     # seconds between worker heartbeats
+HEARTBEAT_TIMEOUT = 30.0     # kill a worker that has been silent this long
+GRACEFUL_TIMEOUT = 30.0      # how long draining workers may take before SIGKILL
+LISTEN_BACKLOG = 1024
+
+
+def _log(message: str) -> None:
+    print(f"[prefork {os.getpid()}] {message}", file=sys.stderr, flush=True)
+
+
+def enable_wal(db_path: str) -> None:
+    """
+    WAL lets the workers read while one of them writes.
+    journal_mode=WAL is persistent, so doing it once in the master is enough.
+    """
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("PRAGMA journal_mode = WAL")
+
+
+def _bind_socket(host: str, port: int, reuse_port: bool) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(LISTEN_BACKLOG)
+    return sock
+
+
+# ----------------------------
+# Worker
+# ----------------------------
+
+class _WorkerServer(BaseWSGIServer):
+    multiprocess = True
+    requests_handled = 0
+
+    def process_request(self, request, client_address):
+        super().process_request(request, client_address)
+        self.requests_handled += 1
+
+
+def _run_worker(listen_fd: Optional[int], options: argparse.Namespace, heartbeat_fd: int) -> int:
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    # Import inside the worker so a graceful restart picks up new code.
+    from sync_app import app
+
+    if options.reuse_port:
+        own_socket = _bind_socket(options.host, options.port, reuse_port=True)
+        listen_fd = own_socket.fileno()
+
+    server = _WorkerServer(options.host, options.port, app, fd=listen_fd)
+    server.timeout = 1.0  # wake up regularly to heartbeat / notice SIGTERM
+
+    stats: Dict[str, Any] = {
+        "pid": os.getpid(),
+        "started_at": time.time(),
+        "requests": 0,
+        "last_request_at": None,
+        "status": "serving",
+    }
+    last_heartbeat = 0.0
+
+    def _heartbeat() -> None:
+        try:
+            os.write(heartbeat_fd, (json.dumps(stats) + "\n").encode("utf-8"))
+        except OSError:
+            pass  # master is gone; we'll be reaped by init
+
+    while not stopping:
+        try:
+            server.handle_request()
+        except OSError:
+            if stopping:
+                break
+            raise
+
+        if server.requests_handled != stats["requests"]:
+            stats["requests"] = server.requests_handled
+            stats["last_request_at"] = time.time()
+
+        if options.max_requests and stats["requests"] >= options.max_requests:
+            stats["status"] = "recycling"
+            break
+
+        now = time.time()
+        if now - last_heartbeat >= HEARTBEAT_INTERVAL:
+            _heartbeat()
+            last_heartbeat = now
+
+    if stopping:
+        stats["status"] = "stopping"
+    _heartbeat()
+    server.server_close()
+    return 0
+
+
+# ----------------------------
+# Master
+# ----------------------------
+
+class Master:
+    def __init__(self, options: argparse.Namespace):
+        self.options = options
+        self.listen_socket: Optional[socket.socket] = None
+        self.workers: Dict[int, Dict[str, Any]] = {}   # pid -> state
+        self.pipes: Dict[int, int] = {}                # read fd -> pid
+        self.generation = 0
+        self.stopping = False
+        self.restart_requested = False
+
+    # ---- lifecycle ----
+
+    def run(self) -> int:
+        if not self.options.reuse_port:
+            self.listen_socket = _bind_socket(self.options.host, self.options.port, reuse_port=False)
+
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_restart)
+
+        _log(
+            f"listening on {self.options.host}:{self.options.port} "
+            f"with {self.options.workers} workers (max_requests={self.options.max_requests})"
+        )
+        self._spawn_generation()
+
+        while not self.stopping:
+            self._read_heartbeats(timeout=1.0)
+            self._reap()
+            if self.restart_requested:
+                self.restart_requested = False
+                self._graceful_restart()
+            self._check_health()
+            self._maintain_worker_count()
+            self._write_status()
+
+        self._shutdown()
+        return 0
+
+    def _on_stop(self, signum, frame):
+        self.stopping = True
+
+    def _on_restart(self, signum, frame):
+        self.restart_requested = True
+
+    # ---- workers ----
+
+    def _spawn_generation(self) -> None:
+        self.generation += 1
+        for _ in range(self.options.workers):
+            self._spawn_worker()
+
+    def _spawn_worker(self) -> None:
+        read_fd, write_fd = os.pipe()
+        listen_fd = self.listen_socket.fileno() if self.listen_socket else None
+
+        pid = os.fork()
+        if pid == 0:
+            # child
+            os.close(read_fd)
+            for fd in list(self.pipes):
+                os.close(fd)
+            code = 1
+            try:
+                code = _run_worker(listen_fd, self.options, write_fd)
+            except Exception as e:
+                _log(f"worker crashed: {e!r}")
+            finally:
+                os._exit(code)
+
+        os.close(write_fd)
+        os.set_blocking(read_fd, False)
+        now = time.time()
+        self.pipes[read_fd] = pid
+        self.workers[pid] = {
+            "pid": pid,
+            "generation": self.generation,
+            "pipe": read_fd,
+            "spawned_at": now,
+            "last_heartbeat_at": now,
+            "requests": 0,
+            "last_request_at": None,
+            "status": "starting",
+            "stop_sent_at": None,
+            "buffer": b"",
+        }
+
+    def _read_heartbeats(self, timeout: float) -> None:
+        if not self.pipes:
+            time.sleep(timeout)
+            return
+        try:
+            ready, _, _ = select.select(list(self.pipes), [], [], timeout)
+        except InterruptedError:
+            return
+
+        for fd in ready:
+            pid = self.pipes.get(fd)
+            worker = self.workers.get(pid)
+            if worker is None:
+                continue
+            try:
+                chunk = os.read(fd, 65536)
+            except BlockingIOError:
+                continue
+            except OSError:
+                chunk = b""
+            if not chunk:
+                continue
+            worker["buffer"] += chunk
+            *lines, worker["buffer"] = worker["buffer"].split(b"\n")
+            for line in lines:
+                try:
+                    report = json.loads(line)
+                except ValueError:
+                    continue
+                worker["last_heartbeat_at"] = time.time()
+                worker["requests"] = report.get("requests", worker["requests"])
+                worker["last_request_at"] = report.get("last_request_at")
+                worker["status"] = report.get("status", worker["status"])
+
+    def _reap(self) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self.workers.pop(pid, None)
+            if worker is None:
+                continue
+            self.pipes.pop(worker["pipe"], None)
+            os.close(worker["pipe"])
+            if worker["status"] == "recycling":
+                _log(f"worker {pid} recycled after {worker['requests']} requests")
+            elif worker["stop_sent_at"] is None and not self.stopping:
+                _log(f"worker {pid} exited unexpectedly (status {status})")
+
+    def _check_health(self) -> None:
+        now = time.time()
+        for pid, worker in list(self.workers.items()):
+            if worker["stop_sent_at"] is not None:
+                if now - worker["stop_sent_at"] > GRACEFUL_TIMEOUT:
+                    _log(f"worker {pid} did not drain in {GRACEFUL_TIMEOUT}s, killing")
+                    self._signal(pid, signal.SIGKILL)
+                continue
+            if now - worker["last_heartbeat_at"] > HEARTBEAT_TIMEOUT:
+                _log(f"worker {pid} missed heartbeats, killing")
+                worker["status"] = "unresponsive"
+                worker["stop_sent_at"] = now
+                self._signal(pid, signal.SIGKILL)
+
+    def _active_workers(self) -> int:
+        return sum(
+            1 for w in self.workers.values()
+            if w["generation"] == self.generation and w["stop_sent_at"] is None
+        )
+
+    def _maintain_worker_count(self) -> None:
+        if self.stopping:
+            return
+        for _ in range(self.options.workers - self._active_workers()):
+            self._spawn_worker()
+
+    def _graceful_restart(self) -> None:
+        _log("graceful restart requested")
+        old = [pid for pid, w in self.workers.items() if w["stop_sent_at"] is None]
+        self._spawn_generation()
+        now = time.time()
+        for pid in old:
+            self.workers[pid]["stop_sent_at"] = now
+            self._signal(pid, signal.SIGTERM)
+
+    def _shutdown(self) -> None:
+        _log("shutting down")
+        now = time.time()
+        for pid, worker in self.workers.items():
+            if worker["stop_sent_at"] is None:
+                worker["stop_sent_at"] = now
+                self._signal(pid, signal.SIGTERM)
+
+        deadline = now + GRACEFUL_TIMEOUT
+        while self.workers and time.time() < deadline:
+            self._read_heartbeats(timeout=0.2)
+            self._reap()
+        for pid in list(self.workers):
+            self._signal(pid, signal.SIGKILL)
+        while self.workers:
+            self._reap()
+            time.sleep(0.05)
+
+        self._write_status()
+        if self.listen_socket:
+            self.listen_socket.close()
+
+    @staticmethod
+    def _signal(pid: int, signum: int) -> None:
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    # ---- health reporting ----
+
+    def _write_status(self) -> None:
+        if not self.options.status_file:
+            return
+        now = time.time()
+        report = {
+            "master_pid": os.getpid(),
+            "generation": self.generation,
+            "updated_at": now,
+            "workers": [
+                {
+                    "pid": w["pid"],
+                    "generation": w["generation"],
+                    "status": w["status"],
+                    "requests": w["requests"],
+                    "uptime_s": round(now - w["spawned_at"], 1),
+                    "last_heartbeat_age_s": round(now - w["last_heartbeat_at"], 1),
+                    "last_request_at": w["last_request_at"],
+                }
+                for w in self.workers.values()
+            ],
+        }
+        tmp_path = self.options.status_file + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                json.dump(report, fh, indent=2)
+            os.replace(tmp_path, self.options.status_file)
+        except OSError as e:
+            _log(f"could not write status file: {e}")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Pre-forking launcher for the central sync API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5050)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument(
+        "--max-requests", type=int, default=DEFAULT_MAX_REQUESTS,
+        help="recycle a worker after this many requests (0 = never)",
+    )
+    parser.add_argument(
+        "--reuse-port", action="store_true",
+        help="let every worker bind its own SO_REUSEPORT socket instead of sharing one fd",
+    )
+    parser.add_argument("--status-file", default=DEFAULT_STATUS_FILE)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    options = parse_args(argv)
+    if options.workers < 1:
+        raise SystemExit("--workers must be at least 1")
+
+    sys.path.insert(0, BASE_DIR)
+    import shards  # config only, no app code
+
+    for db_path in shards.load_config(os.environ.get("WAREHOUSE_SHARDS"), DB_PATH).shards.values():
+        enable_wal(db_path)
+    return Master(options).run()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
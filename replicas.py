@@ -0,0 +1,271 @@
+"""
+replicas.py
+
+Read replicas: point-in-time copies of warehouse.db that pull-only
+traffic reads, so big pulls and reports don't compete with pushes for the
+primary file.
+
+A ReadReplica thread copies the database every REFRESH_INTERVAL_S with the
+SQLite online backup API. The copy is taken inside one read transaction,
+so under WAL it does not block writers. Each copy is a new file,
+<db>.replica-<ms>.db. It is switched to a rollback journal and renamed into
+place, and it is never written again, so readers open it with immutable=1
+(no locks, no -shm). <db>.replica.json names the current copy and its
+as_of time. The two most recent copies are kept, so readers still on the
+previous one are not cut off. Every process may run a ReadReplica. A lock
+file makes sure only one of them copies at a time.
+
+as_of is read in the same transaction as the copy, one second early (the
+same rule as snapshots.py), so the copy holds every commit up to as_of. A
+pull answered from a replica hands out as_of as its server_time / watermark.
+The next pull then starts from there, and nothing committed after the copy
+is skipped.
+
+sync_app.py uses a replica only if all of these hold:
+  - it is at most MAX_STALENESS_S old;
+  - its as_of is not before any watermark the client sends, so a client
+    never sees the data go back in time;
+  - the request pushed no rows;
+  - the request did not send X-Read-Consistency: primary.
+Otherwise the primary answers, as before.
+
+  python replicas.py refresh [--every 30]   # one copy, or keep copying
+  python replicas.py status
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional
+from urllib.parse import quote
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: refreshes are not coordinated across processes
+    fcntl = None
+
+import shards
+
+BASE_DIR = Path(__file__).resolve().parent
+DB_PATH = Path(os.environ.get("WAREHOUSE_DB_PATH") or BASE_DIR / "warehouse.db")
+
+REFRESH_INTERVAL_S = 30
+MAX_STALENESS_S = 120      # older replicas are not read from
+KEEP_REPLICAS = 2
+BUSY_TIMEOUT_S = 5.0
+
+
+def _log(message: str) -> None:
+    print(f"[replicas {os.getpid()}] {message}", file=sys.stderr, flush=True)
+
+
+def manifest_path(db_path) -> str:
+    return f"{db_path}.replica.json"
+
+
+def read_manifest(db_path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(manifest_path(db_path), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def build_replica(db_path) -> Dict[str, Any]:
+    """Copy `db_path` to a new replica file and make it the current one."""
+    db_path = str(db_path)
+    started = time.monotonic()
+    path = f"{db_path}.replica-{int(time.time() * 1000)}.db"
+    tmp_path = f"{path}.tmp"
+    source = sqlite3.connect(db_path, isolation_level=None, timeout=BUSY_TIMEOUT_S)
+    target = sqlite3.connect(tmp_path, isolation_level=None)
+    try:
+        source.execute("BEGIN")
+        # the backup below runs in this read transaction, so as_of is exact
+        as_of, tombstone_seq = source.execute(
+            """
+            SELECT strftime('%Y-%m-%dT%H:%M:%SZ', 'now', '-1 seconds'),
+                   IFNULL((SELECT seq FROM sqlite_sequence WHERE name = 'tombstones'), 0)
+            """
+        ).fetchone()
+        source.backup(target)
+        source.execute("COMMIT")
+        # a plain file: readers open it immutable, without a -wal or -shm
+        target.execute("PRAGMA journal_mode = DELETE")
+    except BaseException:
+        target.close()
+        _remove(tmp_path)
+        raise
+    finally:
+        source.close()
+    target.close()
+    os.replace(tmp_path, path)
+
+    manifest = {
+        "path": path,
+        "as_of": as_of,
+        "tombstone_seq": tombstone_seq,
+        "size_bytes": os.path.getsize(path),
+        "duration_ms": round((time.monotonic() - started) * 1000, 1),
+        "built_ts": time.time(),
+    }
+    tmp_manifest = f"{manifest_path(db_path)}.tmp"
+    with open(tmp_manifest, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_manifest, manifest_path(db_path))
+    _prune(db_path)
+    return manifest
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _prune(db_path: str) -> None:
+    directory, prefix = os.path.split(os.path.abspath(f"{db_path}.replica-"))
+    replicas = sorted(f for f in os.listdir(directory) if f.startswith(prefix) and f.endswith(".db"))
+    for name in replicas[:-KEEP_REPLICAS]:
+        _remove(os.path.join(directory, name))
+
+
+def _as_of_ms(as_of: str) -> int:
+    return int(datetime.strptime(as_of, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+class ReplicaView:
+    """One replica file: a read-only connection pool and the time it is as of."""
+
+    def __init__(self, manifest: Dict[str, Any]):
+        self.path = manifest["path"]
+        self.as_of = manifest["as_of"]
+        self.as_of_ms = _as_of_ms(self.as_of)
+        self.pool = shards.ConnectionPool(f"file:{quote(self.path)}?immutable=1", uri=True)
+
+    def age_s(self) -> float:
+        return time.time() - self.as_of_ms / 1000
+
+
+class ReadReplica:
+    """
+    Keeps the replica of `db_path` refreshed (background thread) and hands
+    out the current one to readers while it is fresh enough.
+    """
+
+    def __init__(
+        self,
+        db_path,
+        interval_s: float = REFRESH_INTERVAL_S,
+        max_staleness_s: float = MAX_STALENESS_S,
+        enabled: bool = True,
+    ):
+        self.db_path = str(db_path)
+        self.interval_s = interval_s
+        self.max_staleness_s = max_staleness_s
+        self.enabled = enabled
+        self.reads = {"replica": 0, "primary": 0}
+        self._view: Optional[ReplicaView] = None
+        self._manifest_mtime: Optional[float] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self) -> None:
+        """Start the refresh thread in this process (again after a fork)."""
+        if not self.enabled or self.interval_s <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name="read-replica", daemon=True).start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.refresh_if_due()
+            except Exception as e:
+                _log(f"replica refresh failed: {e!r}")
+            time.sleep(max(1.0, self.interval_s / 4))
+
+    def refresh_if_due(self) -> Optional[Dict[str, Any]]:
+        """Copy the database unless the replica is recent or another process is copying."""
+        with open(f"{self.db_path}.replica.lock", "w") as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return None  # another process is copying
+            manifest = read_manifest(self.db_path)
+            if manifest and time.time() - manifest.get("built_ts", 0) < self.interval_s:
+                return None
+            manifest = build_replica(self.db_path)
+            if manifest["duration_ms"] > self.interval_s * 1000 / 2:
+                _log(f"copy took {manifest['duration_ms']} ms; consider a longer REFRESH_INTERVAL_S")
+            return manifest
+
+    def current(self) -> Optional[ReplicaView]:
+        """The latest replica, or None if there is none or it is too stale."""
+        if not self.enabled:
+            return None
+        try:
+            mtime = os.stat(manifest_path(self.db_path)).st_mtime
+        except OSError:
+            return None
+        with self._lock:
+            if mtime != self._manifest_mtime:
+                manifest = read_manifest(self.db_path)
+                if manifest is None:
+                    return None
+                self._view = ReplicaView(manifest)
+                self._manifest_mtime = mtime
+            view = self._view
+        if view is None or view.age_s() > self.max_staleness_s:
+            return None
+        return view
+
+    def count_read(self, source: str) -> None:
+        with self._lock:
+            self.reads[source] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        manifest = read_manifest(self.db_path) if self.enabled else None
+        with self._lock:
+            reads = dict(self.reads)
+        if not manifest:
+            return {"enabled": self.enabled, "reads": reads}
+        return {
+            "enabled": self.enabled,
+            "as_of": manifest["as_of"],
+            "age_s": round(time.time() - _as_of_ms(manifest["as_of"]) / 1000, 1),
+            "size_bytes": manifest["size_bytes"],
+            "last_copy_ms": manifest["duration_ms"],
+            "reads": reads,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read replicas of the warehouse database")
+    parser.add_argument("command", choices=("refresh", "status"))
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    parser.add_argument("--every", type=float, default=0, help="for refresh: keep copying every N seconds")
+    args = parser.parse_args()
+
+    if args.command == "refresh":
+        replica = ReadReplica(args.db, interval_s=args.every)
+        while True:
+            manifest = build_replica(args.db) if not args.every else replica.refresh_if_due()
+            if manifest:
+                print(json.dumps(manifest))
+            if not args.every:
+                break
+            time.sleep(max(1.0, args.every / 4))
+    else:
+        print(json.dumps(ReadReplica(args.db).stats(), indent=2))
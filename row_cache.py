@@ -0,0 +1,154 @@
+"""
+row_cache.py
+
+Process-local read-through cache for small, hot lookups: technician rows,
+/sync/technicians pulls and the legacy fetch_*_by_id reads.
+
+  cache = RowCache(DB_PATH, max_entries=4096)
+  row = cache.get("technicians_cache", tech_id, lambda: load_from_db(tech_id))
+  cache.invalidate("technicians_cache", tech_id)      # after writing it
+
+Entries are grouped by table and evicted least-recently-used once there
+are more than `max_entries`. Values are handed out as copies, so callers
+may modify what they get.
+
+Staleness:
+  - writes made through this process call invalidate(), which drops the
+    entry at once;
+  - anything else is caught by PRAGMA data_version on a connection the
+    cache keeps open: it changes whenever another connection (another
+    worker, a CLI, or this process's own per-request connections) commits.
+    When it does, the per-table counters in table_versions (bumped by
+    triggers, see schema.sql) say which tables changed, and only their
+    entries are dropped. Without table_versions every entry is dropped.
+
+The check costs one PRAGMA on an open connection, and no table read
+unless something was committed, so a hit does not read the database.
+"""
+
+import copy
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Set, Tuple
+
+_MISSING = object()
+
+
+class RowCache:
+    def __init__(self, db_path: str, max_entries: int = 4096):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[Tuple[str, Hashable], Any]" = OrderedDict()
+        self._by_table: Dict[str, Set[Tuple[str, Hashable]]] = {}
+        self._lock = threading.Lock()
+        self._watch: Optional[sqlite3.Connection] = None
+        self._watch_pid: Optional[int] = None
+        self._data_version: Optional[int] = None
+        self._table_versions: Optional[Dict[str, int]] = None
+
+    # ----------------------------
+    # Staleness check (call with _lock held)
+    # ----------------------------
+
+    def _watch_connection(self) -> sqlite3.Connection:
+        if self._watch is None or self._watch_pid != os.getpid():
+            # never share a connection across fork (prefork_server.py)
+            self._watch = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            self._watch_pid = os.getpid()
+            self._data_version = None
+            self._clear()
+        return self._watch
+
+    def _sync(self) -> None:
+        connection = self._watch_connection()
+        data_version = connection.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return
+        self._data_version = data_version
+
+        try:
+            versions = dict(connection.execute("SELECT table_name, version FROM table_versions"))
+        except sqlite3.OperationalError:
+            versions = None  # older schema: no way to tell which table changed
+        if versions is None or self._table_versions is None:
+            self._clear()
+        else:
+            for table in set(versions) | set(self._table_versions):
+                if versions.get(table) != self._table_versions.get(table):
+                    self._drop_table(table)
+        self._table_versions = versions
+
+    def _clear(self) -> None:
+        if self._entries:
+            self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._by_table.clear()
+
+    def _drop_table(self, table: str) -> None:
+        for entry_key in self._by_table.pop(table, ()):
+            del self._entries[entry_key]
+            self.invalidations += 1
+
+    # ----------------------------
+    # Public API
+    # ----------------------------
+
+    def get(self, table: str, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Cached value for (table, key), else loader()'s result (which is
+        cached unless it is None, so a missing row is looked up again).
+        """
+        entry_key = (table, key)
+        with self._lock:
+            self._sync()
+            value = self._entries.get(entry_key, _MISSING)
+            if value is not _MISSING:
+                self._entries.move_to_end(entry_key)
+                self.hits += 1
+                return copy.deepcopy(value)
+            self.misses += 1
+            generation = self._data_version
+
+        value = loader()
+        if value is None:
+            return None
+
+        with self._lock:
+            # skip storing if something was committed while loading
+            self._sync()
+            if self._data_version == generation:
+                self._entries[entry_key] = copy.deepcopy(value)
+                self._by_table.setdefault(table, set()).add(entry_key)
+                while len(self._entries) > self.max_entries:
+                    old_key, _ = self._entries.popitem(last=False)
+                    self._by_table[old_key[0]].discard(old_key)
+        return value
+
+    def invalidate(self, table: str, key: Hashable = _MISSING) -> None:
+        """Drop (table, key), or every entry of `table` when no key is given."""
+        with self._lock:
+            if key is _MISSING:
+                self._drop_table(table)
+                return
+            entry_key = (table, key)
+            if self._entries.pop(entry_key, _MISSING) is not _MISSING:
+                self._by_table[table].discard(entry_key)
+                self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "invalidations": self.invalidations,
+                "by_table": {t: len(keys) for t, keys in self._by_table.items() if keys},
+            }
@@ -4,11 +4,14 @@ run_central_api.py
 
 Initialises schema, runs the central DB seeder,
 then starts the API.
+
+  python run_central_api.py                 # single-process dev server (debug)
+  python run_central_api.py --workers 4     # pre-forked production workers
 """
 
+import argparse
 import os
 import sys
-import sqlite3
 import subprocess
 from pathlib import Path
 
@@ -19,42 +22,68 @@ SCHEMA_PATH = BASE_DIR / "schema.sql"
 
 # ---- import your existing seeder ----
 from seed_central_db import seed  # ← THIS is the key line
+import init_db as schema
 
 
-def init_db() -> None:
+def init_db(key_layout: str = schema.DEFAULT_KEY_LAYOUT) -> None:
     if not SCHEMA_PATH.exists():
         raise FileNotFoundError("schema.sql not found")
 
-    schema_sql = SCHEMA_PATH.read_text(encoding="utf-8")
-
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("PRAGMA foreign_keys = ON;")
-        conn.executescript(schema_sql)
+    schema.init_db(DB_PATH, key_layout)
 
 
-def run_api() -> int:
+def run_api(workers: int = 0, max_requests: int = 0, port: int = 5050) -> int:
     env = os.environ.copy()
     env["WAREHOUSE_DB_PATH"] = str(DB_PATH)
 
-    return subprocess.call([sys.executable, "sync_app.py"], env=env)
+    if workers <= 0:
+        return subprocess.call([sys.executable, "sync_app.py"], env=env)
+
+    cmd = [
+        sys.executable, str(BASE_DIR / "prefork_server.py"),
+        "--workers", str(workers),
+        "--port", str(port),
+    ]
+    if max_requests:
+        cmd += ["--max-requests", str(max_requests)]
+    return subprocess.call(cmd, env=env)
 
 def reset_db() -> None:
     if DB_PATH.exists():
         DB_PATH.unlink()
         print(f"Deleted {DB_PATH}")
 
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Reset, seed and start the central API")
+    parser.add_argument(
+        "--workers", type=int, default=0,
+        help="run N pre-forked worker processes instead of the debug server",
+    )
+    parser.add_argument("--max-requests", type=int, default=0,
+                        help="recycle each worker after this many requests")
+    parser.add_argument(
+        "--key-layout", choices=schema.KEY_LAYOUTS, default=schema.DEFAULT_KEY_LAYOUT,
+        help="'compact' stores UUID keys as 16-byte BLOBs",
+    )
+    parser.add_argument("--port", type=int, default=5050,
+                        help="listen port for --workers mode (the debug server always uses 5050)")
+    return parser.parse_args()
+
+
 def main() -> int:
+    args = parse_args()
+
     print("Resetting database...")
     reset_db()
     
     print("Initialising database schema...")
-    init_db()
+    init_db(args.key_layout)
 
     print("Seeding database...")
     seed()  # ← calls YOUR seeder
 
     print("Starting API...")
-    return run_api()
+    return run_api(args.workers, args.max_requests, args.port)
 
 
 if __name__ == "__main__":
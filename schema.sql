@@ -2,7 +2,8 @@ PRAGMA foreign_keys = ON;
 
 -- Local-style: UUID primary keys stored as TEXT
 -- Sync metadata: updated_at + sync_status
--- Timestamps stored as ISO-8601 TEXT
+-- Timestamps stored as ISO-8601 TEXT, with *_ms epoch-millisecond
+-- generated shadows used for comparisons, filtering and ordering
 
 CREATE TABLE IF NOT EXISTS technicians_cache (
     id TEXT PRIMARY KEY,                 -- UUID (matches client)
@@ -13,6 +14,10 @@ CREATE TABLE IF NOT EXISTS technicians_cache (
     created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
 
+    -- epoch-ms shadows of the ISO timestamps (see migrate_db.py)
+    created_at_ms INTEGER GENERATED ALWAYS AS (CAST(ROUND((julianday(created_at) - 2440587.5) * 86400000) AS INTEGER)) STORED,
+    updated_at_ms INTEGER GENERATED ALWAYS AS (CAST(ROUND((julianday(updated_at) - 2440587.5) * 86400000) AS INTEGER)) STORED,
+
     -- sync metadata
     sync_status TEXT NOT NULL DEFAULT 'synced',
     CHECK (sync_status IN ('synced', 'pending', 'conflict'))
@@ -28,6 +33,14 @@ CREATE TABLE IF NOT EXISTS inspections (
     created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
 
+    -- epoch-ms shadows of the ISO timestamps (see migrate_db.py)
+    created_at_ms INTEGER GENERATED ALWAYS AS (CAST(ROUND((julianday(created_at) - 2440587.5) * 86400000) AS INTEGER)) STORED,
+    updated_at_ms INTEGER GENERATED ALWAYS AS (CAST(ROUND((julianday(updated_at) - 2440587.5) * 86400000) AS INTEGER)) STORED,
+    completed_at_ms INTEGER GENERATED ALWAYS AS (CAST(ROUND((julianday(completed_at) - 2440587.5) * 86400000) AS INTEGER)) STORED,
+
+    -- outstanding / in_progress / completed, derived from opened_at/completed_at
+    status TEXT GENERATED ALWAYS AS (CASE WHEN completed_at IS NOT NULL THEN 'completed' WHEN opened_at IS NOT NULL THEN 'in_progress' ELSE 'outstanding' END) STORED,
+
     -- sync metadata
     sync_status TEXT NOT NULL DEFAULT 'synced',
     CHECK (sync_status IN ('synced', 'pending', 'conflict')),
@@ -47,6 +60,11 @@ CREATE TABLE IF NOT EXISTS tasks (
     created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
 
+    -- epoch-ms shadows of the ISO timestamps (see migrate_db.py)
+    created_at_ms INTEGER GENERATED ALWAYS AS (CAST(ROUND((julianday(created_at) - 2440587.5) * 86400000) AS INTEGER)) STORED,
+    updated_at_ms INTEGER GENERATED ALWAYS AS (CAST(ROUND((julianday(updated_at) - 2440587.5) * 86400000) AS INTEGER)) STORED,
+    completed_at_ms INTEGER GENERATED ALWAYS AS (CAST(ROUND((julianday(completed_at) - 2440587.5) * 86400000) AS INTEGER)) STORED,
+
     -- sync metadata
     sync_status TEXT NOT NULL DEFAULT 'synced',
     CHECK (is_complete IN (0, 1)),
@@ -71,9 +89,21 @@ CREATE TABLE IF NOT EXISTS attachments (
     sha256 TEXT,                          -- optional (if you compute it)
     remote_key TEXT NOT NULL,             -- where the blob is stored on server (path/key)
 
+    -- post-upload processing (blob_jobs.py); NULL status: never queued
+    processing_status TEXT,               -- pending | processed | failed
+    content_sha256 TEXT,                  -- computed from the stored blob
+    sha256_verified INTEGER GENERATED ALWAYS AS (CASE WHEN sha256 IS NULL OR content_sha256 IS NULL THEN NULL ELSE lower(sha256) = content_sha256 END) VIRTUAL,
+    image_width INTEGER,
+    image_height INTEGER,
+    preview_key TEXT,                     -- remote key of a small PNG preview
+
     created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
 
+    -- epoch-ms shadows of the ISO timestamps (see migrate_db.py)
+    created_at_ms INTEGER GENERATED ALWAYS AS (CAST(ROUND((julianday(created_at) - 2440587.5) * 86400000) AS INTEGER)) STORED,
+    updated_at_ms INTEGER GENERATED ALWAYS AS (CAST(ROUND((julianday(updated_at) - 2440587.5) * 86400000) AS INTEGER)) STORED,
+
     -- sync metadata (optional for central, but keeps model consistent)
     sync_status TEXT NOT NULL DEFAULT 'synced',
     CHECK (sync_status IN ('synced', 'pending', 'conflict')),
@@ -83,3 +113,474 @@ CREATE TABLE IF NOT EXISTS attachments (
 
 CREATE INDEX IF NOT EXISTS idx_attachments_task_id ON attachments(task_id);
 CREATE INDEX IF NOT EXISTS idx_attachments_remote_key ON attachments(remote_key);
+
+-- Incremental pulls: WHERE updated_at_ms > ? ORDER BY updated_at_ms, id
+-- (id breaks ties, so a page may end inside a millisecond; see the per-table
+-- watermarks in sync_app.py). Replaces the older updated_at_ms-only indexes.
+DROP INDEX IF EXISTS idx_technicians_cache_updated_at_ms;
+DROP INDEX IF EXISTS idx_inspections_updated_at_ms;
+DROP INDEX IF EXISTS idx_tasks_updated_at_ms;
+DROP INDEX IF EXISTS idx_attachments_updated_at_ms;
+CREATE INDEX IF NOT EXISTS idx_technicians_cache_updated_at_ms_id ON technicians_cache(updated_at_ms, id);
+CREATE INDEX IF NOT EXISTS idx_inspections_updated_at_ms_id ON inspections(updated_at_ms, id);
+CREATE INDEX IF NOT EXISTS idx_tasks_updated_at_ms_id ON tasks(updated_at_ms, id);
+CREATE INDEX IF NOT EXISTS idx_attachments_updated_at_ms_id ON attachments(updated_at_ms, id);
+
+-- Legacy list endpoints: filter, then keyset order (updated_at_ms DESC, id DESC)
+CREATE INDEX IF NOT EXISTS idx_tasks_inspection_id_updated_at_ms ON tasks(inspection_id, updated_at_ms, id);
+CREATE INDEX IF NOT EXISTS idx_inspections_technician_id_updated_at_ms ON inspections(technician_id, updated_at_ms, id);
+CREATE INDEX IF NOT EXISTS idx_inspections_status ON inspections(status, technician_id, updated_at_ms, id);
+
+-- Deletes (tombstones)
+-- Triggers log every delete (including ON DELETE CASCADE children) so
+-- /sync/jobs can tell clients which rows to drop. seq is AUTOINCREMENT so
+-- it never goes backwards after compaction.
+
+CREATE TABLE IF NOT EXISTS tombstones (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    table_name TEXT NOT NULL,
+    row_id NOT NULL,                      -- deleted row's id (same storage as the table's key)
+    deleted_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%SZ', 'now'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_tombstones_row ON tombstones(table_name, row_id);
+
+-- Devices that sync, and the highest tombstone seq each has applied.
+-- Tombstones every active device has passed are compacted away.
+CREATE TABLE IF NOT EXISTS sync_devices (
+    device_id TEXT PRIMARY KEY,
+    tombstone_seq INTEGER NOT NULL DEFAULT 0,
+    last_seen_at TEXT NOT NULL
+) WITHOUT ROWID;
+
+-- Small server-side key/value state (e.g. tombstones_compacted_through)
+CREATE TABLE IF NOT EXISTS sync_meta (
+    key TEXT PRIMARY KEY,
+    value
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_technicians_cache_tombstone AFTER DELETE ON technicians_cache
+BEGIN
+    INSERT INTO tombstones (table_name, row_id) VALUES ('technicians_cache', OLD.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_inspections_tombstone AFTER DELETE ON inspections
+BEGIN
+    INSERT INTO tombstones (table_name, row_id) VALUES ('inspections', OLD.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_tasks_tombstone AFTER DELETE ON tasks
+BEGIN
+    INSERT INTO tombstones (table_name, row_id) VALUES ('tasks', OLD.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_attachments_tombstone AFTER DELETE ON attachments
+BEGIN
+    INSERT INTO tombstones (table_name, row_id) VALUES ('attachments', OLD.id);
+END;
+
+-- A re-created row supersedes its tombstone
+CREATE TRIGGER IF NOT EXISTS trg_technicians_cache_untombstone AFTER INSERT ON technicians_cache
+BEGIN
+    DELETE FROM tombstones WHERE table_name = 'technicians_cache' AND row_id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_inspections_untombstone AFTER INSERT ON inspections
+BEGIN
+    DELETE FROM tombstones WHERE table_name = 'inspections' AND row_id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_tasks_untombstone AFTER INSERT ON tasks
+BEGIN
+    DELETE FROM tombstones WHERE table_name = 'tasks' AND row_id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_attachments_untombstone AFTER INSERT ON attachments
+BEGIN
+    DELETE FROM tombstones WHERE table_name = 'attachments' AND row_id = NEW.id;
+END;
+
+-- Per-column change markers (field-level delta sync)
+-- One row per (table, row, column) holding the updated_at_ms of the last
+-- update that changed that column, so /sync/jobs can pull only changed
+-- fields and merge patches that touch different columns.
+
+CREATE TABLE IF NOT EXISTS column_changes (
+    table_name TEXT NOT NULL,
+    row_id NOT NULL,
+    column_name TEXT NOT NULL,
+    changed_at_ms INTEGER,
+    PRIMARY KEY (table_name, row_id, column_name)
+) WITHOUT ROWID;
+
+-- Markers only exist from this point on; older watermarks get full rows
+INSERT OR IGNORE INTO sync_meta (key, value)
+VALUES ('column_changes_since_ms', CAST(strftime('%s', 'now') AS INTEGER) * 1000);
+
+CREATE TRIGGER IF NOT EXISTS trg_technicians_cache_column_changes AFTER UPDATE ON technicians_cache
+BEGIN
+    INSERT OR REPLACE INTO column_changes (table_name, row_id, column_name, changed_at_ms)
+    SELECT 'technicians_cache', NEW.id, 'username', NEW.updated_at_ms WHERE OLD.username IS NOT NEW.username;
+    INSERT OR REPLACE INTO column_changes (table_name, row_id, column_name, changed_at_ms)
+    SELECT 'technicians_cache', NEW.id, 'display_name', NEW.updated_at_ms WHERE OLD.display_name IS NOT NEW.display_name;
+    INSERT OR REPLACE INTO column_changes (table_name, row_id, column_name, changed_at_ms)
+    SELECT 'technicians_cache', NEW.id, 'role', NEW.updated_at_ms WHERE OLD.role IS NOT NEW.role;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_inspections_column_changes AFTER UPDATE ON inspections
+BEGIN
+    INSERT OR REPLACE INTO column_changes (table_name, row_id, column_name, changed_at_ms)
+    SELECT 'inspections', NEW.id, 'aircraft_id', NEW.updated_at_ms WHERE OLD.aircraft_id IS NOT NEW.aircraft_id;
+    INSERT OR REPLACE INTO column_changes (table_name, row_id, column_name, changed_at_ms)
+    SELECT 'inspections', NEW.id, 'opened_at', NEW.updated_at_ms WHERE OLD.opened_at IS NOT NEW.opened_at;
+    INSERT OR REPLACE INTO column_changes (table_name, row_id, column_name, changed_at_ms)
+    SELECT 'inspections', NEW.id, 'completed_at', NEW.updated_at_ms WHERE OLD.completed_at IS NOT NEW.completed_at;
+    INSERT OR REPLACE INTO column_changes (table_name, row_id, column_name, changed_at_ms)
+    SELECT 'inspections', NEW.id, 'technician_id', NEW.updated_at_ms WHERE OLD.technician_id IS NOT NEW.technician_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_tasks_column_changes AFTER UPDATE ON tasks
+BEGIN
+    INSERT OR REPLACE INTO column_changes (table_name, row_id, column_name, changed_at_ms)
+    SELECT 'tasks', NEW.id, 'inspection_id', NEW.updated_at_ms WHERE OLD.inspection_id IS NOT NEW.inspection_id;
+    INSERT OR REPLACE INTO column_changes (table_name, row_id, column_name, changed_at_ms)
+    SELECT 'tasks', NEW.id, 'title', NEW.updated_at_ms WHERE OLD.title IS NOT NEW.title;
+    INSERT OR REPLACE INTO column_changes (table_name, row_id, column_name, changed_at_ms)
+    SELECT 'tasks', NEW.id, 'description', NEW.updated_at_ms WHERE OLD.description IS NOT NEW.description;
+    INSERT OR REPLACE INTO column_changes (table_name, row_id, column_name, changed_at_ms)
+    SELECT 'tasks', NEW.id, 'is_complete', NEW.updated_at_ms WHERE OLD.is_complete IS NOT NEW.is_complete;
+    INSERT OR REPLACE INTO column_changes (table_name, row_id, column_name, changed_at_ms)
+    SELECT 'tasks', NEW.id, 'result', NEW.updated_at_ms WHERE OLD.result IS NOT NEW.result;
+    INSERT OR REPLACE INTO column_changes (table_name, row_id, column_name, changed_at_ms)
+    SELECT 'tasks', NEW.id, 'notes', NEW.updated_at_ms WHERE OLD.notes IS NOT NEW.notes;
+    INSERT OR REPLACE INTO column_changes (table_name, row_id, column_name, changed_at_ms)
+    SELECT 'tasks', NEW.id, 'completed_at', NEW.updated_at_ms WHERE OLD.completed_at IS NOT NEW.completed_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_attachments_column_changes AFTER UPDATE ON attachments
+BEGIN
+    INSERT OR REPLACE INTO column_changes (table_name, row_id, column_name, changed_at_ms)
+    SELECT 'attachments', NEW.id, 'task_id', NEW.updated_at_ms WHERE OLD.task_id IS NOT NEW.task_id;
+    INSERT OR REPLACE INTO column_changes (table_name, row_id, column_name, changed_at_ms)
+    SELECT 'attachments', NEW.id, 'file_name', NEW.updated_at_ms WHERE OLD.file_name IS NOT NEW.file_name;
+    INSERT OR REPLACE INTO column_changes (table_name, row_id, column_name, changed_at_ms)
+    SELECT 'attachments', NEW.id, 'mime_type', NEW.updated_at_ms WHERE OLD.mime_type IS NOT NEW.mime_type;
+    INSERT OR REPLACE INTO column_changes (table_name, row_id, column_name, changed_at_ms)
+    SELECT 'attachments', NEW.id, 'size_bytes', NEW.updated_at_ms WHERE OLD.size_bytes IS NOT NEW.size_bytes;
+    INSERT OR REPLACE INTO column_changes (table_name, row_id, column_name, changed_at_ms)
+    SELECT 'attachments', NEW.id, 'sha256', NEW.updated_at_ms WHERE OLD.sha256 IS NOT NEW.sha256;
+    INSERT OR REPLACE INTO column_changes (table_name, row_id, column_name, changed_at_ms)
+    SELECT 'attachments', NEW.id, 'remote_key', NEW.updated_at_ms WHERE OLD.remote_key IS NOT NEW.remote_key;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_technicians_cache_column_changes_cleanup AFTER DELETE ON technicians_cache
+BEGIN
+    DELETE FROM column_changes WHERE table_name = 'technicians_cache' AND row_id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_inspections_column_changes_cleanup AFTER DELETE ON inspections
+BEGIN
+    DELETE FROM column_changes WHERE table_name = 'inspections' AND row_id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_tasks_column_changes_cleanup AFTER DELETE ON tasks
+BEGIN
+    DELETE FROM column_changes WHERE table_name = 'tasks' AND row_id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_attachments_column_changes_cleanup AFTER DELETE ON attachments
+BEGIN
+    DELETE FROM column_changes WHERE table_name = 'attachments' AND row_id = OLD.id;
+END;
+
+-- Rejected pushes (conflicts)
+-- The live row is left alone; the client's version is kept here, with the
+-- server updated_at it lost to, until it is resolved via /sync/conflicts.
+-- One open conflict per (table, row, device): a re-push replaces it.
+
+CREATE TABLE IF NOT EXISTS sync_conflicts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,  -- never reused, so after_id paging is safe
+    table_name TEXT NOT NULL,
+    row_id NOT NULL,                      -- same storage as the table's key
+    device_id TEXT NOT NULL DEFAULT '',
+    incoming TEXT NOT NULL,               -- rejected client version (JSON)
+    server_updated_at TEXT,               -- server version it lost to (NULL: no server row)
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%SZ', 'now')),
+    UNIQUE (table_name, row_id, device_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_sync_conflicts_device ON sync_conflicts(device_id, id);
+
+CREATE TRIGGER IF NOT EXISTS trg_technicians_cache_conflicts_cleanup AFTER DELETE ON technicians_cache
+BEGIN
+    DELETE FROM sync_conflicts WHERE table_name = 'technicians_cache' AND row_id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_inspections_conflicts_cleanup AFTER DELETE ON inspections
+BEGIN
+    DELETE FROM sync_conflicts WHERE table_name = 'inspections' AND row_id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_tasks_conflicts_cleanup AFTER DELETE ON tasks
+BEGIN
+    DELETE FROM sync_conflicts WHERE table_name = 'tasks' AND row_id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_attachments_conflicts_cleanup AFTER DELETE ON attachments
+BEGIN
+    DELETE FROM sync_conflicts WHERE table_name = 'attachments' AND row_id = OLD.id;
+END;
+
+-- Per-inspection progress counters
+-- Kept current by the triggers below, so "7/12 tasks complete" is one row
+-- read instead of pulling every task. last_activity_ms is the latest
+-- updated_at_ms of the inspection's tasks/attachments (or the time of the
+-- last delete). Existing databases are backfilled by migrate_db.py.
+
+CREATE TABLE IF NOT EXISTS inspection_progress (
+    inspection_id NOT NULL PRIMARY KEY,   -- same storage as inspections.id
+    total_tasks INTEGER NOT NULL DEFAULT 0,
+    completed_tasks INTEGER NOT NULL DEFAULT 0,
+    attachments INTEGER NOT NULL DEFAULT 0,
+    last_activity_ms INTEGER
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_inspection_progress_activity ON inspection_progress(last_activity_ms);
+
+CREATE TRIGGER IF NOT EXISTS trg_inspections_progress_insert AFTER INSERT ON inspections
+BEGIN
+    INSERT OR IGNORE INTO inspection_progress (inspection_id) VALUES (NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_inspections_progress_delete AFTER DELETE ON inspections
+BEGIN
+    DELETE FROM inspection_progress WHERE inspection_id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_tasks_progress_insert AFTER INSERT ON tasks
+BEGIN
+    INSERT INTO inspection_progress (inspection_id, total_tasks, completed_tasks, last_activity_ms)
+    VALUES (NEW.inspection_id, 1, NEW.is_complete, NEW.updated_at_ms)
+    ON CONFLICT (inspection_id) DO UPDATE SET
+        total_tasks = total_tasks + 1,
+        completed_tasks = completed_tasks + excluded.completed_tasks,
+        last_activity_ms = MAX(IFNULL(last_activity_ms, 0), IFNULL(excluded.last_activity_ms, 0));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_tasks_progress_update AFTER UPDATE OF inspection_id, is_complete, updated_at ON tasks
+BEGIN
+    UPDATE inspection_progress
+    SET total_tasks = total_tasks - 1,
+        completed_tasks = completed_tasks - OLD.is_complete,
+        attachments = attachments - (SELECT COUNT(*) FROM attachments WHERE task_id = OLD.id)
+    WHERE inspection_id = OLD.inspection_id;
+    INSERT INTO inspection_progress (inspection_id, total_tasks, completed_tasks, attachments, last_activity_ms)
+    VALUES (
+        NEW.inspection_id, 1, NEW.is_complete,
+        (SELECT COUNT(*) FROM attachments WHERE task_id = NEW.id),
+        NEW.updated_at_ms
+    )
+    ON CONFLICT (inspection_id) DO UPDATE SET
+        total_tasks = total_tasks + 1,
+        completed_tasks = completed_tasks + excluded.completed_tasks,
+        attachments = attachments + excluded.attachments,
+        last_activity_ms = MAX(IFNULL(last_activity_ms, 0), IFNULL(excluded.last_activity_ms, 0));
+END;
+
+-- BEFORE, so the task's attachments (removed by ON DELETE CASCADE before
+-- any AFTER trigger runs) can still be counted
+CREATE TRIGGER IF NOT EXISTS trg_tasks_progress_delete BEFORE DELETE ON tasks
+BEGIN
+    UPDATE inspection_progress
+    SET total_tasks = total_tasks - 1,
+        completed_tasks = completed_tasks - OLD.is_complete,
+        attachments = attachments - (SELECT COUNT(*) FROM attachments WHERE task_id = OLD.id),
+        last_activity_ms = MAX(
+            IFNULL(last_activity_ms, 0),
+            CAST(ROUND((julianday('now') - 2440587.5) * 86400000) AS INTEGER)
+        )
+    WHERE inspection_id = OLD.inspection_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_attachments_progress_insert AFTER INSERT ON attachments
+BEGIN
+    UPDATE inspection_progress
+    SET attachments = attachments + 1,
+        last_activity_ms = MAX(IFNULL(last_activity_ms, 0), IFNULL(NEW.updated_at_ms, 0))
+    WHERE inspection_id = (SELECT inspection_id FROM tasks WHERE id = NEW.task_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_attachments_progress_update AFTER UPDATE OF task_id, updated_at ON attachments
+BEGIN
+    UPDATE inspection_progress
+    SET attachments = attachments - 1
+    WHERE inspection_id = (SELECT inspection_id FROM tasks WHERE id = OLD.task_id);
+    UPDATE inspection_progress
+    SET attachments = attachments + 1,
+        last_activity_ms = MAX(IFNULL(last_activity_ms, 0), IFNULL(NEW.updated_at_ms, 0))
+    WHERE inspection_id = (SELECT inspection_id FROM tasks WHERE id = NEW.task_id);
+END;
+
+-- Direct deletes only: when the task goes too, its delete trigger has
+-- already counted the attachment and the lookup below finds no task
+CREATE TRIGGER IF NOT EXISTS trg_attachments_progress_delete AFTER DELETE ON attachments
+BEGIN
+    UPDATE inspection_progress
+    SET attachments = attachments - 1,
+        last_activity_ms = MAX(
+            IFNULL(last_activity_ms, 0),
+            CAST(ROUND((julianday('now') - 2440587.5) * 86400000) AS INTEGER)
+        )
+    WHERE inspection_id = (SELECT inspection_id FROM tasks WHERE id = OLD.task_id);
+END;
+
+-- Full-text search over tasks (see search_index.py)
+-- External-content FTS5 index keyed by tasks.rowid; the triggers keep it in
+-- step with tasks. tasks has no INTEGER PRIMARY KEY, so a full VACUUM may
+-- renumber rowids: run `python search_index.py rebuild` after one.
+
+CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+    title, description, notes, result,
+    content = 'tasks', content_rowid = 'rowid',
+    tokenize = 'porter unicode61'
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_tasks_fts_insert AFTER INSERT ON tasks
+BEGIN
+    INSERT INTO tasks_fts (rowid, title, description, notes, result)
+    VALUES (NEW.rowid, NEW.title, NEW.description, NEW.notes, NEW.result);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_tasks_fts_delete AFTER DELETE ON tasks
+BEGIN
+    INSERT INTO tasks_fts (tasks_fts, rowid, title, description, notes, result)
+    VALUES ('delete', OLD.rowid, OLD.title, OLD.description, OLD.notes, OLD.result);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_tasks_fts_update AFTER UPDATE OF title, description, notes, result ON tasks
+BEGIN
+    INSERT INTO tasks_fts (tasks_fts, rowid, title, description, notes, result)
+    VALUES ('delete', OLD.rowid, OLD.title, OLD.description, OLD.notes, OLD.result);
+    INSERT INTO tasks_fts (rowid, title, description, notes, result)
+    VALUES (NEW.rowid, NEW.title, NEW.description, NEW.notes, NEW.result);
+END;
+
+-- Per-table change counters for the in-process row cache (see row_cache.py).
+-- A cache notices commits through PRAGMA data_version; these say which
+-- tables they touched, so it only drops entries for those.
+
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO table_versions (table_name) VALUES ('technicians_cache'), ('inspections'), ('tasks');
+
+CREATE TRIGGER IF NOT EXISTS trg_technicians_cache_version_insert AFTER INSERT ON technicians_cache
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'technicians_cache';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_technicians_cache_version_update AFTER UPDATE ON technicians_cache
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'technicians_cache';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_technicians_cache_version_delete AFTER DELETE ON technicians_cache
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'technicians_cache';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_inspections_version_insert AFTER INSERT ON inspections
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'inspections';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_inspections_version_update AFTER UPDATE ON inspections
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'inspections';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_inspections_version_delete AFTER DELETE ON inspections
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'inspections';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_tasks_version_insert AFTER INSERT ON tasks
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'tasks';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_tasks_version_update AFTER UPDATE ON tasks
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'tasks';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_tasks_version_delete AFTER DELETE ON tasks
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'tasks';
+END;
+
+-- Post-upload blob processing queue (blob_jobs.py)
+-- One job per uploaded blob; a re-upload re-queues it. Results stay here
+-- so that an attachments row pushed after processing finished still gets
+-- them (trg_attachments_processing_insert).
+
+CREATE TABLE IF NOT EXISTS blob_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    remote_key TEXT NOT NULL UNIQUE,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_after_ms INTEGER NOT NULL DEFAULT 0,   -- retry backoff
+    locked_by TEXT,                           -- worker holding the job
+    locked_until_ms INTEGER,                  -- lease; reclaimed after this
+    last_error TEXT,
+
+    -- copied onto attachments rows with this remote_key
+    processing_status TEXT NOT NULL DEFAULT 'pending',
+    content_sha256 TEXT,
+    image_width INTEGER,
+    image_height INTEGER,
+    preview_key TEXT,
+
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%SZ', 'now')),
+    updated_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%SZ', 'now')),
+    CHECK (state IN ('queued', 'running', 'done', 'failed'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_blob_jobs_runnable ON blob_jobs(state, run_after_ms);
+
+CREATE TRIGGER IF NOT EXISTS trg_attachments_processing_insert AFTER INSERT ON attachments
+BEGIN
+    UPDATE attachments
+    SET (processing_status, content_sha256, image_width, image_height, preview_key) =
+        (SELECT processing_status, content_sha256, image_width, image_height, preview_key
+         FROM blob_jobs WHERE remote_key = NEW.remote_key)
+    WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_attachments_processing_remote_key AFTER UPDATE OF remote_key ON attachments
+WHEN OLD.remote_key IS NOT NEW.remote_key
+BEGIN
+    UPDATE attachments
+    SET (processing_status, content_sha256, image_width, image_height, preview_key) =
+        (SELECT processing_status, content_sha256, image_width, image_height, preview_key
+         FROM blob_jobs WHERE remote_key = NEW.remote_key)
+    WHERE id = NEW.id;
+END;
+
+-- Change markers for the processing columns, so field-level pulls send them
+CREATE TRIGGER IF NOT EXISTS trg_attachments_processing_changes
+AFTER UPDATE OF processing_status, content_sha256, image_width, image_height, preview_key ON attachments
+BEGIN
+    INSERT OR REPLACE INTO column_changes (table_name, row_id, column_name, changed_at_ms)
+    SELECT 'attachments', NEW.id, 'processing_status', NEW.updated_at_ms WHERE OLD.processing_status IS NOT NEW.processing_status;
+    INSERT OR REPLACE INTO column_changes (table_name, row_id, column_name, changed_at_ms)
+    SELECT 'attachments', NEW.id, 'content_sha256', NEW.updated_at_ms WHERE OLD.content_sha256 IS NOT NEW.content_sha256;
+    INSERT OR REPLACE INTO column_changes (table_name, row_id, column_name, changed_at_ms)
+    SELECT 'attachments', NEW.id, 'image_width', NEW.updated_at_ms WHERE OLD.image_width IS NOT NEW.image_width;
+    INSERT OR REPLACE INTO column_changes (table_name, row_id, column_name, changed_at_ms)
+    SELECT 'attachments', NEW.id, 'image_height', NEW.updated_at_ms WHERE OLD.image_height IS NOT NEW.image_height;
+    INSERT OR REPLACE INTO column_changes (table_name, row_id, column_name, changed_at_ms)
+    SELECT 'attachments', NEW.id, 'preview_key', NEW.updated_at_ms WHERE OLD.preview_key IS NOT NEW.preview_key;
+END;
@@ -0,0 +1,113 @@
+PRAGMA foreign_keys = ON;
+
+-- Compact key layout (optional): UUID keys stored as 16-byte BLOBs.
+-- Run BEFORE schema.sql (init_db.py --key-layout compact); schema.sql then
+-- skips these tables and adds the shared indexes on top.
+--
+-- Same columns as schema.sql; sync_app.py converts keys at the API boundary
+-- (see uuid_keys.py), so clients still send and receive UUID strings.
+-- legacy/crud_app.py only supports the TEXT layout.
+--
+-- Small fixed-size rows are clustered on the key (WITHOUT ROWID), which
+-- drops the separate rowid->key index. tasks keeps its rowid because
+-- description/notes rows can be large.
+
+CREATE TABLE IF NOT EXISTS technicians_cache (
+    id BLOB PRIMARY KEY,                 -- UUID bytes
+    username TEXT NOT NULL UNIQUE,
+    display_name TEXT,
+    role TEXT NOT NULL DEFAULT 'technician',
+
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    -- epoch-ms shadows of the ISO timestamps (see migrate_db.py)
+    created_at_ms INTEGER GENERATED ALWAYS AS (CAST(ROUND((julianday(created_at) - 2440587.5) * 86400000) AS INTEGER)) STORED,
+    updated_at_ms INTEGER GENERATED ALWAYS AS (CAST(ROUND((julianday(updated_at) - 2440587.5) * 86400000) AS INTEGER)) STORED,
+
+    -- sync metadata
+    sync_status TEXT NOT NULL DEFAULT 'synced',
+    CHECK (sync_status IN ('synced', 'pending', 'conflict'))
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS inspections (
+    id BLOB PRIMARY KEY,                 -- UUID bytes
+    aircraft_id TEXT NOT NULL,
+    opened_at TEXT,
+    completed_at TEXT,
+
+    technician_id BLOB,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    -- epoch-ms shadows of the ISO timestamps (see migrate_db.py)
+    created_at_ms INTEGER GENERATED ALWAYS AS (CAST(ROUND((julianday(created_at) - 2440587.5) * 86400000) AS INTEGER)) STORED,
+    updated_at_ms INTEGER GENERATED ALWAYS AS (CAST(ROUND((julianday(updated_at) - 2440587.5) * 86400000) AS INTEGER)) STORED,
+    completed_at_ms INTEGER GENERATED ALWAYS AS (CAST(ROUND((julianday(completed_at) - 2440587.5) * 86400000) AS INTEGER)) STORED,
+
+    -- outstanding / in_progress / completed, derived from opened_at/completed_at
+    status TEXT GENERATED ALWAYS AS (CASE WHEN completed_at IS NOT NULL THEN 'completed' WHEN opened_at IS NOT NULL THEN 'in_progress' ELSE 'outstanding' END) STORED,
+
+    -- sync metadata
+    sync_status TEXT NOT NULL DEFAULT 'synced',
+    CHECK (sync_status IN ('synced', 'pending', 'conflict')),
+    FOREIGN KEY (technician_id) REFERENCES technicians_cache(id) ON DELETE SET NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS tasks (
+    id BLOB PRIMARY KEY,                 -- UUID bytes
+    inspection_id BLOB NOT NULL,
+    title TEXT NOT NULL,
+    description TEXT,
+    is_complete INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    notes TEXT,
+    completed_at TEXT,
+
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    -- epoch-ms shadows of the ISO timestamps (see migrate_db.py)
+    created_at_ms INTEGER GENERATED ALWAYS AS (CAST(ROUND((julianday(created_at) - 2440587.5) * 86400000) AS INTEGER)) STORED,
+    updated_at_ms INTEGER GENERATED ALWAYS AS (CAST(ROUND((julianday(updated_at) - 2440587.5) * 86400000) AS INTEGER)) STORED,
+    completed_at_ms INTEGER GENERATED ALWAYS AS (CAST(ROUND((julianday(completed_at) - 2440587.5) * 86400000) AS INTEGER)) STORED,
+
+    -- sync metadata
+    sync_status TEXT NOT NULL DEFAULT 'synced',
+    CHECK (is_complete IN (0, 1)),
+    CHECK (sync_status IN ('synced', 'pending', 'conflict')),
+    FOREIGN KEY (inspection_id) REFERENCES inspections(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS attachments (
+    id BLOB PRIMARY KEY,                 -- UUID bytes
+    task_id BLOB NOT NULL UNIQUE,
+
+    file_name TEXT NOT NULL,
+    mime_type TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+
+    sha256 TEXT,
+    remote_key TEXT NOT NULL,
+
+    -- post-upload processing (blob_jobs.py); NULL status: never queued
+    processing_status TEXT,               -- pending | processed | failed
+    content_sha256 TEXT,                  -- computed from the stored blob
+    sha256_verified INTEGER GENERATED ALWAYS AS (CASE WHEN sha256 IS NULL OR content_sha256 IS NULL THEN NULL ELSE lower(sha256) = content_sha256 END) VIRTUAL,
+    image_width INTEGER,
+    image_height INTEGER,
+    preview_key TEXT,                     -- remote key of a small PNG preview
+
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    -- epoch-ms shadows of the ISO timestamps (see migrate_db.py)
+    created_at_ms INTEGER GENERATED ALWAYS AS (CAST(ROUND((julianday(created_at) - 2440587.5) * 86400000) AS INTEGER)) STORED,
+    updated_at_ms INTEGER GENERATED ALWAYS AS (CAST(ROUND((julianday(updated_at) - 2440587.5) * 86400000) AS INTEGER)) STORED,
+
+    -- sync metadata
+    sync_status TEXT NOT NULL DEFAULT 'synced',
+    CHECK (sync_status IN ('synced', 'pending', 'conflict')),
+
+    FOREIGN KEY (task_id) REFERENCES tasks(id) ON DELETE CASCADE
+) WITHOUT ROWID;
@@ -0,0 +1,76 @@
+"""
+search_index.py
+
+Full-text search over tasks (title, description, notes, result), backed by
+the tasks_fts FTS5 index in schema.sql.
+
+  python search_index.py rebuild    # re-index every task (after a VACUUM,
+                                    # or if the index is ever suspect)
+  python search_index.py optimize   # merge index segments (after big imports)
+  python search_index.py check      # FTS5 integrity-check against tasks
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+DB_PATH = Path(os.environ.get("WAREHOUSE_DB_PATH") or BASE_DIR / "warehouse.db")
+
+# Column weights for bm25(): title, description, notes, result
+BM25_WEIGHTS = (10.0, 2.0, 1.0, 1.0)
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_query(text: str, prefix: bool = False) -> str:
+    """
+    Turn free text into an FTS5 query: every word must match (AND), and
+    FTS5 operators/punctuation in the input are treated as plain text.
+    With `prefix`, the last word also matches as a prefix (type-ahead).
+    Returns "" if the text has no searchable words (or is not a string).
+    """
+    if not isinstance(text, str):
+        return ""
+    terms = [f'"{t}"' for t in _TERM_RE.findall(text)]
+    if terms and prefix:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def rebuild(connection: sqlite3.Connection) -> None:
+    connection.execute("INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')")
+
+
+def optimize(connection: sqlite3.Connection) -> None:
+    connection.execute("INSERT INTO tasks_fts (tasks_fts) VALUES ('optimize')")
+
+
+def check(connection: sqlite3.Connection) -> bool:
+    """True if the index matches the tasks table."""
+    try:
+        connection.execute("INSERT INTO tasks_fts (tasks_fts, rank) VALUES ('integrity-check', 1)")
+    except sqlite3.DatabaseError:
+        return False
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the task full-text search index")
+    parser.add_argument("command", choices=("rebuild", "optimize", "check"))
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    args = parser.parse_args()
+
+    with sqlite3.connect(args.db) as conn:
+        if args.command == "rebuild":
+            rebuild(conn)
+            print(f"Rebuilt tasks_fts in {args.db}")
+        elif args.command == "optimize":
+            optimize(conn)
+            print(f"Optimized tasks_fts in {args.db}")
+        else:
+            ok = check(conn)
+            print("tasks_fts OK" if ok else "tasks_fts is out of step with tasks; run rebuild")
+            raise SystemExit(0 if ok else 1)
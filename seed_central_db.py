@@ -4,6 +4,8 @@ import sqlite3
 from uuid import uuid4
 from datetime import datetime, timezone, timedelta
 
+from uuid_keys import detect_layout, to_blob
+
 DB_FILENAME = "warehouse.db"
 WIPE_FIRST = False  # set True to clear tables before seeding
 
@@ -32,6 +34,9 @@ def seed() -> None:
     conn = connect()
     cur = conn.cursor()
 
+    # Compact layout stores UUID keys as 16-byte BLOBs
+    key = to_blob if detect_layout(conn) == "compact" else (lambda v: v)
+
     if WIPE_FIRST:
         # Order matters due to FKs (tasks -> inspections -> technicians_cache)
         cur.execute("DELETE FROM tasks;")
@@ -60,7 +65,7 @@ def seed() -> None:
             )
             VALUES (?, ?, ?, 'technician', ?, ?, 'synced')
             """,
-            (tid, username, display_name, created_at, updated_at),
+            (key(tid), username, display_name, created_at, updated_at),
         )
 
     # IMPORTANT: fetch real IDs (source of truth) so FKs never break
@@ -80,7 +85,7 @@ def seed() -> None:
 
 
     # ---- Inspections ----
-    # Schema has no "status" column; derive status locally from opened_at/completed_at.
+    # status is a generated column, derived from opened_at/completed_at.
     seeded_inspections = [
         ("G-ABCD", None, None, 0),  # outstanding
         ("G-EFGH", None, None, 0),  # outstanding
@@ -93,7 +98,7 @@ def seed() -> None:
 
     inspection_ids: list[str] = []
     for i, (aircraft_id, opened_at_dt, completed_at_dt, is_completed) in enumerate(seeded_inspections):
-        iid = str(uuid4())
+        iid = key(str(uuid4()))
         inspection_ids.append(iid)
 
         technician_id = tech_ids[i % len(tech_ids)]
@@ -151,7 +156,7 @@ def seed() -> None:
                 VALUES (?, ?, ?, ?, ?, NULL, NULL, ?, ?, ?, 'synced')
                 """,
                 (
-                    str(uuid4()),
+                    key(str(uuid4())),
                     iid,
                     title,
                     None,               # description (optional)
@@ -0,0 +1,207 @@
+"""
+shards.py
+
+One SQLite file per site (hangar, fleet, ...) instead of a single
+warehouse.db, so devices at different sites stop queueing on one write
+lock: write throughput grows with the number of sites.
+
+WAREHOUSE_SHARDS names a JSON file:
+
+  {
+    "shards": {
+      "hangar-a": "/srv/warehouse-hangar-a.db",
+      "hangar-b": "/srv/warehouse-hangar-b.db"
+    },
+    "api_keys": {"<api key issued to hangar-a devices>": "hangar-a"},
+    "default": "hangar-a"
+  }
+
+Relative paths are resolved against the JSON file's directory. Without
+WAREHOUSE_SHARDS there is a single shard, "default", at WAREHOUSE_DB_PATH,
+and nothing changes.
+
+sync_app.py picks a shard for each request in this order:
+  1. the X-Site header, or a ?site= query parameter;
+  2. the shard of the request's API key;
+  3. "default", if configured.
+Otherwise it answers 400. The choice is kept in the `current` ContextVar
+for the rest of the request. Every shard is a complete database with its
+own connection pool, caches, snapshots, archive and maintenance.
+
+Fleet-wide reads use fan_out(): it runs a function once per shard on a
+thread pool, with `current` set, and returns {shard: result}. ATTACH was
+not used, for two reasons. A connection can attach only 10 databases by
+default. A query over attached databases also holds a read transaction
+on all of them at once.
+
+  python shards.py init [--key-layout compact]   # create/upgrade every shard
+  python shards.py list
+"""
+
+import argparse
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+BASE_DIR = Path(__file__).resolve().parent
+DB_PATH = Path(os.environ.get("WAREHOUSE_DB_PATH") or BASE_DIR / "warehouse.db")
+
+DEFAULT_SHARD = "default"
+POOL_MAX_IDLE = 4          # idle connections kept per shard per process
+FAN_OUT_MAX_WORKERS = 8
+
+# Shard the current request (or fan_out task) works on
+current: contextvars.ContextVar[str] = contextvars.ContextVar("shard", default=DEFAULT_SHARD)
+
+
+class ShardError(ValueError):
+    """The request names no shard, or one that does not exist."""
+
+
+class ShardConfig:
+    def __init__(self, shards: Dict[str, str], api_keys: Optional[Dict[str, str]] = None, default: Optional[str] = None):
+        if not shards:
+            raise ShardError("no shards configured")
+        unknown = {s for s in [*(api_keys or {}).values(), default] if s and s not in shards}
+        if unknown:
+            raise ShardError(f"unknown shard(s) in config: {', '.join(sorted(unknown))}")
+        self.shards = dict(shards)
+        self.api_keys = dict(api_keys or {})
+        self.default = default
+
+    @property
+    def is_sharded(self) -> bool:
+        return len(self.shards) > 1 or DEFAULT_SHARD not in self.shards
+
+    def resolve(self, site: Optional[str], api_key: Optional[str]) -> str:
+        if site:
+            if site not in self.shards:
+                raise ShardError(f"unknown site: {site}")
+            return site
+        if api_key in self.api_keys:
+            return self.api_keys[api_key]
+        if self.default:
+            return self.default
+        raise ShardError("site is required (X-Site header or ?site=)")
+
+
+def load_config(path=None, default_db_path=DB_PATH) -> ShardConfig:
+    """Shards from the JSON file at `path`, or the single default shard."""
+    if not path:
+        return ShardConfig({DEFAULT_SHARD: str(default_db_path)}, default=DEFAULT_SHARD)
+    path = Path(path)
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+    shards = {name: str(path.parent / db) for name, db in raw.get("shards", {}).items()}
+    return ShardConfig(shards, raw.get("api_keys"), raw.get("default"))
+
+
+# ----------------------------
+# Connection pool
+# ----------------------------
+
+class PooledConnection(sqlite3.Connection):
+    """Goes back to its pool at the end of `with get_connection() as c:`."""
+
+    pool: Optional["ConnectionPool"] = None
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            return super().__exit__(exc_type, exc, tb)
+        finally:
+            if self.pool is not None:
+                self.pool.release(self)
+
+
+class ConnectionPool:
+    """
+    Idle autocommit connections to one database, reused across requests.
+    Never blocks: with no idle connection a new one is opened, and at most
+    `max_idle` are kept once released.
+    """
+
+    def __init__(self, db_path: str, max_idle: int = POOL_MAX_IDLE, uri: bool = False):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self.uri = uri
+        self.opened = 0
+        self._idle: List[PooledConnection] = []
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def acquire(self) -> PooledConnection:
+        with self._lock:
+            if self._pid != os.getpid():
+                # connections must not cross fork (prefork_server.py)
+                self._idle = []
+                self._pid = os.getpid()
+            if self._idle:
+                return self._idle.pop()
+            self.opened += 1
+        connection = sqlite3.connect(
+            self.db_path, isolation_level=None, check_same_thread=False, factory=PooledConnection, uri=self.uri
+        )
+        connection.execute("PRAGMA foreign_keys = ON")
+        connection.row_factory = sqlite3.Row
+        connection.pool = self
+        return connection
+
+    def release(self, connection: PooledConnection) -> None:
+        if connection.in_transaction:
+            connection.rollback()  # left open by an error path
+        with self._lock:
+            if self._pid == os.getpid() and len(self._idle) < self.max_idle:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"idle": len(self._idle), "opened": self.opened}
+
+
+# ----------------------------
+# Fan-out
+# ----------------------------
+
+def fan_out(
+    fn: Callable[[str], Any], names: List[str], max_workers: int = FAN_OUT_MAX_WORKERS
+) -> Dict[str, Any]:
+    """Run fn(name) for every shard concurrently, with `current` set to it."""
+    def run(name: str) -> Any:
+        token = current.set(name)
+        try:
+            return fn(name)
+        finally:
+            current.reset(token)
+
+    if not names:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(names)), thread_name_prefix="shard") as executor:
+        futures = {name: executor.submit(contextvars.copy_context().run, run, name) for name in names}
+        return {name: future.result() for name, future in futures.items()}
+
+
+if __name__ == "__main__":
+    import init_db
+
+    parser = argparse.ArgumentParser(description="Per-site database shards")
+    parser.add_argument("command", choices=("init", "list"))
+    parser.add_argument("--config", default=os.environ.get("WAREHOUSE_SHARDS"))
+    parser.add_argument("--key-layout", choices=init_db.KEY_LAYOUTS, default=init_db.DEFAULT_KEY_LAYOUT)
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    if args.command == "init":
+        for name, db_path in config.shards.items():
+            init_db.init_db(db_path, args.key_layout)
+            print(f"{name}: {db_path}")
+    else:
+        for name, db_path in config.shards.items():
+            marker = " (default)" if name == config.default else ""
+            print(f"{name}{marker}: {db_path}")
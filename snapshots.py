@@ -0,0 +1,232 @@
+"""
+snapshots.py
+
+Pre-built bootstrap snapshots for first-time device sync.
+
+Instead of every newly enrolled device running a full "everything since
+year 0" pull through /sync/jobs, a background job periodically writes one
+consistent snapshot of the sync tables to a gzip-compressed NDJSON file:
+
+  {"type": "header", "server_time": "...", "tombstone_seq": 123, "tables": [...]}
+  {"table": "technicians_cache", "row": {...}}
+  {"table": "inspections", "row": {...}}
+  ...
+
+plus a manifest (latest.json) with the same watermark, the file's size,
+sha256 and per-table row counts. Rows are in FK order (technicians ->
+inspections -> tasks -> attachments), in the same shape /sync/jobs sends.
+
+A new device downloads the file (GET /sync/snapshot/<file>, Range
+requests supported so it can resume), loads it, then switches to normal
+delta sync with last_sync_at = server_time and last_tombstone_seq =
+tombstone_seq from the header.
+
+Every process may run a SnapshotBuilder; a lock file makes sure only one
+of them builds at a time, and a build is skipped while the latest snapshot
+is younger than the interval. The two most recent snapshots are kept so a
+download in progress survives the next build. The builder only runs on a
+database in WAL mode: otherwise its long read transaction would block
+writers (init_db.py creates databases in WAL mode).
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Sequence
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: builds are not coordinated across processes
+    fcntl = None
+
+import uuid_keys
+
+MANIFEST_NAME = "latest.json"
+KEEP_SNAPSHOTS = 2
+
+RowTransform = Callable[[str, Dict[str, Any]], Dict[str, Any]]
+
+
+def _log(message: str) -> None:
+    print(f"[snapshots {os.getpid()}] {message}", file=sys.stderr, flush=True)
+
+
+def read_manifest(out_dir: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def build_snapshot(
+    db_path: str,
+    out_dir: str,
+    columns: Dict[str, str],
+    tables: Sequence[str],
+    transform: Optional[RowTransform] = None,
+) -> Dict[str, Any]:
+    """
+    Write one snapshot of `tables` (selecting `columns[table]`) and make it
+    the latest. All reads happen in a single read transaction, so the rows,
+    server_time and tombstone_seq are consistent with each other (under WAL
+    this does not block writers).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    connection = sqlite3.connect(db_path, isolation_level=None)
+    connection.row_factory = sqlite3.Row
+    counts: Dict[str, int] = {}
+    try:
+        connection.execute("BEGIN")
+        # a second early: updated_at has second resolution and pulls compare
+        # strictly, so a write in the same second is re-sent rather than lost
+        server_time, tombstone_seq = connection.execute(
+            """
+            SELECT strftime('%Y-%m-%dT%H:%M:%SZ', 'now', '-1 seconds'),
+                   IFNULL((SELECT seq FROM sqlite_sequence WHERE name = 'tombstones'), 0)
+            """
+        ).fetchone()
+
+        name = f"snapshot-{int(time.time() * 1000)}.ndjson.gz"
+        tmp_path = os.path.join(out_dir, f".{name}.tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as out:
+            header = {
+                "type": "header",
+                "server_time": server_time,
+                "tombstone_seq": tombstone_seq,
+                "tables": list(tables),
+            }
+            out.write(json.dumps(header) + "\n")
+            for table in tables:
+                counts[table] = 0
+                cursor = connection.execute(f"SELECT {columns[table]} FROM {table}")
+                for row in cursor:
+                    item = uuid_keys.decode_row(dict(row))
+                    if transform:
+                        item = transform(table, item)
+                    out.write(json.dumps({"table": table, "row": item}, default=str) + "\n")
+                    counts[table] += 1
+        connection.execute("COMMIT")
+    finally:
+        connection.close()
+
+    sha256 = hashlib.sha256()
+    with open(tmp_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(chunk)
+
+    path = os.path.join(out_dir, name)
+    os.replace(tmp_path, path)
+    manifest = {
+        "file": name,
+        "server_time": server_time,
+        "tombstone_seq": tombstone_seq,
+        "rows": counts,
+        "size_bytes": os.path.getsize(path),
+        "sha256": sha256.hexdigest(),
+        "created_at": datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z"),
+    }
+    manifest_tmp = os.path.join(out_dir, f".{MANIFEST_NAME}.tmp")
+    with open(manifest_tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(manifest_tmp, os.path.join(out_dir, MANIFEST_NAME))
+
+    _prune(out_dir)
+    return manifest
+
+
+def _prune(out_dir: str) -> None:
+    snapshots = sorted(
+        f for f in os.listdir(out_dir) if f.startswith("snapshot-") and f.endswith(".ndjson.gz")
+    )
+    for name in snapshots[:-KEEP_SNAPSHOTS]:
+        try:
+            os.remove(os.path.join(out_dir, name))
+        except OSError:
+            pass
+
+
+def _is_wal(db_path: str) -> bool:
+    connection = sqlite3.connect(db_path)
+    try:
+        return connection.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal"
+    finally:
+        connection.close()
+
+
+class SnapshotBuilder:
+    """Background thread that keeps the latest snapshot at most `interval_s` old."""
+
+    def __init__(
+        self,
+        db_path: str,
+        out_dir: str,
+        columns: Dict[str, str],
+        tables: Sequence[str],
+        interval_s: float,
+        transform: Optional[RowTransform] = None,
+    ):
+        self.db_path = db_path
+        self.out_dir = out_dir
+        self.columns = columns
+        self.tables = tables
+        self.interval_s = interval_s
+        self.transform = transform
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._warned_not_wal = False
+
+    def ensure_started(self) -> None:
+        """Start the thread in this process (again after a fork)."""
+        if self.interval_s <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name="snapshot-builder", daemon=True).start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.build_if_due()
+            except Exception as e:
+                _log(f"snapshot build failed: {e!r}")
+            time.sleep(max(1.0, self.interval_s / 4))
+
+    def build_if_due(self) -> Optional[Dict[str, Any]]:
+        """Build a snapshot unless a fresh one exists or another process is building."""
+        os.makedirs(self.out_dir, exist_ok=True)
+        with open(os.path.join(self.out_dir, ".lock"), "w") as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return None  # another process is building
+            manifest = read_manifest(self.out_dir)
+            if manifest and self._age_s(manifest) < self.interval_s:
+                return None
+            if not _is_wal(self.db_path):
+                # a rollback journal would make writers wait out the whole build
+                if not self._warned_not_wal:
+                    _log("database is not in WAL mode; not building snapshots")
+                    self._warned_not_wal = True
+                return None
+            started = time.monotonic()
+            manifest = build_snapshot(self.db_path, self.out_dir, self.columns, self.tables, self.transform)
+            _log(f"built {manifest['file']} ({manifest['size_bytes']} bytes) in {time.monotonic() - started:.1f}s")
+            return manifest
+
+    @staticmethod
+    def _age_s(manifest: Dict[str, Any]) -> float:
+        try:
+            created = datetime.strptime(manifest["created_at"], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+        except (KeyError, ValueError):
+            return float("inf")
+        return (datetime.now(timezone.utc) - created).total_seconds()
@@ -0,0 +1,264 @@
+"""
+stream_ingest.py
+
+Bounded-memory ingestion of large /sync/jobs pushes.
+
+Instead of decoding the whole body, the `changes` arrays are parsed one
+row at a time straight off the request stream and handed to the apply
+engine in fixed-size batches, so memory is bounded by the batch size (and
+the largest single row), not by the size of the push. All other top-level
+fields (last_sync_at, device_id, ...) are collected and returned.
+
+Rows are applied in body order, so clients should send the tables in FK
+order (technicians -> inspections -> tasks -> attachments): a row pushed
+ahead of its parent comes back as a conflict, as it would if pushed in a
+separate request.
+
+Batches are committed as they are applied. A body that turns out to be
+invalid part-way raises StreamIngestError with the rows before the error
+already written; the caller reports what was applied, and the whole push
+is safe to retry.
+
+Works for JSON and (with the optional msgpack package) msgpack bodies.
+A columnar block (see wire_format.py) is read as one element, so clients
+pushing large columnar bodies should split them into several blocks.
+"""
+
+import codecs
+import json
+from typing import Any, Callable, Dict, IO, Iterator, List, Optional, Sequence, Tuple
+
+import wire_format
+
+CHUNK_SIZE = 64 * 1024
+MAX_ROW_BYTES = 4 * 1024 * 1024   # largest single array element we will buffer
+
+
+class StreamIngestError(ValueError):
+    """Body could not be ingested; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class _CountingReader:
+    """File-like wrapper that enforces a maximum body size."""
+
+    def __init__(self, stream: IO[bytes], max_bytes: int):
+        self.stream = stream
+        self.max_bytes = max_bytes
+        self.total = 0
+
+    def read(self, size: int = CHUNK_SIZE) -> bytes:
+        data = self.stream.read(size)
+        self.total += len(data)
+        if self.max_bytes and self.total > self.max_bytes:
+            raise StreamIngestError(f"request body exceeds {self.max_bytes} bytes", 413)
+        return data
+
+
+# ----------------------------
+# JSON events
+# ----------------------------
+
+_WS = " \t\r\n"
+
+
+class _JsonStream:
+    def __init__(self, reader: _CountingReader):
+        self.reader = reader
+        self.decoder = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        data = self.reader.read(CHUNK_SIZE)
+        if not data:
+            self.eof = True
+            self.buf = self.buf[self.pos:] + self.utf8.decode(b"", final=True)
+        else:
+            self.buf = self.buf[self.pos:] + self.utf8.decode(data)
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character ('' at end of input)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WS:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        ch = self.peek()
+        if not ch or ch not in chars:
+            raise StreamIngestError(f"invalid JSON body: expected one of {chars!r}")
+        self.pos += 1
+        return ch
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # a number (or literal) at the very end of the buffer may continue
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise StreamIngestError("invalid JSON body")
+            if len(self.buf) - self.pos > MAX_ROW_BYTES:
+                raise StreamIngestError(f"a single element exceeds {MAX_ROW_BYTES} bytes", 413)
+            self._fill()
+
+
+def _json_events(reader: _CountingReader) -> Iterator[Tuple[str, str, Any]]:
+    """
+    Yields ("field", key, value) for top-level fields and
+    ("row", table, row_or_block) for each element of changes.<table>.
+    """
+    js = _JsonStream(reader)
+    if js.peek() == "":
+        return  # empty body, same as {}
+    js.expect("{")
+    if js.peek() == "}":
+        return
+    while True:
+        key = js.value()
+        js.expect(":")
+        if key == "changes" and js.peek() == "{":
+            js.expect("{")
+            if js.peek() != "}":
+                while True:
+                    table = js.value()
+                    js.expect(":")
+                    if js.peek() == "[":
+                        js.expect("[")
+                        if js.peek() != "]":
+                            while True:
+                                yield ("row", table, js.value())
+                                if js.expect(",]") == "]":
+                                    break
+                        else:
+                            js.expect("]")
+                    else:
+                        yield ("row", table, js.value())
+                    if js.expect(",}") == "}":
+                        break
+            else:
+                js.expect("}")
+        else:
+            yield ("field", key, js.value())
+        if js.expect(",}") == "}":
+            return
+
+
+# ----------------------------
+# msgpack events
+# ----------------------------
+
+def _msgpack_events(reader: _CountingReader) -> Iterator[Tuple[str, str, Any]]:
+    msgpack = wire_format.msgpack
+    if msgpack is None:
+        raise StreamIngestError("msgpack is not supported by this server", 415)
+
+    unpacker = msgpack.Unpacker(reader, raw=False, max_buffer_size=MAX_ROW_BYTES)
+
+    def _value() -> Any:
+        value = unpacker.unpack()
+        if wire_format.has_binary(value):
+            raise StreamIngestError(wire_format.BINARY_VALUE_ERROR)
+        return value
+
+    try:
+        for _ in range(unpacker.read_map_header()):
+            key = unpacker.unpack()
+            if key != "changes":
+                yield ("field", key, _value())
+                continue
+            for _ in range(unpacker.read_map_header()):
+                table = unpacker.unpack()
+                try:
+                    count = unpacker.read_array_header()
+                except (ValueError, msgpack.UnpackException):
+                    yield ("row", table, _value())
+                    continue
+                for _ in range(count):
+                    yield ("row", table, _value())
+    except msgpack.OutOfData:
+        raise StreamIngestError("truncated msgpack body")
+    except (ValueError, msgpack.UnpackException) as e:
+        if isinstance(e, StreamIngestError):
+            raise
+        raise StreamIngestError("invalid msgpack body")
+
+
+# ----------------------------
+# Driver
+# ----------------------------
+
+def _rows_of(element: Any) -> List[Dict[str, Any]]:
+    if isinstance(element, dict) and "columns" in element and "rows" in element:
+        try:
+            return wire_format.from_columnar([element])
+        except wire_format.WireFormatError as e:
+            raise StreamIngestError(str(e), e.status)
+    return [element if isinstance(element, dict) else {}]
+
+
+def ingest(
+    stream: IO[bytes],
+    mimetype: Optional[str],
+    max_bytes: int,
+    table_order: Sequence[str],
+    apply_batch: Callable[[str, List[Dict[str, Any]]], None],
+    batch_size: int = 500,
+    fields: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Parse the body from `stream`, calling apply_batch(table, rows) with at
+    most `batch_size` rows at a time, in body order. Returns the other
+    top-level fields. Tables not in `table_order` are ignored.
+
+    `fields` (if given) is filled in as fields are parsed, so apply_batch
+    can see the ones that come before "changes" in the body.
+    """
+    reader = _CountingReader(stream, max_bytes)
+    events = _msgpack_events(reader) if wire_format.is_msgpack(mimetype) else _json_events(reader)
+
+    if fields is None:
+        fields = {}
+    active: Optional[str] = None               # table whose rows are arriving
+    batch: List[Dict[str, Any]] = []
+
+    def _flush() -> None:
+        nonlocal batch
+        if batch and active is not None:
+            apply_batch(active, batch)
+        batch = []
+
+    for kind, key, value in events:
+        if kind == "field":
+            fields[key] = value
+            continue
+        if key not in table_order:
+            continue
+
+        if key != active:
+            _flush()
+            active = key
+
+        batch.extend(_rows_of(value))
+        if len(batch) >= batch_size:
+            _flush()
+    _flush()
+
+    return fields
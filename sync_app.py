@@ -1,11 +1,28 @@
 from uuid import uuid4
-from datetime import datetime, timezone
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
 from functools import wraps
+import json
+import re
 import sqlite3
 import os
 from typing import Any, Dict, Optional, List, Tuple
 
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, send_from_directory
+
+import admission
+import archive
+import blob_jobs
+import blob_store
+import maintenance
+import replicas
+import row_cache
+import search_index
+import shards
+import snapshots
+import stream_ingest
+import uuid_keys
+import wire_format
 
 
 # ----------------------------
@@ -15,32 +32,200 @@ from flask import Flask, jsonify, request
 API_KEY = "api_warehouse_student_key_1234567890abcdef"
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "warehouse.db")
+DB_PATH = os.environ.get("WAREHOUSE_DB_PATH") or os.path.join(BASE_DIR, "warehouse.db")
+
+# One database per site when WAREHOUSE_SHARDS names a shard config (see
+# shards.py); otherwise the single shard "default" is DB_PATH
+SHARD_CONFIG = shards.load_config(os.environ.get("WAREHOUSE_SHARDS"), DB_PATH)
+# Endpoints that answer without a site (on the default or first shard)
+SHARDLESS_ENDPOINTS = {"health", "fleet_report"}
 
-# Where uploaded files are stored on the server filesystem
+# Where uploaded files are stored on the server filesystem, in fan-out
+# subdirectories (see blob_store.py); per site under sites/<shard> when sharded
 UPLOAD_DIR = os.path.join(BASE_DIR, "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 # (Optional) basic upload size guard (bytes)
 MAX_UPLOAD_BYTES = 25 * 1024 * 1024  # 25MB
 
+# Deletes are kept as tombstones until every device seen within the
+# retention window has acknowledged them; older ones are dropped anyway
+# (a device that comes back later is told to do a full resync).
+TOMBSTONE_RETENTION_DAYS = 30
+TOMBSTONE_PAGE_LIMIT = 5000
+TOMBSTONE_COMPACT_INTERVAL_S = 300
+
+SYNC_TABLES = ("technicians_cache", "inspections", "tasks", "attachments")
+
+# Rows per table per pull (per-table watermarks page through the rest)
+SYNC_PAGE_LIMIT = 5000
+
+# /sync/jobs bodies: hard size cap, and the size above which (or for chunked
+# bodies without Content-Length) pushes are parsed incrementally and applied
+# in batches instead of being decoded in one go (see stream_ingest.py)
+MAX_SYNC_BODY_BYTES = 256 * 1024 * 1024
+STREAM_SYNC_THRESHOLD_BYTES = 1 * 1024 * 1024
+SYNC_APPLY_BATCH_SIZE = 500
+
+# Admission control for /sync/* and /attachments/upload (per process, see
+# admission.py): concurrent requests, how many may wait and for how long,
+# and the token-bucket rate per API key
+SYNC_MAX_ACTIVE = 4
+SYNC_MAX_QUEUE = 16
+SYNC_QUEUE_TIMEOUT_S = 5.0
+RATE_LIMIT_PER_S = 50.0
+RATE_LIMIT_BURST = 100
+
+# Worker threads per process and shard for post-upload blob processing (blob_jobs.py)
+BLOB_WORKERS = 2
+
+# Background checkpoint/optimize/vacuum/quick_check (see maintenance.py);
+# runs in one worker at a time and waits while requests queue up
+MAINTENANCE_ENABLED = True
+
+# In-process cache for technician rows and /sync/technicians pulls (see row_cache.py)
+ROW_CACHE_MAX_ENTRIES = 4096
+
+# Archived (completed, older) inspections, moved out by archive.py (shards
+# use archive.default_archive_path of their own database)
+ARCHIVE_DB_PATH = os.environ.get("WAREHOUSE_ARCHIVE_DB_PATH") or str(archive.default_archive_path(DB_PATH))
+
+# Bootstrap snapshots for first-time sync (see snapshots.py): rebuilt in the
+# background once the latest is older than this; 0 disables the builder.
+# Per site under SNAPSHOT_DIR/<shard> when sharded
+SNAPSHOT_DIR = os.path.join(BASE_DIR, "snapshots")
+SNAPSHOT_INTERVAL_S = 15 * 60
+
+# Read replicas for pull-only requests (see replicas.py): each shard is
+# copied every READ_REPLICA_INTERVAL_S, and a copy is read from while at
+# most READ_REPLICA_MAX_STALENESS_S old. Off unless WAREHOUSE_READ_REPLICA=1
+READ_REPLICA_ENABLED = os.environ.get("WAREHOUSE_READ_REPLICA") == "1"
+READ_REPLICA_INTERVAL_S = 30
+READ_REPLICA_MAX_STALENESS_S = 120
+
 
 app = Flask(__name__)
 
+# Per-process start time, reported by /health (one entry per prefork worker)
+PROCESS_STARTED_AT = datetime.now(timezone.utc)
+
+sync_limiter = admission.ConcurrencyLimiter(SYNC_MAX_ACTIVE, SYNC_MAX_QUEUE, SYNC_QUEUE_TIMEOUT_S)
+rate_limiter = admission.RateLimiter(RATE_LIMIT_PER_S, RATE_LIMIT_BURST)
+
+
+def _under_load() -> bool:
+    return sync_limiter.active >= SYNC_MAX_ACTIVE or sync_limiter.queued > 0
+
+
+class ShardServices:
+    """Everything kept per database file: connections, cache, background jobs."""
+
+    def __init__(self, name: str, db_path: str):
+        sharded = SHARD_CONFIG.is_sharded
+        self.name = name
+        self.db_path = db_path
+        self.upload_dir = os.path.join(UPLOAD_DIR, "sites", name) if sharded else UPLOAD_DIR
+        self.snapshot_dir = os.path.join(SNAPSHOT_DIR, name) if sharded else SNAPSHOT_DIR
+        self.archive_path = str(archive.default_archive_path(db_path)) if sharded else ARCHIVE_DB_PATH
+        self.pool = shards.ConnectionPool(db_path)
+        self.lookup_cache = row_cache.RowCache(db_path, ROW_CACHE_MAX_ENTRIES)
+        self.maintenance = maintenance.MaintenanceScheduler(db_path, _under_load, MAINTENANCE_ENABLED)
+        self.blob_workers = blob_jobs.BlobWorkerPool(db_path, self.upload_dir, BLOB_WORKERS, _under_load)
+        self.snapshot_builder = snapshots.SnapshotBuilder(
+            db_path, self.snapshot_dir, SYNC_COLUMNS, SYNC_TABLES, SNAPSHOT_INTERVAL_S, _snapshot_row
+        )
+        self.read_replica = replicas.ReadReplica(
+            db_path, READ_REPLICA_INTERVAL_S, READ_REPLICA_MAX_STALENESS_S, READ_REPLICA_ENABLED
+        )
+        self.last_tombstone_compaction = 0.0
+
+    def ensure_started(self) -> None:
+        self.snapshot_builder.ensure_started()
+        self.read_replica.ensure_started()
+        self.maintenance.ensure_started()
+        self.blob_workers.ensure_started()
+
+
+# shard name -> its services, created on first use
+_shard_services: Dict[str, ShardServices] = {}
+
+
+def shard_services(name: Optional[str] = None) -> ShardServices:
+    """Services of shard `name`, by default the one this request was routed to."""
+    name = name or shards.current.get()
+    services = _shard_services.get(name)
+    if services is None:
+        services = _shard_services.setdefault(name, ShardServices(name, SHARD_CONFIG.shards[name]))
+    return services
+
 
 # ----------------------------
 # DB helpers
 # ----------------------------
 
 def get_connection() -> sqlite3.Connection:
-    connection = sqlite3.connect(DB_PATH, isolation_level=None)  # autocommit
-    connection.execute("PRAGMA foreign_keys = ON")
-    connection.row_factory = sqlite3.Row
-    return connection
+    """Autocommit connection to the current shard, back to its pool after `with`."""
+    return shard_services().pool.acquire()
+
+
+# Replica this request's pull reads go to (None: the primary), set by _use_read_replica
+_read_view: ContextVar[Optional[replicas.ReplicaView]] = ContextVar("read_view", default=None)
+
+
+def get_read_connection() -> sqlite3.Connection:
+    """Connection for pull reads: the read replica if this request uses one, else the primary."""
+    view = _read_view.get()
+    return view.pool.acquire() if view is not None else get_connection()
+
+
+def _use_read_replica(*seen: Optional[str]) -> Optional[str]:
+    """
+    Send this request's pull reads to the shard's read replica if it may
+    answer them: it is fresh enough, the client did not ask for the primary
+    (X-Read-Consistency: primary), and it is not older than any of the
+    `seen` watermarks the client holds, so a client never reads from before
+    what it has already seen (its own pushes included). Returns the
+    replica's as_of, to hand out as server_time, or None for the primary.
+    """
+    replica = shard_services().read_replica
+    view = replica.current()
+    if view is not None and request.headers.get("X-Read-Consistency", "").lower() == "primary":
+        view = None
+    for since_ts in seen:
+        if view is not None and since_ts:
+            since_ms = _iso_to_epoch_ms(since_ts)
+            if since_ms is None or since_ms > view.as_of_ms:
+                view = None
+    replica.count_read("primary" if view is None else "replica")
+    _read_view.set(view)
+    return view.as_of if view is not None else None
 
 
 def row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
-    return dict(row)
+    return uuid_keys.decode_row(dict(row))
+
+
+# DB path -> True if that database uses the compact (BLOB) key layout
+_compact_keys_by_db: Dict[str, bool] = {}
+
+
+def _compact_keys() -> bool:
+    db_path = shard_services().db_path
+    compact = _compact_keys_by_db.get(db_path)
+    if compact is None:
+        with get_connection() as connection:
+            compact = uuid_keys.detect_layout(connection) == "compact"
+        _compact_keys_by_db[db_path] = compact
+    return compact
+
+
+def _db_id(value: Any) -> Any:
+    """Key as stored: 16-byte BLOB in the compact layout, TEXT otherwise."""
+    return uuid_keys.to_blob(value) if _compact_keys() else value
+
+
+def _is_known_key(key: str) -> bool:
+    return bool(key) and (key == API_KEY or key in SHARD_CONFIG.api_keys)
 
 
 def require_api_key(func):
@@ -51,29 +236,76 @@ def require_api_key(func):
         bearer_key = ""
         if auth_header.lower().startswith("bearer "):
             bearer_key = auth_header.split(" ", 1)[1].strip()
-        if header_key != API_KEY and bearer_key != API_KEY:
+        if not _is_known_key(header_key) and not _is_known_key(bearer_key):
             return jsonify({"error": "Unauthorized"}), 401
         return func(*args, **kwargs)
     return wrapper
 
 
-def _parse_ts(ts: Optional[str]) -> datetime:
-    """
-    Parse timestamps that may look like:
-      - '2026-01-20T12:34:56'
-      - '2026-01-20 12:34:56'  (SQLite CURRENT_TIMESTAMP)
-      - '2026-01-20T12:34:56Z'
-    If parsing fails, return datetime.min (treat as very old).
-    """
-    if not ts or not isinstance(ts, str):
-        return datetime.min
-    s = ts.strip().replace("Z", "")
-    if " " in s and "T" not in s:
-        s = s.replace(" ", "T", 1)
+def _request_api_key() -> str:
+    auth_header = request.headers.get("Authorization", "")
+    if auth_header.lower().startswith("bearer "):
+        return auth_header.split(" ", 1)[1].strip()
+    return request.headers.get("X-API-Key", "")
+
+
+@app.before_request
+def _route_to_shard():
+    """Pick this request's database (see shards.py)."""
+    site = request.headers.get("X-Site") or request.args.get("site")
     try:
-        return datetime.fromisoformat(s)
-    except ValueError:
-        return datetime.min
+        name = SHARD_CONFIG.resolve(site, _request_api_key())
+    except shards.ShardError as e:
+        # unknown keys get their 401 from require_api_key, not a 400 here
+        if request.endpoint not in SHARDLESS_ENDPOINTS and _is_known_key(_request_api_key()):
+            return jsonify({"error": str(e)}), 400
+        name = SHARD_CONFIG.default or next(iter(SHARD_CONFIG.shards))
+    shards.current.set(name)
+    _read_view.set(None)
+
+
+def admission_controlled(func):
+    """Rate limit per API key, then wait for a slot in sync_limiter (use after require_api_key)."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            rate_limiter.take(_request_api_key())
+            started = sync_limiter.acquire()
+        except admission.AdmissionRejected as e:
+            response = jsonify({"error": str(e), "retry_after_s": e.retry_after})
+            response.headers["Retry-After"] = str(e.retry_after)
+            return response, e.status
+        try:
+            return func(*args, **kwargs)
+        finally:
+            sync_limiter.release(started)
+    return wrapper
+
+
+# ISO / SQLite timestamp -> epoch milliseconds, evaluated by SQLite.
+# Same expression as the *_ms generated columns, so client timestamps compare
+# directly against them. Accepts '2026-01-20T12:34:56', '2026-01-20 12:34:56'
+# (CURRENT_TIMESTAMP), a 'Z' or '+01:00' suffix and fractional seconds;
+# anything unparseable gives NULL.
+_EPOCH_MS_SQL = "CAST(ROUND((julianday({}) - 2440587.5) * 86400000) AS INTEGER)"
+
+# Columns returned to clients (the *_ms shadow columns stay server-side)
+SYNC_COLUMNS = {
+    "technicians_cache": "id, username, display_name, role, created_at, updated_at, sync_status",
+    "inspections": (
+        "id, aircraft_id, status, opened_at, completed_at, technician_id, "
+        "created_at, updated_at, sync_status"
+    ),
+    "tasks": (
+        "id, inspection_id, title, description, is_complete, result, notes, completed_at, "
+        "created_at, updated_at, sync_status"
+    ),
+    "attachments": (
+        "id, task_id, file_name, mime_type, size_bytes, sha256, remote_key, "
+        "processing_status, content_sha256, sha256_verified, image_width, image_height, preview_key, "
+        "created_at, updated_at, sync_status"
+    ),
+}
 
 
 def _now_iso() -> str:
@@ -85,45 +317,645 @@ def _now_iso() -> str:
     )
 
 
-def _fetch_row_by_id(table: str, row_id: str) -> Optional[Dict[str, Any]]:
+# Tables whose rows _fetch_server_row serves from the shard's lookup_cache
+CACHED_TABLES = ("technicians_cache",)
+
+# Timestamps _iso_to_epoch_ms handles: the forms _EPOCH_MS_SQL parses
+_ISO_TIMESTAMP_RE = re.compile(
+    r"\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?(Z|[+-]\d{2}:\d{2})?"
+)
+
+
+def _iso_to_epoch_ms(value: Optional[str]) -> Optional[int]:
+    """
+    _EPOCH_MS_SQL in Python, for the common timestamp forms; None for
+    anything else (callers then let SQLite decide).
+    """
+    if not value or not _ISO_TIMESTAMP_RE.fullmatch(value):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return round(parsed.timestamp() * 1000)
+
+
+def _load_row(table: str, row_id: str) -> Optional[Dict[str, Any]]:
     with get_connection() as connection:
-        row = connection.execute(
-            f"SELECT * FROM {table} WHERE id = ?",
-            (row_id,),
-        ).fetchone()
+        row = connection.execute(f"SELECT * FROM {table} WHERE id = ?", (_db_id(row_id),)).fetchone()
     return row_to_dict(row) if row else None
 
 
-def _fetch_updated_since(table: str, since_ts: Optional[str], limit: int = 5000) -> List[Dict[str, Any]]:
+def _fetch_server_row(
+    table: str, row_id: str, client_updated_at: Any
+) -> Tuple[Optional[Dict[str, Any]], bool]:
     """
-    Return rows updated after `since_ts`.
-    If since_ts is missing/None, treat as first sync and return ALL rows (up to limit).
+    Fetch the server row for an incoming change and decide, in the same query,
+    whether the server copy is newer than the client's updated_at.
+
+    Returns (server_row_or_None, server_is_newer). An unparseable client
+    timestamp counts as very old; an unparseable server one never wins.
     """
-    since = since_ts or "0000-01-01T00:00:00"
+    if not isinstance(client_updated_at, str):
+        client_updated_at = None
+
+    if table in CACHED_TABLES:
+        client_ms = _iso_to_epoch_ms(client_updated_at)
+        if client_ms is not None or client_updated_at is None:
+            server = shard_services().lookup_cache.get(table, row_id, lambda: _load_row(table, row_id))
+            if not server:
+                return None, False
+            server_ms = server.get("updated_at_ms")
+            if server_ms is None:
+                return server, False
+            return server, client_ms is None or server_ms > client_ms
+
     with get_connection() as connection:
+        row = connection.execute(
+            f"""
+            SELECT *, {_EPOCH_MS_SQL.format("?")} AS _client_updated_at_ms
+            FROM {table}
+            WHERE id = ?
+            """,
+            (client_updated_at, _db_id(row_id)),
+        ).fetchone()
+    if not row:
+        return None, False
+
+    server = row_to_dict(row)
+    client_ms = server.pop("_client_updated_at_ms")
+    server_ms = server.get("updated_at_ms")
+    if server_ms is None:
+        return server, False
+    return server, client_ms is None or server_ms > client_ms
+
+
+INSPECTION_STATUSES = ("outstanding", "in_progress", "completed")
+
+
+def _parse_scope(value: Any) -> Optional[Dict[str, Any]]:
+    """
+    Validate a /sync/jobs "scope": {"status": [...], "technician_id": "..."}.
+    Returns None for no scope; raises ValueError for a malformed one.
+    """
+    if not value:
+        return None
+    if not isinstance(value, dict):
+        raise ValueError("scope must be an object")
+    statuses = value.get("status")
+    if isinstance(statuses, str):
+        statuses = [statuses]
+    if statuses is not None and (
+        not isinstance(statuses, list) or not statuses
+        or any(s not in INSPECTION_STATUSES for s in statuses)
+    ):
+        raise ValueError(f"scope.status must be a list of {list(INSPECTION_STATUSES)}")
+    technician_id = value.get("technician_id")
+    if technician_id is not None and not isinstance(technician_id, str):
+        raise ValueError("scope.technician_id must be a string")
+    if not statuses and not technician_id:
+        return None
+    return {"status": statuses, "technician_id": technician_id}
+
+
+def _parse_tables(value: Any) -> Tuple[str, ...]:
+    """/sync/jobs "tables": which tables to pull (default all), in FK order."""
+    if value is None:
+        return SYNC_TABLES
+    if not isinstance(value, list) or any(t not in SYNC_TABLES for t in value):
+        raise ValueError(f"tables must be a list of {list(SYNC_TABLES)}")
+    return tuple(t for t in SYNC_TABLES if t in value)
+
+
+def _parse_watermarks(value: Any, tables: Tuple[str, ...] = SYNC_TABLES) -> Dict[str, Dict[str, Any]]:
+    """
+    Validate per-table "watermarks" (as returned by a previous pull):
+      {"<table>": {"last_sync_at": "...", "tombstone_seq": 123, "cursor": {...} | null}}
+    A table without one is pulled from scratch. Raises ValueError.
+    """
+    if value is None:
+        return {}
+    if not isinstance(value, dict) or any(t not in tables for t in value):
+        raise ValueError(f"watermarks must be an object keyed by {list(tables)}")
+    watermarks: Dict[str, Dict[str, Any]] = {}
+    for table, watermark in value.items():
+        if watermark is None:
+            continue
+        if not isinstance(watermark, dict):
+            raise ValueError(f"watermarks.{table} must be an object")
+        try:
+            seq = watermark.get("tombstone_seq")
+            cursor = watermark.get("cursor")
+            watermarks[table] = {
+                "last_sync_at": watermark.get("last_sync_at") or None,
+                "tombstone_seq": int(seq) if seq is not None else None,
+                "cursor": {
+                    "updated_at_ms": int(cursor["updated_at_ms"]),
+                    "id": cursor["id"],
+                    "sync_at": str(cursor["sync_at"]),
+                } if cursor else None,
+            }
+        except (TypeError, ValueError, KeyError):
+            raise ValueError(f"watermarks.{table} is malformed; send it back as received")
+    return watermarks
+
+
+def _watermark_times(watermark: Optional[Dict[str, Any]]) -> List[Optional[str]]:
+    """Points in time a parsed watermark says the client has seen (for _use_read_replica)."""
+    if not watermark:
+        return []
+    cursor = watermark["cursor"]
+    return [watermark["last_sync_at"], cursor["sync_at"] if cursor else None]
+
+
+def _updated_since_sql(
+    table: str, since_ts: Optional[str], scope: Optional[Dict[str, Any]]
+) -> Tuple[str, List[Any]]:
+    """
+    WHERE clause for _fetch_updated_since: rows changed after since_ts and,
+    with a scope, only inspections in it (by status and/or technician) and
+    their tasks and attachments.
+
+    On incremental pulls, changed inspections are sent whatever the scope
+    (so a client sees one leave it), and all tasks/attachments of an
+    in-scope inspection that changed are sent (so one that enters the
+    scope, e.g. on reassignment, arrives complete).
+    """
+    changed = f"updated_at_ms > {_EPOCH_MS_SQL.format('?')}"
+    if not scope or table == "technicians_cache" or (table == "inspections" and since_ts):
+        return (f"WHERE {changed}", [since_ts]) if since_ts else ("", [])
+
+    conditions: List[str] = []
+    values: List[Any] = []
+    if scope["status"]:
+        conditions.append(f"i.status IN ({','.join('?' for _ in scope['status'])})")
+        values.extend(scope["status"])
+    if scope["technician_id"]:
+        conditions.append("i.technician_id = ?")
+        values.append(_db_id(scope["technician_id"]))
+    in_scope = " AND ".join(conditions)
+
+    if table == "inspections":
+        key = "id"
+        parents = "SELECT i.id FROM inspections i WHERE {}"
+    elif table == "tasks":
+        key = "inspection_id"
+        parents = "SELECT i.id FROM inspections i WHERE {}"
+    else:
+        key = "task_id"
+        parents = "SELECT t.id FROM tasks t JOIN inspections i ON i.id = t.inspection_id WHERE {}"
+
+    scoped = f"{key} IN ({parents.format(in_scope)})"
+    if not since_ts:
+        return f"WHERE {scoped}", values
+
+    parent_changed = f"{in_scope} AND i.{changed}"
+    return (
+        f"WHERE ({changed} AND {scoped}) OR {key} IN ({parents.format(parent_changed)})",
+        [since_ts, *values, *values, since_ts],
+    )
+
+
+def _fetch_page(
+    table: str,
+    since_ts: Optional[str],
+    limit: int = SYNC_PAGE_LIMIT,
+    scope: Optional[Dict[str, Any]] = None,
+    after: Optional[Tuple[int, Any]] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """
+    One page of rows updated after `since_ts` (see _fetch_updated_since), in
+    (updated_at_ms, id) order, starting after the `after` position.
+    Returns (rows, position of the last row) -- the position is None when
+    this was the last page.
+    """
+    limit = max(1, limit)
+    where_sql, values = _updated_since_sql(table, since_ts, scope)
+    if after is not None:
+        position = "(updated_at_ms, id) > (?, ?)"
+        where_sql = (
+            f"WHERE ({where_sql.removeprefix('WHERE ')}) AND {position}" if where_sql else f"WHERE {position}"
+        )
+        values = [*values, *after]
+
+    with get_read_connection() as connection:
         rows = connection.execute(
             f"""
-            SELECT *
+            SELECT {SYNC_COLUMNS[table]}, updated_at_ms AS _page_ms
             FROM {table}
-            WHERE updated_at > ?
-            ORDER BY updated_at ASC
+            {where_sql}
+            ORDER BY updated_at_ms ASC, id ASC
+            LIMIT ?
+            """,
+            (*values, limit + 1),
+        ).fetchall()
+
+    page = [row_to_dict(r) for r in rows[:limit]]
+    for r in page:
+        del r["_page_ms"]
+    if len(rows) <= limit:
+        return page, None
+    return page, {"updated_at_ms": rows[limit - 1]["_page_ms"], "id": page[-1]["id"]}
+
+
+def _fetch_updated_since(
+    table: str,
+    since_ts: Optional[str],
+    limit: int = SYNC_PAGE_LIMIT,
+    scope: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Return rows updated after `since_ts`, limited to `scope` (see
+    _parse_scope) if given. If since_ts is missing/None, treat as first
+    sync and return ALL rows (up to limit).
+    """
+    return _fetch_page(table, since_ts, limit, scope)[0]
+
+
+def _pull_table(
+    table: str,
+    watermark: Optional[Dict[str, Any]],
+    server_time: str,
+    limit: int,
+    scope: Optional[Dict[str, Any]] = None,
+    delta_pull: bool = False,
+) -> Tuple[List[Dict[str, Any]], List[str], Dict[str, Any]]:
+    """
+    Pull one table against its own watermark (see _parse_watermarks).
+    Returns (rows, deleted ids, new watermark).
+
+    A pull that hits `limit` returns a watermark with a cursor and
+    has_more: the filter (last_sync_at) stays the same while the cursor
+    walks through the rows in (updated_at_ms, id) order, and once the last
+    page is out last_sync_at moves to the server_time of the first page,
+    so nothing changed while paging is missed. resync_required means deletes
+    for this table were compacted away: drop the table locally and pull it
+    again without a watermark.
+    """
+    watermark = watermark or {}
+    since_ts = watermark.get("last_sync_at")
+    cursor = watermark.get("cursor")
+    tombstone_seq = watermark.get("tombstone_seq")
+    sync_at = cursor["sync_at"] if cursor else server_time
+
+    resync_required = False
+    more_deletes = False
+    if tombstone_seq is None:
+        # first pull of this table: deletes up to now don't concern it.
+        # Read before pulling so none slip between.
+        deleted: List[str] = []
+        tombstone_seq = _current_tombstone_seq()
+    else:
+        resync_required = tombstone_seq < _tombstones_compacted_through()
+        deleted_by_table, tombstone_seq = _fetch_tombstones(tombstone_seq, (table,))
+        deleted = deleted_by_table[table]
+        more_deletes = tombstone_seq < _current_tombstone_seq()
+
+    after = (cursor["updated_at_ms"], _db_id(cursor["id"])) if cursor else None
+    rows, position = _fetch_page(table, since_ts, limit, scope, after)
+    if delta_pull:
+        rows = _delta_rows(table, rows, since_ts)
+
+    if position is not None:
+        new_watermark = {"last_sync_at": since_ts, "cursor": {**position, "sync_at": sync_at}}
+    else:
+        new_watermark = {"last_sync_at": sync_at, "cursor": None}
+    new_watermark.update(
+        {
+            "tombstone_seq": tombstone_seq,
+            "has_more": position is not None or more_deletes,
+            "resync_required": resync_required,
+        }
+    )
+    return rows, deleted, new_watermark
+
+
+# Client-writable columns per table. Patch pushes may only touch these, and
+# schema.sql keeps per-column change markers (column_changes) for them.
+PATCH_COLUMNS = {
+    "technicians_cache": ("username", "display_name", "role"),
+    "inspections": ("aircraft_id", "opened_at", "completed_at", "technician_id"),
+    "tasks": (
+        "inspection_id", "title", "description", "is_complete", "result", "notes", "completed_at",
+    ),
+    "attachments": ("task_id", "file_name", "mime_type", "size_bytes", "sha256", "remote_key"),
+}
+
+# Key columns that hold UUIDs (converted for the compact key layout)
+_ID_VALUE_COLUMNS = ("technician_id", "inspection_id", "task_id")
+
+
+def _apply_patch(table: str, row_id: str, incoming: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    Field-level push: `incoming` carries only the changed columns plus
+    base_updated_at (the server updated_at the client last saw).
+
+      - server unchanged since base          -> apply the fields
+      - server changed, but other columns    -> merge (apply the fields)
+      - server changed one of these columns  -> conflict
+      - no server row                        -> skipped (push the full row)
+
+    Only the patched columns are written.
+    """
+    fields = {k: incoming[k] for k in PATCH_COLUMNS[table] if k in incoming}
+    if not fields:
+        return ("skipped", row_id)
+
+    server, server_is_newer = _fetch_server_row(table, row_id, incoming.get("base_updated_at"))
+    if not server:
+        return ("skipped", row_id)
+
+    if server_is_newer:
+        placeholders = ",".join("?" for _ in fields)
+        with get_connection() as connection:
+            base_ms, tracking_since_ms = connection.execute(
+                f"""
+                SELECT {_EPOCH_MS_SQL.format("?")},
+                       (SELECT value FROM sync_meta WHERE key = 'column_changes_since_ms')
+                """,
+                (incoming.get("base_updated_at"),),
+            ).fetchone()
+            # no usable base, or a base older than the markers: can't merge safely
+            overlap = base_ms is None or tracking_since_ms is None or base_ms < tracking_since_ms
+            if not overlap:
+                overlap = connection.execute(
+                    f"""
+                    SELECT 1
+                    FROM column_changes
+                    WHERE table_name = ?
+                      AND row_id = ?
+                      AND column_name IN ({placeholders})
+                      AND changed_at_ms > ?
+                    LIMIT 1
+                    """,
+                    (table, _db_id(row_id), *fields, base_ms),
+                ).fetchone() is not None
+        if overlap:
+            return ("conflict", row_id)
+        # merged on top of a newer server row: this is a new version
+        updated_at = _next_updated_at(server)
+    else:
+        # keep the client's updated_at only if it moves the row forward;
+        # an older one would hide the patch from devices that already pulled
+        client_updated_at = incoming.get("updated_at")
+        client_ms = _iso_to_epoch_ms(client_updated_at) if isinstance(client_updated_at, str) else None
+        server_ms = server.get("updated_at_ms")
+        if client_ms is not None and (server_ms is None or client_ms > server_ms):
+            updated_at = client_updated_at
+        else:
+            updated_at = _next_updated_at(server)
+
+    try:
+        _write_fields(table, row_id, fields, updated_at)
+    except sqlite3.IntegrityError:
+        return ("conflict", row_id)
+    return ("updated", row_id)
+
+
+def _next_updated_at(server: Dict[str, Any]) -> str:
+    """updated_at for a new server-made version; never sorts before `server`."""
+    updated_at = _now_iso()
+    now_ms = int(datetime.now(timezone.utc).replace(microsecond=0).timestamp() * 1000)
+    if (server.get("updated_at_ms") or 0) > now_ms:
+        updated_at = server["updated_at"]
+    return updated_at
+
+
+def _write_fields(table: str, row_id: str, fields: Dict[str, Any], updated_at: str) -> None:
+    """UPDATE only the given PATCH_COLUMNS of a row. Raises sqlite3.IntegrityError."""
+    fields = dict(fields)
+    if "is_complete" in fields:
+        fields["is_complete"] = int(fields["is_complete"] or 0)
+    for column in _ID_VALUE_COLUMNS:
+        if column in fields:
+            fields[column] = _db_id(fields[column])
+
+    updates = [f"{column} = ?" for column in fields]
+    updates += ["updated_at = ?", "sync_status = 'synced'"]
+    with get_connection() as connection:
+        connection.execute(
+            f"UPDATE {table} SET {', '.join(updates)} WHERE id = ?",
+            (*fields.values(), updated_at, _db_id(row_id)),
+        )
+    shard_services().lookup_cache.invalidate(table, row_id)
+
+
+def _delta_rows(table: str, rows: List[Dict[str, Any]], since_ts: Optional[str]) -> List[Dict[str, Any]]:
+    """
+    Field-level pull: for rows that already existed at `since_ts`, keep only
+    the columns changed since then (plus id/updated_at/sync_status) and flag
+    them "partial": true. New rows, and watermarks older than the change
+    markers, get full rows.
+    """
+    if not rows or not since_ts:
+        return rows
+
+    with get_read_connection() as connection:
+        since_ms, tracking_since_ms = connection.execute(
+            f"""
+            SELECT {_EPOCH_MS_SQL.format("?")},
+                   (SELECT value FROM sync_meta WHERE key = 'column_changes_since_ms')
+            """,
+            (since_ts,),
+        ).fetchone()
+        if since_ms is None or tracking_since_ms is None or since_ms < tracking_since_ms:
+            return rows
+
+        ids = [_db_id(r["id"]) for r in rows]
+        placeholders = ",".join("?" for _ in ids)
+        marker_rows = connection.execute(
+            f"""
+            SELECT t.id, t.created_at_ms, c.column_name
+            FROM {table} t
+            LEFT JOIN column_changes c
+                   ON c.table_name = ? AND c.row_id = t.id AND c.changed_at_ms > ?
+            WHERE t.id IN ({placeholders})
+            """,
+            (table, since_ms, *ids),
+        ).fetchall()
+
+    is_new: Dict[Any, bool] = {}
+    changed: Dict[Any, List[str]] = {}
+    for r in marker_rows:
+        key = uuid_keys.from_blob(r["id"])
+        is_new[key] = r["created_at_ms"] is None or r["created_at_ms"] > since_ms
+        if r["column_name"]:
+            changed.setdefault(key, []).append(r["column_name"])
+
+    out = []
+    for row in rows:
+        if is_new.get(row["id"], True):
+            out.append(row)
+            continue
+        delta = {
+            "id": row["id"],
+            "updated_at": row["updated_at"],
+            "sync_status": row["sync_status"],
+            "partial": True,
+        }
+        for column in changed.get(row["id"], []):
+            delta[column] = row[column]
+        if "opened_at" in delta or "completed_at" in delta:
+            delta["status"] = row["status"]  # derived from them
+        if "sha256" in delta or "content_sha256" in delta:
+            delta["sha256_verified"] = row["sha256_verified"]
+        out.append(delta)
+    return out
+
+
+_PROGRESS_COLUMNS = """
+    p.inspection_id, p.total_tasks, p.completed_tasks, p.attachments,
+    strftime('%Y-%m-%dT%H:%M:%SZ', p.last_activity_ms / 1000.0, 'unixepoch') AS last_activity_at
+"""
+
+
+def _progress_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    progress = dict(row)
+    progress["inspection_id"] = uuid_keys.from_blob(progress["inspection_id"])
+    return progress
+
+
+def _fetch_progress(inspection_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """inspection id -> its inspection_progress counters."""
+    if not inspection_ids:
+        return {}
+    placeholders = ",".join("?" for _ in inspection_ids)
+    with get_read_connection() as connection:
+        rows = connection.execute(
+            f"""
+            SELECT {_PROGRESS_COLUMNS}
+            FROM inspection_progress p
+            WHERE p.inspection_id IN ({placeholders})
+            """,
+            [_db_id(i) for i in inspection_ids],
+        ).fetchall()
+    out = {}
+    for r in rows:
+        progress = _progress_to_dict(r)
+        out[progress.pop("inspection_id")] = progress
+    return out
+
+
+def _current_tombstone_seq() -> int:
+    with get_read_connection() as connection:
+        row = connection.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'tombstones'"
+        ).fetchone()
+    return int(row[0]) if row else 0
+
+
+def _tombstones_compacted_through() -> int:
+    with get_read_connection() as connection:
+        row = connection.execute(
+            "SELECT value FROM sync_meta WHERE key = 'tombstones_compacted_through'"
+        ).fetchone()
+    return int(row[0]) if row else 0
+
+
+def _fetch_tombstones(
+    after_seq: int, tables: Tuple[str, ...] = SYNC_TABLES, limit: int = TOMBSTONE_PAGE_LIMIT
+) -> Tuple[Dict[str, List[str]], int]:
+    """
+    Deletes after `after_seq`, grouped by table.
+    Returns ({table: [deleted ids]}, seq to send back next time).
+    """
+    placeholders = ",".join("?" for _ in tables)
+    with get_read_connection() as connection:
+        rows = connection.execute(
+            f"""
+            SELECT seq, table_name, row_id
+            FROM tombstones
+            WHERE seq > ? AND table_name IN ({placeholders})
+            ORDER BY seq ASC
             LIMIT ?
             """,
-            (since, limit),
+            (after_seq, *tables, limit),
         ).fetchall()
-    return [row_to_dict(r) for r in rows]
+
+    deleted: Dict[str, List[str]] = {t: [] for t in tables}
+    for r in rows:
+        deleted[r["table_name"]].append(uuid_keys.from_blob(r["row_id"]))
+
+    if len(rows) < limit:
+        # caught up: skip past compacted/other-table seqs too
+        return deleted, max(after_seq, _current_tombstone_seq())
+    return deleted, rows[-1]["seq"]
 
 
-def _mark_conflict(table: str, row_id: str) -> None:
+def _record_device(device_id: str, acked_tombstone_seq: int) -> None:
+    with get_connection() as connection:
+        connection.execute(
+            """
+            INSERT INTO sync_devices (device_id, tombstone_seq, last_seen_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(device_id) DO UPDATE SET
+                tombstone_seq = MAX(tombstone_seq, excluded.tombstone_seq),
+                last_seen_at = excluded.last_seen_at
+            """,
+            (device_id, acked_tombstone_seq, _now_iso()),
+        )
+
+
+def compact_tombstones() -> int:
+    """
+    Drop tombstones that every active device has acknowledged, plus any older
+    than the retention window. Devices not seen within the window are
+    forgotten. Returns the number of tombstones removed.
+    """
+    cutoff = (
+        (datetime.now(timezone.utc) - timedelta(days=TOMBSTONE_RETENTION_DAYS))
+        .replace(microsecond=0)
+        .isoformat()
+        .replace("+00:00", "Z")
+    )
+    with get_connection() as connection:
+        connection.execute("BEGIN IMMEDIATE")
+        connection.execute("DELETE FROM sync_devices WHERE last_seen_at < ?", (cutoff,))
+        min_ack = connection.execute("SELECT MIN(tombstone_seq) FROM sync_devices").fetchone()[0]
+
+        removed = connection.execute(
+            "DELETE FROM tombstones WHERE seq <= ? OR deleted_at < ? RETURNING seq",
+            (min_ack or 0, cutoff),
+        ).fetchall()
+        if removed:
+            connection.execute(
+                """
+                INSERT INTO sync_meta (key, value) VALUES ('tombstones_compacted_through', ?)
+                ON CONFLICT(key) DO UPDATE SET value = MAX(value, excluded.value)
+                """,
+                (max(r[0] for r in removed),),
+            )
+        connection.execute("COMMIT")
+    return len(removed)
+
+
+def _maybe_compact_tombstones() -> None:
+    services = shard_services()
+    now = datetime.now(timezone.utc).timestamp()
+    if now - services.last_tombstone_compaction < TOMBSTONE_COMPACT_INTERVAL_S:
+        return
+    services.last_tombstone_compaction = now
+    compact_tombstones()
+
+
+def _record_conflict(table: str, row_id: Any, incoming: Dict[str, Any], device_id: str) -> None:
+    """
+    Keep a rejected client version in sync_conflicts. The live row is not
+    touched, so a conflict doesn't show up in every other device's pull.
+    """
     with get_connection() as connection:
         connection.execute(
             f"""
-            UPDATE {table}
-            SET sync_status = 'conflict',
-                updated_at = ?
-            WHERE id = ?
+            INSERT INTO sync_conflicts (table_name, row_id, device_id, incoming, server_updated_at)
+            VALUES (?, ?, ?, ?, (SELECT updated_at FROM {table} WHERE id = ?))
+            ON CONFLICT (table_name, row_id, device_id) DO UPDATE SET
+                incoming = excluded.incoming,
+                server_updated_at = excluded.server_updated_at,
+                created_at = excluded.created_at
             """,
-            (_now_iso(), row_id),
+            (table, _db_id(row_id), device_id, json.dumps(incoming, default=str), _db_id(row_id)),
         )
 
 
@@ -136,28 +968,22 @@ def _upsert_technician(incoming: Dict[str, Any]) -> Tuple[str, str]:
     if not tech_id:
         return ("skipped", "")
 
+    if "base_updated_at" in incoming:
+        return _apply_patch("technicians_cache", tech_id, incoming)
+
     if not incoming.get("username"):
         name = (incoming.get("name") or "").strip()
         if name:
-            incoming = {
-                **incoming,
-                "username": name,
-                "display_name": incoming.get("display_name") or name,
-            }
+            incoming["username"] = name
+            incoming["display_name"] = incoming.get("display_name") or name
         else:
-            incoming = {
-                **incoming,
-                "username": f"tech_{tech_id[:8]}",
-                "display_name": incoming.get("display_name") or f"tech_{tech_id[:8]}",
-            }
+            incoming["username"] = f"tech_{tech_id[:8]}"
+            incoming["display_name"] = incoming.get("display_name") or f"tech_{tech_id[:8]}"
 
-    server = _fetch_row_by_id("technicians_cache", tech_id)
-    client_ts = _parse_ts(incoming.get("updated_at"))
+    server, server_is_newer = _fetch_server_row("technicians_cache", tech_id, incoming.get("updated_at"))
 
     if server:
-        server_ts = _parse_ts(server.get("updated_at"))
-        if server_ts > client_ts:
-            _mark_conflict("technicians_cache", tech_id)
+        if server_is_newer:
             return ("conflict", tech_id)
 
         with get_connection() as connection:
@@ -176,9 +1002,10 @@ def _upsert_technician(incoming: Dict[str, Any]) -> Tuple[str, str]:
                     incoming.get("display_name", server.get("display_name")),
                     incoming.get("role", server.get("role", "technician")),
                     incoming.get("updated_at") or _now_iso(),
-                    tech_id,
+                    _db_id(tech_id),
                 ),
             )
+        shard_services().lookup_cache.invalidate("technicians_cache", tech_id)
         return ("updated", tech_id)
 
     try:
@@ -190,7 +1017,7 @@ def _upsert_technician(incoming: Dict[str, Any]) -> Tuple[str, str]:
                 VALUES (?, ?, ?, ?, ?, ?, 'synced')
                 """,
                 (
-                    tech_id,
+                    _db_id(tech_id),
                     incoming.get("username"),
                     incoming.get("display_name"),
                     incoming.get("role", "technician"),
@@ -208,13 +1035,13 @@ def _upsert_inspection(incoming: Dict[str, Any]) -> Tuple[str, str]:
     if not insp_id:
         return ("skipped", "")
 
-    server = _fetch_row_by_id("inspections", insp_id)
-    client_ts = _parse_ts(incoming.get("updated_at"))
+    if "base_updated_at" in incoming:
+        return _apply_patch("inspections", insp_id, incoming)
+
+    server, server_is_newer = _fetch_server_row("inspections", insp_id, incoming.get("updated_at"))
 
     if server:
-        server_ts = _parse_ts(server.get("updated_at"))
-        if server_ts > client_ts:
-            _mark_conflict("inspections", insp_id)
+        if server_is_newer:
             return ("conflict", insp_id)
 
         with get_connection() as connection:
@@ -233,9 +1060,9 @@ def _upsert_inspection(incoming: Dict[str, Any]) -> Tuple[str, str]:
                     incoming.get("aircraft_id", server.get("aircraft_id")),
                     incoming.get("opened_at", server.get("opened_at")),
                     incoming.get("completed_at", server.get("completed_at")),
-                    incoming.get("technician_id", server.get("technician_id")),
+                    _db_id(incoming.get("technician_id", server.get("technician_id"))),
                     incoming.get("updated_at") or _now_iso(),
-                    insp_id,
+                    _db_id(insp_id),
                 ),
             )
         return ("updated", insp_id)
@@ -250,11 +1077,11 @@ def _upsert_inspection(incoming: Dict[str, Any]) -> Tuple[str, str]:
                 VALUES (?, ?, ?, ?, ?, ?, ?, 'synced')
                 """,
                 (
-                    insp_id,
+                    _db_id(insp_id),
                     incoming.get("aircraft_id"),
                     incoming.get("opened_at"),
                     incoming.get("completed_at"),
-                    incoming.get("technician_id"),
+                    _db_id(incoming.get("technician_id")),
                     incoming.get("created_at") or _now_iso(),
                     incoming.get("updated_at") or _now_iso(),
                 ),
@@ -271,15 +1098,15 @@ def _upsert_task(incoming: Dict[str, Any]) -> Tuple[str, str]:
 
     # Accept either is_complete or is_completed from client
     if "is_complete" not in incoming and "is_completed" in incoming:
-        incoming = {**incoming, "is_complete": incoming.get("is_completed")}
+        incoming["is_complete"] = incoming.get("is_completed")
 
-    server = _fetch_row_by_id("tasks", task_id)
-    client_ts = _parse_ts(incoming.get("updated_at"))
+    if "base_updated_at" in incoming:
+        return _apply_patch("tasks", task_id, incoming)
+
+    server, server_is_newer = _fetch_server_row("tasks", task_id, incoming.get("updated_at"))
 
     if server:
-        server_ts = _parse_ts(server.get("updated_at"))
-        if server_ts > client_ts:
-            _mark_conflict("tasks", task_id)
+        if server_is_newer:
             return ("conflict", task_id)
 
         with get_connection() as connection:
@@ -298,7 +1125,7 @@ def _upsert_task(incoming: Dict[str, Any]) -> Tuple[str, str]:
                 WHERE id = ?
                 """,
                 (
-                    incoming.get("inspection_id", server.get("inspection_id")),
+                    _db_id(incoming.get("inspection_id", server.get("inspection_id"))),
                     incoming.get("title", server.get("title")),
                     incoming.get("description", server.get("description")),
                     int(incoming.get("is_complete", server.get("is_complete", 0))),
@@ -306,7 +1133,7 @@ def _upsert_task(incoming: Dict[str, Any]) -> Tuple[str, str]:
                     incoming.get("notes", server.get("notes")),
                     incoming.get("completed_at", server.get("completed_at")),
                     incoming.get("updated_at") or _now_iso(),
-                    task_id,
+                    _db_id(task_id),
                 ),
             )
         return ("updated", task_id)
@@ -321,8 +1148,8 @@ def _upsert_task(incoming: Dict[str, Any]) -> Tuple[str, str]:
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'synced')
                 """,
                 (
-                    task_id,
-                    incoming.get("inspection_id"),
+                    _db_id(task_id),
+                    _db_id(incoming.get("inspection_id")),
                     incoming.get("title"),
                     incoming.get("description"),
                     int(incoming.get("is_complete", 0)),
@@ -355,6 +1182,9 @@ def _upsert_attachment(incoming: Dict[str, Any]) -> Tuple[str, str]:
     if not att_id:
         return ("skipped", "")
 
+    if "base_updated_at" in incoming:
+        return _apply_patch("attachments", att_id, incoming)
+
     task_id = (incoming.get("task_id") or "").strip()
     file_name = (incoming.get("file_name") or "").strip()
     mime_type = (incoming.get("mime_type") or "").strip()
@@ -371,13 +1201,10 @@ def _upsert_attachment(incoming: Dict[str, Any]) -> Tuple[str, str]:
     except (TypeError, ValueError):
         size_bytes = 0
 
-    server = _fetch_row_by_id("attachments", att_id)
-    client_ts = _parse_ts(incoming.get("updated_at"))
+    server, server_is_newer = _fetch_server_row("attachments", att_id, incoming.get("updated_at"))
 
     if server:
-        server_ts = _parse_ts(server.get("updated_at"))
-        if server_ts > client_ts:
-            _mark_conflict("attachments", att_id)
+        if server_is_newer:
             return ("conflict", att_id)
 
         try:
@@ -396,14 +1223,14 @@ def _upsert_attachment(incoming: Dict[str, Any]) -> Tuple[str, str]:
                     WHERE id = ?
                     """,
                     (
-                        task_id,
+                        _db_id(task_id),
                         file_name,
                         mime_type,
                         size_bytes,
                         incoming.get("sha256"),
                         remote_key,
                         incoming.get("updated_at") or _now_iso(),
-                        att_id,
+                        _db_id(att_id),
                     ),
                 )
             return ("updated", att_id)
@@ -422,8 +1249,8 @@ def _upsert_attachment(incoming: Dict[str, Any]) -> Tuple[str, str]:
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'synced')
                 """,
                 (
-                    att_id,
-                    task_id,
+                    _db_id(att_id),
+                    _db_id(task_id),
                     file_name,
                     mime_type,
                     size_bytes,
@@ -438,12 +1265,103 @@ def _upsert_attachment(incoming: Dict[str, Any]) -> Tuple[str, str]:
         return ("conflict", att_id)
 
 
+# Upserts in FK-safe order: technicians -> inspections -> tasks -> attachments.
+# Incoming row dicts are owned by the caller's batch and may be modified.
+_UPSERTS = {
+    "technicians_cache": _upsert_technician,
+    "inspections": _upsert_inspection,
+    "tasks": _upsert_task,
+    "attachments": _upsert_attachment,
+}
+
+
+def _apply_rows(
+    table: str,
+    rows: List[Dict[str, Any]],
+    applied_summary: Dict[str, Dict[str, int]],
+    outcomes: Dict[str, List[Tuple[str, str]]],
+    conflicts: Dict[str, List[str]],
+    device_id: str,
+) -> None:
+    upsert = _UPSERTS[table]
+    for row in rows:
+        row = row if isinstance(row, dict) else {}
+        result, rid = upsert(row)
+        applied_summary[table][result] += 1
+        outcomes[table].append((result, rid))
+        if result == "conflict" and rid:
+            conflicts[table].append(rid)
+            _record_conflict(table, rid, row, device_id)
+
+
+def _parse_applied_ids(payload: Dict[str, Any]) -> Tuple[str, Tuple[str, ...]]:
+    """/sync/jobs "applied_ids" (encoding) and "applied_outcomes" (which ones to list)."""
+    mode = payload.get("applied_ids", "ids")
+    if mode not in wire_format.APPLIED_ID_MODES:
+        raise ValueError(f"applied_ids must be one of {list(wire_format.APPLIED_ID_MODES)}")
+    only = payload.get("applied_outcomes")
+    if only is None:
+        return mode, wire_format.OUTCOMES
+    if not isinstance(only, list) or any(o not in wire_format.OUTCOMES for o in only):
+        raise ValueError(f"applied_outcomes must be a list of {list(wire_format.OUTCOMES)}")
+    return mode, tuple(o for o in wire_format.OUTCOMES if o in only)
+
+
+def _payload_device_id(payload: Dict[str, Any]) -> str:
+    device_id = payload.get("device_id")
+    return device_id.strip() if isinstance(device_id, str) else ""
+
+
+def _stream_sync_body(req) -> bool:
+    if not (req.is_json or wire_format.is_msgpack(req.mimetype)):
+        return False
+    return req.content_length is None or req.content_length > STREAM_SYNC_THRESHOLD_BYTES
+
+
+# ----------------------------
+# Health
+# ----------------------------
+
+@app.route("/health", methods=["GET"])
+def health():
+    """
+    Liveness/readiness for this process. Under prefork_server.py every
+    worker answers for itself, so the pid tells you which one you hit.
+    Per-database figures are for the shard the request was routed to.
+    """
+    try:
+        with get_connection() as connection:
+            connection.execute("SELECT 1").fetchone()
+        db_ok = True
+    except sqlite3.Error:
+        db_ok = False
+
+    services = shard_services()
+    uptime = (datetime.now(timezone.utc) - PROCESS_STARTED_AT).total_seconds()
+    return jsonify(
+        {
+            "status": "ok" if db_ok else "degraded",
+            "pid": os.getpid(),
+            "uptime_s": round(uptime, 1),
+            "db": "ok" if db_ok else "unavailable",
+            "admission": sync_limiter.stats(),
+            "shard": services.name,
+            "pool": services.pool.stats(),
+            "cache": services.lookup_cache.stats(),
+            "maintenance": services.maintenance.stats(),
+            "blob_jobs": services.blob_workers.stats(),
+            "read_replica": services.read_replica.stats(),
+        }
+    ), 200 if db_ok else 503
+
+
 # ----------------------------
 # NEW: Blob upload endpoint
 # ----------------------------
 
 @app.route("/attachments/upload", methods=["POST"])
 @require_api_key
+@admission_controlled
 def upload_attachment():
     """
     Expected multipart/form-data:
@@ -459,6 +1377,8 @@ def upload_attachment():
     Notes:
       - This endpoint ONLY stores the blob on disk and returns remote_key.
       - The metadata row is created/updated later during /sync/jobs using that remote_key.
+      - Processing (blob_jobs.py) runs afterwards; attachments.processing_status
+        goes from 'pending' to 'processed' or 'failed'.
     """
     attachment_id = (request.form.get("attachment_id") or "").strip()
     if not attachment_id:
@@ -484,15 +1404,21 @@ def upload_attachment():
     ext = ext[:12]  # small safety
 
     # Keep it simple and deterministic:
-    # store as uploads/<attachment_id><ext>
+    # store as uploads/<aa>/<bb>/<attachment_id><ext>
     filename = f"{attachment_id}{ext}"
-    abs_path = os.path.join(UPLOAD_DIR, filename)
+    if not blob_store.is_valid_key(filename) or blob_store.source_key(filename) != filename:
+        return jsonify({"error": "invalid attachment_id"}), 400
 
     try:
-        f.save(abs_path)
+        blob_store.save(shard_services().upload_dir, filename, f.stream)
     except Exception as e:
         return jsonify({"error": f"failed to save file: {e}"}), 500
 
+    # hashing, image metadata and previews happen in the background
+    with get_connection() as connection:
+        blob_jobs.enqueue(connection, filename)
+    shard_services().blob_workers.notify()
+
     # remote_key is what the client stores in its attachments.remoteKey column
     # and later sends via /sync/jobs
     remote_key = filename
@@ -504,10 +1430,26 @@ def upload_attachment():
 # Pull-only technicians sync
 # ----------------------------
 
+def _cached_technicians_pull(
+    last_sync_at: Optional[str], limit: int, as_of: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    # the table is tiny and rarely written, so most pulls are the same few
+    # answers (as_of: answers read from that replica, see _use_read_replica)
+    return shard_services().lookup_cache.get(
+        "technicians_cache",
+        ("updated_since", last_sync_at, limit, as_of),
+        lambda: _fetch_updated_since("technicians_cache", last_sync_at, limit=limit),
+    )
+
+
 @app.route("/sync/technicians", methods=["POST"])
 @require_api_key
+@admission_controlled
 def sync_technicians():
-    payload = request.get_json(silent=True) or {}
+    try:
+        payload = wire_format.decode_request(request)
+    except wire_format.WireFormatError as e:
+        return jsonify({"error": str(e)}), e.status
     last_sync_at = payload.get("last_sync_at")
     limit = payload.get("limit") or 5000
 
@@ -516,10 +1458,47 @@ def sync_technicians():
     except (TypeError, ValueError):
         limit = 5000
 
-    server_time = _now_iso()
-    tech_rows = _fetch_updated_since("technicians_cache", last_sync_at, limit=limit)
+    try:
+        last_tombstone_seq = int(payload.get("last_tombstone_seq") or 0)
+    except (TypeError, ValueError):
+        last_tombstone_seq = 0
 
-    return jsonify({"server_time": server_time, "technicians_cache": tech_rows}), 200
+    watermark = None
+    if "watermark" in payload:
+        # same per-table watermark as /sync/jobs "watermarks"
+        try:
+            watermark = _parse_watermarks({"technicians_cache": payload["watermark"]}).get("technicians_cache")
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        as_of = _use_read_replica(*_watermark_times(watermark))
+        server_time = as_of or _now_iso()
+        tech_rows, deleted_ids, watermark = _pull_table("technicians_cache", watermark, server_time, limit)
+        deleted = {"technicians_cache": deleted_ids}
+        tombstone_seq = watermark["tombstone_seq"]
+    elif last_sync_at:
+        as_of = _use_read_replica(last_sync_at)
+        server_time = as_of or _now_iso()
+        tech_rows = _cached_technicians_pull(last_sync_at, limit, as_of)
+        deleted, tombstone_seq = _fetch_tombstones(last_tombstone_seq, ("technicians_cache",))
+    else:
+        as_of = _use_read_replica()
+        server_time = as_of or _now_iso()
+        tombstone_seq = _current_tombstone_seq()
+        tech_rows = _cached_technicians_pull(last_sync_at, limit, as_of)
+        deleted = {"technicians_cache": []}
+
+    if payload.get("layout") == "columnar":
+        tech_rows = wire_format.to_columnar(tech_rows)
+
+    response = {
+        "server_time": server_time,
+        "technicians_cache": tech_rows,
+        "deleted": deleted,
+        "tombstone_seq": tombstone_seq,
+    }
+    if watermark is not None:
+        response["watermark"] = watermark
+    return wire_format.make_response(response, 200, wire_format.response_mimetype(request))
 
 
 # ----------------------------
@@ -528,16 +1507,76 @@ def sync_technicians():
 
 @app.route("/sync/jobs", methods=["POST"])
 @require_api_key
+@admission_controlled
 def sync_jobs():
-    payload = request.get_json(silent=True) or {}
-    last_sync_at = payload.get("last_sync_at")
-    changes = payload.get("changes") or {}
-
-    tech_changes = changes.get("technicians_cache") or []
-    insp_changes = changes.get("inspections") or []
-    task_changes = changes.get("tasks") or []
-    att_changes = changes.get("attachments") or []  # NEW
-
+    """
+    Push client changes, pull server changes.
+
+    Request JSON:
+      {
+        "last_sync_at": "...",            (omit on first sync)
+        "watermarks": {"<table>": {...}}, (instead of last_sync_at/last_tombstone_seq:
+                                           one watermark per table, echoed from the
+                                           previous response; see _pull_table)
+        "tables": ["tasks", ...],         (optional; pull only these tables)
+        "limit": 5000,                    (rows per table, with watermarks)
+        "device_id": "...",               (optional; enables tombstone compaction,
+                                           tags conflicts for /sync/conflicts)
+        "last_tombstone_seq": 123,        (tombstone_seq from the previous response)
+        "delta_pull": true,               (optional; see server_changes below)
+        "layout": "columnar",             (optional; see wire_format.py)
+        "scope": {"status": [...],        (optional; pull only these inspections
+                  "technician_id": "..."}  and their tasks/attachments, see
+                                           _updated_since_sql)
+        "include_progress": true,         (optional; inspection rows get a
+                                           "progress" object, see /sync/progress)
+        "applied_ids": "indexes",         (optional; "ids" (default), "indexes",
+                                           "bitmap" or "none", see
+                                           wire_format.encode_applied_ids)
+        "applied_outcomes": ["skipped"],  (optional; outcomes applied_ids lists,
+                                           default all four)
+        "legacy_aliases": false,          (optional; no is_completed copy of
+                                           is_complete on pulled tasks)
+        "changes": { "<table>": [ {row}, ... ], ... }
+      }
+
+    The body may also be msgpack (Content-Type: application/msgpack), and the
+    response is msgpack when the Accept header asks for it.
+
+    Bodies over STREAM_SYNC_THRESHOLD_BYTES (or chunked ones) are parsed
+    incrementally and applied in batches of SYNC_APPLY_BATCH_SIZE rows (see
+    stream_ingest.py); bodies over MAX_SYNC_BODY_BYTES are rejected with 413.
+    If such a body turns out to be invalid part-way, the rows before the
+    error stay applied: the error response carries "applied" and
+    "conflicts" for them, and the push is safe to retry.
+
+    A pushed row that includes "base_updated_at" is a patch: only the columns
+    it carries are written, and it merges with server edits to other columns
+    (see _apply_patch).
+
+    A rejected row is listed under "conflicts" and its version is kept in
+    sync_conflicts (the server row is left as is); fetch it with
+    /sync/conflicts and settle it with /sync/conflicts/resolve.
+
+    A request that pushes no rows may be answered from the shard's read
+    replica (see _use_read_replica); server_time is then the replica's
+    as_of. Send the header X-Read-Consistency: primary to always read the
+    primary.
+
+    Response JSON (besides applied/applied_ids/conflicts):
+      server_changes        rows updated since last_sync_at; with delta_pull,
+                            rows the client already has are "partial": true
+                            and carry only the columns changed since then
+      deleted               { "<table>": [ids] } deleted since last_tombstone_seq;
+                            apply after server_changes
+      tombstone_seq         send back as last_tombstone_seq next time
+      full_resync_required  true if deletes the client needed were already
+                            compacted away; wipe local data and sync from scratch
+      watermarks            (with watermarks/tables) per pulled table:
+                            last_sync_at, cursor, tombstone_seq, has_more and
+                            resync_required; store and send back as is. Only
+                            the tables with has_more need another pull.
+    """
     job_id = str(uuid4())
     server_time = _now_iso()
 
@@ -548,12 +1587,9 @@ def sync_jobs():
         "attachments": {"inserted": 0, "updated": 0, "skipped": 0, "conflict": 0},  # NEW
     }
 
-    applied_ids = {
-        "technicians_cache": {"inserted": [], "updated": [], "skipped": [], "conflict": []},
-        "inspections": {"inserted": [], "updated": [], "skipped": [], "conflict": []},
-        "tasks": {"inserted": [], "updated": [], "skipped": [], "conflict": []},
-        "attachments": {"inserted": [], "updated": [], "skipped": [], "conflict": []},  # NEW
-    }
+    # (result, id) of every pushed row in push order, encoded into
+    # "applied_ids" as the client asks (wire_format.encode_applied_ids)
+    outcomes: Dict[str, List[Tuple[str, str]]] = {t: [] for t in SYNC_TABLES}
 
     conflicts = {
         "technicians_cache": [],
@@ -562,64 +1598,778 @@ def sync_jobs():
         "attachments": [],  # NEW
     }
 
-    # Apply in FK-safe order:
-    # technicians -> inspections -> tasks -> attachments
-    for t in tech_changes:
-        result, rid = _upsert_technician(t or {})
-        applied_summary["technicians_cache"][result] += 1
-        if rid:
-            applied_ids["technicians_cache"][result].append(rid)
-        if result == "conflict" and rid:
-            conflicts["technicians_cache"].append(rid)
+    if request.content_length and request.content_length > MAX_SYNC_BODY_BYTES:
+        return jsonify({"error": f"request body exceeds {MAX_SYNC_BODY_BYTES} bytes"}), 413
 
-    for i in insp_changes:
-        result, rid = _upsert_inspection(i or {})
-        applied_summary["inspections"][result] += 1
-        if rid:
-            applied_ids["inspections"][result].append(rid)
-        if result == "conflict" and rid:
-            conflicts["inspections"].append(rid)
+    if _stream_sync_body(request):
+        # Large push: rows are applied batch by batch as they are parsed
+        # (conflicts get the device_id if it comes before "changes")
+        fields: Dict[str, Any] = {}
+        try:
+            payload = stream_ingest.ingest(
+                request.stream,
+                request.mimetype,
+                MAX_SYNC_BODY_BYTES,
+                SYNC_TABLES,
+                lambda table, rows: _apply_rows(
+                    table, rows, applied_summary, outcomes, conflicts, _payload_device_id(fields)
+                ),
+                SYNC_APPLY_BATCH_SIZE,
+                fields,
+            )
+        except stream_ingest.StreamIngestError as e:
+            # batches before the error are committed: report them
+            return jsonify({"error": str(e), "applied": applied_summary, "conflicts": conflicts}), e.status
+    else:
+        try:
+            payload = wire_format.decode_request(request)
+            changes = payload.get("changes") or {}
+            rows_by_table = {t: wire_format.from_columnar(changes.get(t)) for t in SYNC_TABLES}
+        except wire_format.WireFormatError as e:
+            return jsonify({"error": str(e)}), e.status
+
+        # Apply in FK-safe order:
+        # technicians -> inspections -> tasks -> attachments
+        device_id = _payload_device_id(payload)
+        for table in SYNC_TABLES:
+            _apply_rows(table, rows_by_table[table], applied_summary, outcomes, conflicts, device_id)
 
-    for tk in task_changes:
-        result, rid = _upsert_task(tk or {})
-        applied_summary["tasks"][result] += 1
-        if rid:
-            applied_ids["tasks"][result].append(rid)
-        if result == "conflict" and rid:
-            conflicts["tasks"].append(rid)
+    last_sync_at = payload.get("last_sync_at")
+    delta_pull = bool(payload.get("delta_pull"))
+    try:
+        scope = _parse_scope(payload.get("scope"))
+        applied_ids_mode, applied_outcomes = _parse_applied_ids(payload)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    columnar = payload.get("layout") == "columnar"
+
+    device_id = _payload_device_id(payload)
+    # a pull-only request may be answered from the read replica; the pull
+    # half of a push reads the primary, so it sees the push
+    pushed = any(sum(counts.values()) for counts in applied_summary.values())
+    watermarks_response = None
+    if "watermarks" in payload or "tables" in payload:
+        # Per-table pull: each table has its own watermark and may be skipped
+        try:
+            tables = _parse_tables(payload.get("tables"))
+            watermarks = _parse_watermarks(payload.get("watermarks"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        try:
+            limit = int(payload.get("limit") or SYNC_PAGE_LIMIT)
+        except (TypeError, ValueError):
+            return jsonify({"error": "limit must be an integer"}), 400
+
+        if not pushed:
+            seen = [ts for t in tables for ts in _watermark_times(watermarks.get(t))]
+            server_time = _use_read_replica(*seen) or server_time
+        server_changes, deleted, watermarks_response = {}, {}, {}
+        for table in tables:
+            server_changes[table], deleted[table], watermarks_response[table] = _pull_table(
+                table, watermarks.get(table), server_time, limit, scope, delta_pull
+            )
+        tombstone_seq = min(w["tombstone_seq"] for w in watermarks_response.values()) if tables else None
+        full_resync_required = any(w["resync_required"] for w in watermarks_response.values())
+
+        if device_id:
+            # lowest seq the client has applied across its tables, counting
+            # tables pulled from scratch just now as up to date
+            acked = [w["tombstone_seq"] for w in watermarks.values() if w["tombstone_seq"] is not None]
+            acked += [
+                watermarks_response[t]["tombstone_seq"]
+                for t in tables
+                if watermarks.get(t, {}).get("tombstone_seq") is None
+            ]
+            if acked:
+                _record_device(device_id, min(acked))
+                _maybe_compact_tombstones()
+    else:
+        # Single last_sync_at for all tables. Delete propagation: the client
+        # echoes the tombstone_seq we last sent it
+        try:
+            last_tombstone_seq = int(payload.get("last_tombstone_seq") or 0)
+        except (TypeError, ValueError):
+            last_tombstone_seq = 0
+
+        if not pushed:
+            server_time = _use_read_replica(last_sync_at) or server_time
+
+        # First sync: the pull below is complete as of this seq, so no deletes
+        # before it are needed. Read it before pulling so none slip between.
+        if not last_sync_at:
+            first_sync_tombstone_seq = _current_tombstone_seq()
+
+        # Pull server-side changes since last_sync_at
+        server_changes = {
+            "technicians_cache": _fetch_updated_since("technicians_cache", last_sync_at),
+            "inspections": _fetch_updated_since("inspections", last_sync_at, scope=scope),
+            "tasks": _fetch_updated_since("tasks", last_sync_at, scope=scope),
+            "attachments": _fetch_updated_since("attachments", last_sync_at, scope=scope),  # NEW
+        }
+        if delta_pull:
+            for table in SYNC_TABLES:
+                server_changes[table] = _delta_rows(table, server_changes[table], last_sync_at)
+
+        # Deletes since the client's last tombstone_seq (apply after server_changes)
+        full_resync_required = False
+        if last_sync_at:
+            full_resync_required = last_tombstone_seq < _tombstones_compacted_through()
+            deleted, tombstone_seq = _fetch_tombstones(last_tombstone_seq)
+        else:
+            deleted = {t: [] for t in SYNC_TABLES}
+            tombstone_seq = first_sync_tombstone_seq
+
+        if device_id:
+            # what the client had applied before this request (or, on first
+            # sync, everything up to the snapshot it is about to receive)
+            _record_device(device_id, last_tombstone_seq if last_sync_at else tombstone_seq)
+            _maybe_compact_tombstones()
+
+    # Legacy mapping: mirror task boolean field name, unless the client
+    # says it doesn't read it
+    if payload.get("legacy_aliases", True) is not False:
+        for t in server_changes.get("tasks", []):
+            if "is_complete" in t and "is_completed" not in t:
+                t["is_completed"] = t["is_complete"]
+
+    if payload.get("include_progress") and server_changes.get("inspections"):
+        progress = _fetch_progress([r["id"] for r in server_changes["inspections"]])
+        for r in server_changes["inspections"]:
+            r["progress"] = progress.get(r["id"])
+
+    if columnar:
+        for table in server_changes:
+            server_changes[table] = wire_format.to_columnar(server_changes[table])
+
+    applied_ids = wire_format.encode_applied_ids(outcomes, applied_ids_mode, applied_outcomes)
+    response = {
+        "job_id": job_id,
+        "server_time": server_time,
+        "applied": applied_summary,
+        "applied_ids": applied_ids,
+        "conflicts": conflicts,
+        "server_changes": server_changes,
+        "deleted": deleted,
+        "tombstone_seq": tombstone_seq,
+        "full_resync_required": full_resync_required,
+    }
+    if applied_ids is None:
+        del response["applied_ids"]
+    if watermarks_response is not None:
+        response["watermarks"] = watermarks_response
+    return wire_format.make_response(response, 200, wire_format.response_mimetype(request))
 
-    for a in att_changes:
-        result, rid = _upsert_attachment(a or {})
-        applied_summary["attachments"][result] += 1
-        if rid:
-            applied_ids["attachments"][result].append(rid)
-        if result == "conflict" and rid:
-            conflicts["attachments"].append(rid)
-
-    # Pull server-side changes since last_sync_at
-    server_changes = {
-        "technicians_cache": _fetch_updated_since("technicians_cache", last_sync_at),
-        "inspections": _fetch_updated_since("inspections", last_sync_at),
-        "tasks": _fetch_updated_since("tasks", last_sync_at),
-        "attachments": _fetch_updated_since("attachments", last_sync_at),  # NEW
+
+# ----------------------------
+# Progress summary: POST /sync/progress
+# ----------------------------
+
+PROGRESS_PAGE_LIMIT = 5000
+
+
+@app.route("/sync/progress", methods=["POST"])
+@require_api_key
+@admission_controlled
+def sync_progress():
+    """
+    Per-inspection progress counters (kept by triggers in schema.sql).
+
+    Request JSON (all optional):
+      {
+        "inspection_ids": ["...", ...],
+        "scope": {"status": [...], "technician_id": "..."},
+        "updated_since": "...",   (only inspections with task/attachment
+                                   activity after this)
+        "limit": 5000
+      }
+
+    Response: {"progress": [{inspection_id, aircraft_id, status, technician_id,
+    total_tasks, completed_tasks, attachments, last_activity_at}, ...],
+    "totals": {inspections, total_tasks, completed_tasks, attachments}}
+    """
+    try:
+        payload = wire_format.decode_request(request)
+    except wire_format.WireFormatError as e:
+        return jsonify({"error": str(e)}), e.status
+
+    try:
+        scope = _parse_scope(payload.get("scope"))
+        limit = max(1, min(int(payload.get("limit") or PROGRESS_PAGE_LIMIT), PROGRESS_PAGE_LIMIT))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    where: List[str] = []
+    values: List[Any] = []
+    inspection_ids = payload.get("inspection_ids")
+    if inspection_ids:
+        if not isinstance(inspection_ids, list):
+            return jsonify({"error": "inspection_ids must be a list"}), 400
+        where.append(f"p.inspection_id IN ({','.join('?' for _ in inspection_ids)})")
+        values.extend(_db_id(i) for i in inspection_ids)
+    if scope and scope["status"]:
+        where.append(f"i.status IN ({','.join('?' for _ in scope['status'])})")
+        values.extend(scope["status"])
+    if scope and scope["technician_id"]:
+        where.append("i.technician_id = ?")
+        values.append(_db_id(scope["technician_id"]))
+    if payload.get("updated_since"):
+        where.append(f"p.last_activity_ms > {_EPOCH_MS_SQL.format('?')}")
+        values.append(payload["updated_since"])
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+
+    server_time = _use_read_replica(payload.get("updated_since")) or _now_iso()
+    with get_read_connection() as connection:
+        rows = connection.execute(
+            f"""
+            SELECT {_PROGRESS_COLUMNS}, i.aircraft_id, i.status, i.technician_id
+            FROM inspection_progress p
+            JOIN inspections i ON i.id = p.inspection_id
+            {where_sql}
+            ORDER BY p.last_activity_ms DESC
+            LIMIT ?
+            """,
+            (*values, limit),
+        ).fetchall()
+
+    items = []
+    for r in rows:
+        item = _progress_to_dict(r)
+        item["technician_id"] = uuid_keys.from_blob(item["technician_id"])
+        items.append(item)
+
+    totals = {
+        "inspections": len(items),
+        "total_tasks": sum(i["total_tasks"] for i in items),
+        "completed_tasks": sum(i["completed_tasks"] for i in items),
+        "attachments": sum(i["attachments"] for i in items),
     }
+    return wire_format.make_response(
+        {"server_time": server_time, "progress": items, "totals": totals},
+        200,
+        wire_format.response_mimetype(request),
+    )
+
+
+# ----------------------------
+# Task search: POST /search/tasks
+# ----------------------------
 
-    # Legacy mapping: mirror task boolean field name if needed
-    for t in server_changes["tasks"]:
-        if "is_complete" in t and "is_completed" not in t:
-            t["is_completed"] = t["is_complete"]
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+
+
+@app.route("/search/tasks", methods=["POST"])
+@require_api_key
+@admission_controlled
+def search_tasks():
+    """
+    Full-text search over task title/description/notes/result (tasks_fts).
+
+    Request JSON:
+      {
+        "q": "hydraulic leak",    (all words must match; "prefix": true
+                                   makes the last one a prefix)
+        "aircraft_id": "...",     (optional filters)
+        "technician_id": "...",
+        "updated_since": "...", "updated_until": "...",
+        "limit": 20, "offset": 0
+      }
+
+    Results are ranked by bm25 (title weighs most) and carry a snippet
+    with matches wrapped in <mark></mark>.
+    """
+    try:
+        payload = wire_format.decode_request(request)
+    except wire_format.WireFormatError as e:
+        return jsonify({"error": str(e)}), e.status
+
+    match = search_index.fts_query(payload.get("q"), bool(payload.get("prefix")))
+    if not match:
+        return jsonify({"error": "q must contain at least one word"}), 400
+    try:
+        limit = max(1, min(int(payload.get("limit") or SEARCH_DEFAULT_LIMIT), SEARCH_MAX_LIMIT))
+        offset = max(0, int(payload.get("offset") or 0))
+    except (TypeError, ValueError):
+        return jsonify({"error": "limit and offset must be integers"}), 400
+    for key in ("aircraft_id", "technician_id", "updated_since", "updated_until"):
+        if payload.get(key) is not None and not isinstance(payload[key], str):
+            return jsonify({"error": f"{key} must be a string"}), 400
+
+    where = ["tasks_fts MATCH ?"]
+    values: List[Any] = [match]
+    if payload.get("aircraft_id"):
+        where.append("i.aircraft_id = ?")
+        values.append(payload["aircraft_id"])
+    if payload.get("technician_id"):
+        where.append("i.technician_id = ?")
+        values.append(_db_id(payload["technician_id"]))
+    if payload.get("updated_since"):
+        where.append(f"t.updated_at_ms >= {_EPOCH_MS_SQL.format('?')}")
+        values.append(payload["updated_since"])
+    if payload.get("updated_until"):
+        where.append(f"t.updated_at_ms <= {_EPOCH_MS_SQL.format('?')}")
+        values.append(payload["updated_until"])
+
+    weights = ", ".join(str(w) for w in search_index.BM25_WEIGHTS)
+    with get_connection() as connection:
+        # an unparseable date would turn into NULL and silently match nothing
+        for value in (payload.get("updated_since"), payload.get("updated_until")):
+            if value and connection.execute(f"SELECT {_EPOCH_MS_SQL.format('?')}", (value,)).fetchone()[0] is None:
+                return jsonify({"error": f"invalid timestamp: {value}"}), 400
+
+        rows = connection.execute(
+            f"""
+            SELECT t.id, t.inspection_id, t.title, t.is_complete, t.completed_at, t.updated_at,
+                   i.aircraft_id, i.technician_id,
+                   snippet(tasks_fts, -1, '<mark>', '</mark>', '…', 12) AS snippet,
+                   bm25(tasks_fts, {weights}) AS score
+            FROM tasks_fts
+            JOIN tasks t ON t.rowid = tasks_fts.rowid
+            JOIN inspections i ON i.id = t.inspection_id
+            WHERE {' AND '.join(where)}
+            ORDER BY score
+            LIMIT ? OFFSET ?
+            """,
+            (*values, limit + 1, offset),
+        ).fetchall()
+
+    results = [row_to_dict(r) for r in rows[:limit]]
+    for r in results:
+        r["score"] = -r["score"]  # bm25 is lower-is-better; flip so higher is better
+    return wire_format.make_response(
+        {
+            "results": results,
+            "next_offset": offset + limit if len(rows) > limit else None,
+        },
+        200,
+        wire_format.response_mimetype(request),
+    )
+
+
+# ----------------------------
+# Conflicts: POST /sync/conflicts, /sync/conflicts/resolve
+# ----------------------------
+
+CONFLICT_RESOLUTIONS = ("server", "client", "merged")
+
+
+def _conflict_server_rows(
+    connection: sqlite3.Connection, rows: List[sqlite3.Row]
+) -> Dict[Tuple[str, Any], sqlite3.Row]:
+    """Current server row of each conflict in `rows`, keyed by (table, row_id); one query per table."""
+    ids_by_table: Dict[str, List[Any]] = {}
+    for r in rows:
+        ids_by_table.setdefault(r["table_name"], []).append(r["row_id"])
+    servers: Dict[Tuple[str, Any], sqlite3.Row] = {}
+    for table, ids in ids_by_table.items():
+        placeholders = ",".join("?" for _ in ids)
+        for server in connection.execute(
+            f"SELECT {SYNC_COLUMNS[table]} FROM {table} WHERE id IN ({placeholders})",
+            ids,
+        ):
+            servers[(table, server["id"])] = server
+    return servers
+
+
+def _conflict_to_dict(row: sqlite3.Row, server: Optional[sqlite3.Row]) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "table": row["table_name"],
+        "row_id": uuid_keys.from_blob(row["row_id"]),
+        "device_id": row["device_id"],
+        "created_at": row["created_at"],
+        "incoming": json.loads(row["incoming"]),
+        "server_updated_at": row["server_updated_at"],
+        "server": row_to_dict(server) if server else None,
+    }
+
+
+@app.route("/sync/conflicts", methods=["POST"])
+@require_api_key
+@admission_controlled
+def sync_conflicts():
+    """
+    Open conflicts, oldest first.
+
+    Request JSON:
+      {
+        "device_id": "...",     (optional; only this device's conflicts)
+        "after_id": 0,          (page after this conflict id)
+        "limit": 200
+      }
+
+    Each conflict carries the rejected "incoming" version, the server
+    updated_at it lost to, and the current "server" row (null if deleted).
+    """
+    try:
+        payload = wire_format.decode_request(request)
+    except wire_format.WireFormatError as e:
+        return jsonify({"error": str(e)}), e.status
+
+    try:
+        after_id = int(payload.get("after_id") or 0)
+        limit = max(1, min(int(payload.get("limit") or 200), 1000))
+    except (TypeError, ValueError):
+        return jsonify({"error": "after_id and limit must be integers"}), 400
+
+    device_id = _payload_device_id(payload)
+    sql = "SELECT * FROM sync_conflicts WHERE id > ?"
+    params: List[Any] = [after_id]
+    if device_id:
+        sql += " AND device_id = ?"
+        params.append(device_id)
+    sql += " ORDER BY id LIMIT ?"
+    params.append(limit)
+
+    with get_connection() as connection:
+        rows = connection.execute(sql, params).fetchall()
+        servers = _conflict_server_rows(connection, rows)
+    items = [_conflict_to_dict(r, servers.get((r["table_name"], r["row_id"]))) for r in rows]
+
+    return wire_format.make_response(
+        {
+            "conflicts": items,
+            "next_after_id": items[-1]["id"] if len(items) == limit else None,
+        },
+        200,
+        wire_format.response_mimetype(request),
+    )
+
+
+@app.route("/sync/conflicts/resolve", methods=["POST"])
+@require_api_key
+@admission_controlled
+def resolve_conflict():
+    """
+    Settle one conflict.
+
+    Request JSON:
+      {
+        "id": 12,
+        "resolution": "server" | "client" | "merged",
+        "row": { ... },        (merged only: the columns to write)
+        "force": false
+      }
+
+    "server" just drops the conflict. "client" writes the stored incoming
+    version and "merged" writes `row`, both as a new server version. If the
+    server row changed since the conflict was recorded, those two answer 409
+    with the current conflict unless "force" is set.
+    """
+    try:
+        payload = wire_format.decode_request(request)
+    except wire_format.WireFormatError as e:
+        return jsonify({"error": str(e)}), e.status
+
+    resolution = payload.get("resolution")
+    if resolution not in CONFLICT_RESOLUTIONS:
+        return jsonify({"error": f"resolution must be one of {list(CONFLICT_RESOLUTIONS)}"}), 400
+    try:
+        conflict_id = int(payload.get("id"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "id is required"}), 400
+
+    with get_connection() as connection:
+        row = connection.execute("SELECT * FROM sync_conflicts WHERE id = ?", (conflict_id,)).fetchone()
+        servers = _conflict_server_rows(connection, [row] if row else [])
+    if not row:
+        return jsonify({"error": "Conflict not found"}), 404
+
+    conflict = _conflict_to_dict(row, servers.get((row["table_name"], row["row_id"])))
+    table, row_id, server = conflict["table"], conflict["row_id"], conflict["server"]
+    updated_at = None
+
+    if resolution != "server":
+        if server is None:
+            return jsonify({"error": "Server row no longer exists", "conflict": conflict}), 409
+        if server["updated_at"] != conflict["server_updated_at"] and not payload.get("force"):
+            return jsonify({"error": "Server row changed since the conflict", "conflict": conflict}), 409
+
+        source = conflict["incoming"] if resolution == "client" else (payload.get("row") or {})
+        if not isinstance(source, dict):
+            return jsonify({"error": "row must be an object"}), 400
+        if table == "tasks" and "is_complete" not in source and "is_completed" in source:
+            source["is_complete"] = source["is_completed"]
+        fields = {k: source[k] for k in PATCH_COLUMNS[table] if k in source}
+
+        current, _ = _fetch_server_row(table, row_id, None)
+        updated_at = _next_updated_at(current or {})
+        try:
+            _write_fields(table, row_id, fields, updated_at)
+        except sqlite3.IntegrityError as e:
+            return jsonify({"error": f"Could not apply resolution: {e}"}), 409
+
+    with get_connection() as connection:
+        connection.execute("DELETE FROM sync_conflicts WHERE id = ?", (conflict_id,))
 
     return jsonify(
         {
-            "job_id": job_id,
-            "server_time": server_time,
-            "applied": applied_summary,
-            "applied_ids": applied_ids,
-            "conflicts": conflicts,
-            "server_changes": server_changes,
+            "id": conflict_id,
+            "table": table,
+            "row_id": row_id,
+            "resolution": resolution,
+            "updated_at": updated_at,
         }
     ), 200
 
 
+# ----------------------------
+# Archive (read-only): POST /archive/inspections, GET /archive/inspections/<id>
+# ----------------------------
+
+ARCHIVE_DEFAULT_LIMIT = 50
+ARCHIVE_MAX_LIMIT = 200
+
+
+def get_archive_connection() -> Optional[sqlite3.Connection]:
+    """Read-only connection to the archive database, or None if nothing was archived yet."""
+    archive_path = shard_services().archive_path
+    if not os.path.exists(archive_path):
+        return None
+    connection = sqlite3.connect(f"file:{archive_path}?mode=ro", uri=True)
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+def _archive_select(table: str) -> str:
+    return ", ".join(c for c in archive.ARCHIVE_COLUMNS[table] if not c.endswith("_ms"))
+
+
+@app.route("/archive/inspections", methods=["POST"])
+@require_api_key
+@admission_controlled
+def list_archived_inspections():
+    """
+    Archived inspections, most recently completed first.
+
+    Request JSON:
+      {
+        "aircraft_id": "...", "technician_id": "...",   (optional filters)
+        "completed_since": "...", "completed_until": "...",
+        "limit": 50,
+        "after": "..."                                  (next_after from the previous page)
+      }
+    """
+    try:
+        payload = wire_format.decode_request(request)
+    except wire_format.WireFormatError as e:
+        return jsonify({"error": str(e)}), e.status
+    try:
+        limit = max(1, min(int(payload.get("limit") or ARCHIVE_DEFAULT_LIMIT), ARCHIVE_MAX_LIMIT))
+    except (TypeError, ValueError):
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    where: List[str] = []
+    values: List[Any] = []
+    if payload.get("aircraft_id"):
+        where.append("aircraft_id = ?")
+        values.append(payload["aircraft_id"])
+    if payload.get("technician_id"):
+        where.append("technician_id = ?")
+        values.append(_db_id(payload["technician_id"]))
+    if payload.get("completed_since"):
+        where.append(f"completed_at_ms >= {_EPOCH_MS_SQL.format('?')}")
+        values.append(payload["completed_since"])
+    if payload.get("completed_until"):
+        where.append(f"completed_at_ms <= {_EPOCH_MS_SQL.format('?')}")
+        values.append(payload["completed_until"])
+    if payload.get("after"):
+        # keyset cursor "<completed_at_ms>:<id>"
+        try:
+            after_ms, after_id = str(payload["after"]).split(":", 1)
+            after_ms = int(after_ms)
+            after_key = _db_id(after_id)
+        except ValueError:
+            return jsonify({"error": "invalid after cursor"}), 400
+        where.append("(completed_at_ms, id) < (?, ?)")
+        values.extend([after_ms, after_key])
+
+    connection = get_archive_connection()
+    if connection is None:
+        return jsonify({"inspections": [], "next_after": None}), 200
+    with connection:
+        rows = connection.execute(
+            f"""
+            SELECT {_archive_select('inspections')}, completed_at_ms, archived_at
+            FROM inspections
+            {'WHERE ' + ' AND '.join(where) if where else ''}
+            ORDER BY completed_at_ms DESC, id DESC
+            LIMIT ?
+            """,
+            (*values, limit + 1),
+        ).fetchall()
+
+    inspections = [row_to_dict(r) for r in rows[:limit]]
+    next_after = None
+    if len(rows) > limit:
+        last = inspections[-1]
+        next_after = f"{last['completed_at_ms']}:{last['id']}"
+    for r in inspections:
+        del r["completed_at_ms"]
+    return wire_format.make_response(
+        {"inspections": inspections, "next_after": next_after},
+        200,
+        wire_format.response_mimetype(request),
+    )
+
+
+@app.route("/archive/inspections/<inspection_id>", methods=["GET"])
+@require_api_key
+@admission_controlled
+def get_archived_inspection(inspection_id: str):
+    """One archived inspection with its tasks, each with its attachment (or null)."""
+    key = _db_id(inspection_id)
+    connection = get_archive_connection()
+    if connection is None:
+        return jsonify({"error": "Not found"}), 404
+    with connection:
+        inspection = connection.execute(
+            f"SELECT {_archive_select('inspections')}, archived_at FROM inspections WHERE id = ?",
+            (key,),
+        ).fetchone()
+        if inspection is None:
+            return jsonify({"error": "Not found"}), 404
+        tasks = connection.execute(
+            f"SELECT {_archive_select('tasks')} FROM tasks WHERE inspection_id = ? ORDER BY created_at, id",
+            (key,),
+        ).fetchall()
+        attachments = connection.execute(
+            f"""
+            SELECT {_archive_select('attachments')} FROM attachments
+            WHERE task_id IN (SELECT id FROM tasks WHERE inspection_id = ?)
+            """,
+            (key,),
+        ).fetchall()
+
+    by_task = {}
+    for a in attachments:
+        a = row_to_dict(a)
+        by_task[a["task_id"]] = a
+    result = row_to_dict(inspection)
+    result["tasks"] = []
+    for t in tasks:
+        t = row_to_dict(t)
+        t["is_completed"] = t["is_complete"]
+        t["attachment"] = by_task.get(t["id"])
+        result["tasks"].append(t)
+    return wire_format.make_response(result, 200, wire_format.response_mimetype(request))
+
+
+# ----------------------------
+# Bootstrap snapshots: GET /sync/snapshot, /sync/snapshot/<file>
+# ----------------------------
+
+def _snapshot_row(table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+    # same legacy alias /sync/jobs adds
+    if table == "tasks" and "is_complete" in row and "is_completed" not in row:
+        row["is_completed"] = row["is_complete"]
+    return row
+
+
+@app.before_request
+def _start_background_jobs():
+    # started lazily so each prefork worker (not the master) runs them
+    for name in SHARD_CONFIG.shards:
+        shard_services(name).ensure_started()
+
+
+@app.route("/sync/snapshot", methods=["GET"])
+@require_api_key
+def snapshot_manifest():
+    """
+    Latest bootstrap snapshot for a first sync. Download `url` (Range
+    requests supported), load the rows, then call /sync/jobs with
+    last_sync_at = server_time and last_tombstone_seq = tombstone_seq.
+    """
+    manifest = snapshots.read_manifest(shard_services().snapshot_dir)
+    if not manifest:
+        return jsonify({"error": "no snapshot available yet, do a full /sync/jobs pull"}), 404
+    url = f"/sync/snapshot/{manifest['file']}"
+    if SHARD_CONFIG.is_sharded:
+        url += f"?site={shard_services().name}"
+    return jsonify({**manifest, "url": url}), 200
+
+
+@app.route("/sync/snapshot/<path:name>", methods=["GET"])
+@require_api_key
+def snapshot_download(name: str):
+    if not (name.startswith("snapshot-") and name.endswith(".ndjson.gz")):
+        return jsonify({"error": "Not found"}), 404
+    # conditional=True: ETag/If-Range and Range requests, so downloads can resume
+    return send_from_directory(
+        shard_services().snapshot_dir,
+        name,
+        mimetype="application/gzip",
+        as_attachment=True,
+        conditional=True,
+        max_age=3600,
+    )
+
+
+# ----------------------------
+# Fleet-wide report: GET /reports/fleet (every shard)
+# ----------------------------
+
+def _shard_summary() -> Dict[str, Any]:
+    """Counts for the current shard (shards.fan_out sets shards.current)."""
+    as_of = _use_read_replica()
+    with get_read_connection() as connection:
+        by_status = dict(
+            connection.execute("SELECT status, COUNT(*) FROM inspections GROUP BY status").fetchall()
+        )
+        tasks, completed, attachments, last_activity_ms = connection.execute(
+            """
+            SELECT IFNULL(SUM(total_tasks), 0), IFNULL(SUM(completed_tasks), 0),
+                   IFNULL(SUM(attachments), 0), MAX(last_activity_ms)
+            FROM inspection_progress
+            """
+        ).fetchone()
+        devices = connection.execute("SELECT COUNT(*) FROM sync_devices").fetchone()[0]
+    return {
+        "inspections": {status: by_status.get(status, 0) for status in INSPECTION_STATUSES},
+        "tasks": tasks,
+        "completed_tasks": completed,
+        "attachments": attachments,
+        "devices": devices,
+        "last_activity_ms": last_activity_ms,
+        "as_of": as_of or _now_iso(),
+    }
+
+
+@app.route("/reports/fleet", methods=["GET"])
+@require_api_key
+@admission_controlled
+def fleet_report():
+    """
+    Counts per shard (site) and in total, read from every shard database
+    concurrently (shards.fan_out), from its read replica when there is a
+    fresh one ("as_of" says how current each shard's figures are). A shard
+    that cannot be read is reported with an "error" and left out of the
+    totals.
+    """
+    def summary(name: str) -> Dict[str, Any]:
+        try:
+            return _shard_summary()
+        except sqlite3.Error as e:
+            return {"error": str(e)}
+
+    per_shard = shards.fan_out(summary, list(SHARD_CONFIG.shards))
+    totals: Dict[str, Any] = {
+        "inspections": {status: 0 for status in INSPECTION_STATUSES},
+        "tasks": 0,
+        "completed_tasks": 0,
+        "attachments": 0,
+        "devices": 0,
+    }
+    for result in per_shard.values():
+        if "error" in result:
+            continue
+        for status, count in result["inspections"].items():
+            totals["inspections"][status] += count
+        for key in ("tasks", "completed_tasks", "attachments", "devices"):
+            totals[key] += result[key]
+    return jsonify({"shards": per_shard, "totals": totals}), 200
+
+
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=5050)
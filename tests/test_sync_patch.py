@@ -0,0 +1,86 @@
+"""
+Field-level push (base_updated_at) against /sync/jobs.
+
+  python -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["WAREHOUSE_DB_PATH"] = os.path.join(_tmp.name, "warehouse.db")
+
+import init_db  # noqa: E402
+
+init_db.init_db(os.environ["WAREHOUSE_DB_PATH"])
+
+import sync_app  # noqa: E402
+
+T0900 = "2026-01-01T09:00:00Z"
+T1000 = "2026-01-01T10:00:00Z"
+T1030 = "2026-01-01T10:30:00Z"
+T1100 = "2026-01-01T11:00:00Z"
+
+
+def setUpModule():
+    services = sync_app.shard_services("default")
+    services.blob_workers.workers = 0
+    services.snapshot_builder.interval_s = 0
+    services.maintenance.enabled = False
+
+
+def tearDownModule():
+    _tmp.cleanup()
+
+
+class PatchTests(unittest.TestCase):
+    def setUp(self):
+        self.client = sync_app.app.test_client()
+        self.inspection_id = str(uuid.uuid4())
+        self.task_id = str(uuid.uuid4())
+        self.push("a", {
+            "inspections": [{"id": self.inspection_id, "aircraft_id": "G-ABCD",
+                             "created_at": T1000, "updated_at": T1000}],
+            "tasks": [{"id": self.task_id, "inspection_id": self.inspection_id, "title": "orig",
+                       "created_at": T1000, "updated_at": T1000}],
+        })
+
+    def push(self, device_id, changes, **fields):
+        response = self.client.post(
+            "/sync/jobs",
+            json={"device_id": device_id, "changes": changes, **fields},
+            headers={"X-API-Key": sync_app.API_KEY},
+        )
+        self.assertEqual(response.status_code, 200, response.get_json())
+        return response.get_json()
+
+    def pulled_task(self, last_sync_at):
+        body = self.push("c", {}, last_sync_at=last_sync_at)
+        return next((t for t in body["server_changes"]["tasks"] if t["id"] == self.task_id), None)
+
+    def test_older_updated_at_does_not_move_the_row_back(self):
+        body = self.push("b", {"tasks": [{"id": self.task_id, "title": "patched",
+                                          "base_updated_at": T1000, "updated_at": T0900}]})
+        self.assertEqual(body["applied"]["tasks"]["updated"], 1)
+        # a device that pulled after the original version still gets the patch
+        task = self.pulled_task(T1030)
+        self.assertIsNotNone(task)
+        self.assertEqual(task["title"], "patched")
+        self.assertGreater(task["updated_at"], T1000)
+
+    def test_newer_updated_at_is_kept(self):
+        self.push("b", {"tasks": [{"id": self.task_id, "title": "patched",
+                                   "base_updated_at": T1000, "updated_at": T1100}]})
+        task = self.pulled_task(T1030)
+        self.assertEqual(task["updated_at"], T1100)
+        self.assertEqual(task["title"], "patched")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+"""
+uuid_keys.py
+
+Helpers for the optional compact key layout (schema_compact.sql), where
+UUID primary/foreign keys are stored as 16-byte BLOBs instead of
+36-character TEXT. Clients always see the canonical string form.
+"""
+
+import sqlite3
+import uuid
+from typing import Any, Dict
+
+# Columns that hold UUID keys in the sync tables
+ID_COLUMNS = ("id", "inspection_id", "task_id", "technician_id")
+
+
+def to_blob(value: Any) -> Any:
+    """
+    Canonical UUID string -> 16 bytes.
+    Anything else (non-UUID ids, upper-case or brace forms, None) is stored
+    unchanged, so decoding always gives the client back exactly what it sent.
+    """
+    if not isinstance(value, str) or len(value) != 36:
+        return value
+    try:
+        parsed = uuid.UUID(value)
+    except ValueError:
+        return value
+    return parsed.bytes if str(parsed) == value else value
+
+
+def from_blob(value: Any) -> Any:
+    if isinstance(value, bytes) and len(value) == 16:
+        return str(uuid.UUID(bytes=value))
+    return value
+
+
+def decode_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    for column in ID_COLUMNS:
+        value = row.get(column)
+        if isinstance(value, bytes):
+            row[column] = from_blob(value)
+    return row
+
+
+def detect_layout(connection: sqlite3.Connection) -> str:
+    """Return 'compact' if the sync tables use BLOB keys, else 'text'."""
+    row = connection.execute(
+        "SELECT type FROM pragma_table_info('technicians_cache') WHERE name = 'id'"
+    ).fetchone()
+    return "compact" if row and str(row[0]).upper() == "BLOB" else "text"
@@ -0,0 +1,204 @@
+"""
+wire_format.py
+
+Body encodings for the sync endpoints (/sync/jobs, /sync/technicians).
+
+  application/json      default, always available
+  application/msgpack   binary; needs the optional `msgpack` package
+                        (pip install msgpack). application/x-msgpack and
+                        application/vnd.msgpack are accepted as aliases.
+
+The request encoding follows Content-Type, the response encoding follows
+Accept (JSON unless the client asks for msgpack).
+
+Columnar layout (either encoding, opt-in with "layout": "columnar"): a
+table's rows are sent as blocks that list the column names once,
+
+  [ {"columns": ["id", "title", ...], "rows": [["...", "..."], ...]}, ... ]
+
+instead of one dict per row. Rows with different key sets (e.g. partial
+rows from delta_pull) go into separate blocks.
+
+/sync/jobs can also answer with a slimmer "applied_ids", as positions in
+the pushed arrays or as bitmaps instead of echoed UUIDs (see
+encode_applied_ids).
+"""
+
+import base64
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from flask import Request, Response, jsonify
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+
+JSON_MIMETYPE = "application/json"
+MSGPACK_MIMETYPE = "application/msgpack"
+MSGPACK_ALIASES = (MSGPACK_MIMETYPE, "application/x-msgpack", "application/vnd.msgpack")
+
+# msgpack bin values would be stored as BLOBs that JSON pulls cannot send back
+BINARY_VALUE_ERROR = "binary values are not supported; send them as strings"
+
+
+class WireFormatError(ValueError):
+    """Body could not be decoded; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def available_mimetypes() -> List[str]:
+    return [JSON_MIMETYPE, MSGPACK_MIMETYPE] if msgpack else [JSON_MIMETYPE]
+
+
+def is_msgpack(mimetype: Optional[str]) -> bool:
+    return (mimetype or "").lower() in MSGPACK_ALIASES
+
+
+def has_binary(value: Any) -> bool:
+    """True if `value` (a decoded msgpack value) contains bin data anywhere."""
+    if isinstance(value, (bytes, bytearray)):
+        return True
+    if isinstance(value, dict):
+        return any(has_binary(v) for v in value.values())
+    if isinstance(value, list):
+        return any(has_binary(v) for v in value)
+    return False
+
+
+def decode_request(req: Request) -> Dict[str, Any]:
+    """
+    Decode the request body to a dict. An empty body gives {}.
+    Raises WireFormatError for undecodable or unsupported bodies.
+    """
+    if is_msgpack(req.mimetype):
+        if msgpack is None:
+            raise WireFormatError("msgpack is not supported by this server", 415)
+        data = req.get_data(cache=False)
+        if not data:
+            return {}
+        try:
+            payload = msgpack.unpackb(data, raw=False)
+        except (ValueError, msgpack.UnpackException):
+            raise WireFormatError("invalid msgpack body")
+        if has_binary(payload):
+            raise WireFormatError(BINARY_VALUE_ERROR)
+    else:
+        payload = req.get_json(silent=True)
+
+    if payload is None:
+        return {}
+    if not isinstance(payload, dict):
+        raise WireFormatError("request body must be an object")
+    return payload
+
+
+def response_mimetype(req: Request) -> str:
+    return req.accept_mimetypes.best_match(available_mimetypes(), default=JSON_MIMETYPE)
+
+
+def make_response(body: Dict[str, Any], status: int, mimetype: str) -> Tuple[Response, int]:
+    if is_msgpack(mimetype) and msgpack is not None:
+        return Response(msgpack.packb(body, use_bin_type=True), mimetype=MSGPACK_MIMETYPE), status
+    return jsonify(body), status
+
+
+# ----------------------------
+# Columnar layout
+# ----------------------------
+
+def to_columnar(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    blocks: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+    for row in rows:
+        columns = tuple(row)
+        block = blocks.get(columns)
+        if block is None:
+            block = blocks[columns] = {"columns": list(columns), "rows": []}
+        block["rows"].append(list(row.values()))
+    return list(blocks.values())
+
+
+def _is_block(value: Any) -> bool:
+    return isinstance(value, dict) and "columns" in value and "rows" in value
+
+
+def from_columnar(value: Any) -> List[Dict[str, Any]]:
+    """
+    Accept a table's rows in either layout: a list of row dicts, a single
+    columnar block, or a list of blocks. Returns row dicts.
+    """
+    if _is_block(value):
+        value = [value]
+    if not isinstance(value, list) or not value or not _is_block(value[0]):
+        return value or []
+
+    rows: List[Dict[str, Any]] = []
+    for block in value:
+        if not _is_block(block):
+            raise WireFormatError("mixed columnar and row-dict data in one table")
+        columns, block_rows = block["columns"], block["rows"]
+        if not isinstance(columns, list) or not all(isinstance(c, str) for c in columns):
+            raise WireFormatError("columnar block: columns must be a list of strings")
+        if not isinstance(block_rows, list):
+            raise WireFormatError("columnar block: rows must be a list")
+        for values in block_rows:
+            if not isinstance(values, list) or len(values) != len(columns):
+                raise WireFormatError(f"columnar block: each row must be a list of {len(columns)} values")
+            rows.append(dict(zip(columns, values)))
+    return rows
+
+
+# ----------------------------
+# applied_ids encodings
+# ----------------------------
+
+APPLIED_ID_MODES = ("ids", "indexes", "bitmap", "none")
+OUTCOMES = ("inserted", "updated", "skipped", "conflict")
+
+
+def _bitmap(positions: List[int], count: int) -> str:
+    bits = bytearray((count + 7) // 8)
+    for i in positions:
+        bits[i >> 3] |= 1 << (i & 7)
+    return base64.b64encode(bytes(bits)).decode("ascii")
+
+
+def encode_applied_ids(
+    outcomes: Dict[str, List[Tuple[str, str]]],
+    mode: str = "ids",
+    only: Sequence[str] = OUTCOMES,
+) -> Optional[Dict[str, Any]]:
+    """
+    /sync/jobs "applied_ids", from each table's (outcome, id) per pushed
+    row in push order, listing only the outcomes in `only`:
+
+      ids       {"<table>": {"inserted": [ids], ...}} for every table;
+                rows without an id are left out
+      indexes   {"<table>": {"inserted": [0, 3, ...], ...}}: positions in
+                the table's pushed array (columnar blocks count in order)
+      bitmap    {"<table>": {"rows": n, "inserted": "<base64>", ...}}: bit i
+                (byte i // 8, bit i % 8, lowest first) is set if row i had
+                that outcome
+      none      None: leave applied_ids out
+
+    indexes and bitmap skip tables nothing was pushed to.
+    """
+    if mode == "none":
+        return None
+    encoded: Dict[str, Any] = {}
+    for table, results in outcomes.items():
+        if mode == "ids":
+            encoded[table] = {o: [rid for result, rid in results if result == o and rid] for o in only}
+            continue
+        if not results:
+            continue
+        positions = {o: [i for i, (result, _) in enumerate(results) if result == o] for o in only}
+        if mode == "indexes":
+            encoded[table] = positions
+        else:
+            encoded[table] = {"rows": len(results), **{o: _bitmap(p, len(results)) for o, p in positions.items()}}
+    return encoded